@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Simulatore di flotta: N device virtuali che sincronizzano sullo stesso DB
+
+Ogni device ha il proprio database SQLite, ActiveWindowService,
+ActivityTracker e MongoSyncManager reali; gli eventi finestra sintetici
+passano da ActiveWindowService.publish come quelli del backend. Tutti i
+device generano il proprio backlog e poi sincronizzano insieme, così
+activity_logs e l'indice unico di process_windows ricevono scritture
+concorrenti da molti DEVICE_ID.
+
+    python benchmarks/bench_fleet.py --devices 1,10,50,100
+    python benchmarks/bench_fleet.py --devices 200 --mode process --workers 16
+    python benchmarks/bench_fleet.py --fake --devices 10,50 --latency 0.002
+    python benchmarks/bench_fleet.py --devices 20 --shared-ids 2
+
+--shared-ids K assegna lo stesso DEVICE_ID a gruppi di K device (es. VM
+clonate con lo stesso MAC). Gli _id di activity_logs contengono anche
+l'istanza del database locale, quindi i cloni non collidono più lì e
+nessun record viene perso: l'opzione misura solo la contesa sui
+documenti condivisi, cioè gli upsert concorrenti di process_windows e
+i $inc di daily_summaries sugli stessi device/giorno/processo.
+
+La colonna conflicts (sync_duplicate_keys_total) conta le scritture
+respinte come chiave duplicata e ignorate perché il documento è già
+presente: upsert concorrenti di process_windows e blocchi reinviati
+dopo un errore. Non indica dati persi.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config  # noqa: E402
+from core.idle import IdleTimeSource  # noqa: E402
+
+# Client condiviso dai device in modalità thread
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+class ActiveUserIdleSource(IdleTimeSource):
+    """Utente sempre attivo: nessuna pausa durante la simulazione"""
+
+    def idle_seconds(self) -> float:
+        return 0.0
+
+
+def _client(args):
+    """Un client per processo (thread: condiviso, come il pool di pymongo)"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            if args["fake"]:
+                from benchmarks.fake_mongo import FakeMongoClient
+
+                _shared_client = FakeMongoClient(latency=args["latency"])
+            else:
+                import pymongo
+
+                _shared_client = pymongo.MongoClient(
+                    args["mongo_uri"], maxPoolSize=args["pool_size"]
+                )
+        return _shared_client
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_device(index: int, start_at: float, tmp: str, args: Dict) -> Dict:
+    """Un device virtuale: genera eventi, attende start_at e sincronizza"""
+    from core.database import DatabaseManager
+    from core.metrics import MetricsRegistry
+    from core.mongo_sync import MongoSyncManager
+    from core.tracker import ActivityTracker
+    from core.window_service import ActiveWindowService
+
+    config = Config()
+    config.DEVICE_ID = f"sim-{index // args['shared_ids']:05d}"
+    config.USERNAME = f"user{index}"
+    config.DEVICE_NAME = f"sim-host-{index}"
+    config.DB_PATH = os.path.join(tmp, f"device-{index}.db")
+    config.MONGO_URI = args["mongo_uri"]
+    config.MONGO_DB = args["mongo_db"]
+    config.SYNC_CHUNK_SIZE = args["chunk_size"]
+    config.SYNC_FORMAT = args["format"]
+    config.RULES = []
+
+    metrics = MetricsRegistry()
+    db = DatabaseManager(config.DB_PATH, metrics=metrics)
+    mongo = MongoSyncManager(config, client=_client(args), metrics=metrics)
+    service = ActiveWindowService()
+    tracker = ActivityTracker(
+        config, db, mongo, service, idle_source=ActiveUserIdleSource(), metrics=metrics
+    )
+
+    # Flusso finestre sintetico: pochi processi, titoli con coda lunga
+    rng = random.Random(index)
+    processes = [f"app{i}" for i in range(args["processes"])]
+    for _ in range(args["events"]):
+        process = rng.choice(processes)
+        title = f"{process} doc {int(rng.paretovariate(1.2)) % args['titles']}"
+        service.publish(process, title)
+    db.flush()
+
+    # Indici e registrazione device, con i retry reali
+    mongo.start()
+    if not mongo.ready.wait(60):
+        raise RuntimeError(f"device {index}: MongoDB non pronto")
+
+    latencies: List[float] = []
+    sync_activities = mongo.sync_activities
+
+    def timed_sync(records, instance_id, sessions=None):
+        start = time.perf_counter()
+        try:
+            sync_activities(records, instance_id, sessions)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    mongo.sync_activities = timed_sync
+
+    time.sleep(max(0.0, start_at - time.time()))
+    start = time.perf_counter()
+    errors = 0
+    try:
+        tracker.sync_pending()
+    except Exception as e:
+        errors += 1
+        print(f"[FLEET] device {index}: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    backlog = db.unsynced_count()
+    tracker.stop()
+    db.close()
+    return {
+        "synced": int(metrics.counter("sync_records_total").value()),
+        "backlog": backlog,
+        "latencies": latencies,
+        "elapsed": elapsed,
+        "conflicts": int(metrics.counter("sync_duplicate_keys_total").value()),
+        "errors": errors,
+    }
+
+
+def run_fleet(devices: int, args: Dict) -> Dict:
+    """Esegue una flotta di devices device e aggrega i risultati"""
+    global _shared_client
+    # Ogni serie parte da un database vuoto (il sostituto vive nel client)
+    _shared_client = None
+    workers = min(devices, args["workers"])
+    pool_cls = ProcessPoolExecutor if args["mode"] == "process" else ThreadPoolExecutor
+    # Tempo per generare i backlog prima della partenza comune del sync
+    start_at = time.time() + args["warmup"]
+
+    with tempfile.TemporaryDirectory() as tmp, pool_cls(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_device, i, start_at, tmp, args) for i in range(devices)
+        ]
+        results = [f.result() for f in futures]
+    wall = max(0.0, time.time() - start_at)
+
+    latencies = [lat for r in results for lat in r["latencies"]]
+    synced = sum(r["synced"] for r in results)
+    return {
+        "devices": devices,
+        "synced": synced,
+        "backlog": sum(r["backlog"] for r in results),
+        "wall_s": wall,
+        "throughput": synced / wall if wall else 0.0,
+        "batches": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "slowest_device_s": max(r["elapsed"] for r in results),
+        "conflicts": sum(r["conflicts"] for r in results),
+        "errors": sum(r["errors"] for r in results),
+    }
+
+
+def _drop(args: Dict):
+    """Rimuove il database di simulazione"""
+    if args["fake"] or not args["drop"]:
+        return
+    import pymongo
+
+    pymongo.MongoClient(args["mongo_uri"]).drop_database(args["mongo_db"])
+
+
+def main():
+    """Entry point CLI"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--devices", default="1,10,50", help="serie, es. 1,10,100")
+    parser.add_argument("--events", type=int, default=2000, help="eventi per device")
+    parser.add_argument("--processes", type=int, default=15)
+    parser.add_argument("--titles", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument(
+        "--format", choices=["documents", "compact"], default="documents"
+    )
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--shared-ids", type=int, default=1)
+    parser.add_argument("--warmup", type=float, default=None, help="secondi")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    parser.add_argument("--mongo-db", default="productivity_sim")
+    parser.add_argument("--fake", action="store_true", help="sostituto in-process")
+    parser.add_argument("--latency", type=float, default=0.0, help="RTT simulato")
+    parser.add_argument("--keep", dest="drop", action="store_false")
+    parser.add_argument("--output", help="file JSON dei risultati")
+    args = vars(parser.parse_args())
+    if args["fake"] and args["mode"] == "process":
+        parser.error("--fake richiede --mode thread (un solo database in memoria)")
+
+    header = (
+        f"{'devices':>8} {'synced':>9} {'rec/s':>10} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'conflicts':>9} {'errors':>6} {'backlog':>8}"
+    )
+    print(header)
+    rows = []
+    for devices in (int(n) for n in args["devices"].split(",")):
+        _drop(args)
+        run_args = dict(args)
+        if run_args["warmup"] is None:
+            # Stima grezza del tempo di generazione del backlog
+            run_args["warmup"] = 1.0 + devices * args["events"] / 50000
+        row = run_fleet(devices, run_args)
+        rows.append(row)
+        print(
+            f"{row['devices']:>8} {row['synced']:>9} {row['throughput']:>10.0f} "
+            f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['conflicts']:>9} "
+            f"{row['errors']:>6} {row['backlog']:>8}"
+        )
+    _drop(args)
+
+    if args["output"]:
+        with open(args["output"], "w", encoding="utf-8") as f:
+            json.dump({"args": args, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Benchmark dei percorsi critici del tracker, con confronto su una baseline
+
+    python benchmarks/bench_hotpaths.py --output benchmarks/results/baseline.json
+    python benchmarks/bench_hotpaths.py --baseline benchmarks/results/baseline.json
+    python benchmarks/bench_hotpaths.py --quick --only insert,sync
+    python benchmarks/bench_hotpaths.py --mongo-uri mongodb://localhost:27017
+
+Casi:
+    insert    throughput di DatabaseManager.insert_activity (write-behind)
+    unsynced  latenza di get_unsynced_records con --rows righe (default 1M)
+    sync      costo per blocco di MongoSyncManager.sync_activities
+              (sostituto in-process, oppure mongod locale con --mongo-uri)
+    detector  latenza di WindowDetector/ActiveWindowService con backend finto
+    gui       costo di creazione e di aggiornamento della lista con N righe
+              (saltato se non c'è un display)
+
+Con --baseline esce con codice 1 se una metrica peggiora oltre --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config  # noqa: E402
+from core.database import DatabaseManager  # noqa: E402
+from core.metrics import MetricsRegistry  # noqa: E402
+
+# Direzione di ogni metrica: "higher" o "lower" è meglio
+DIRECTIONS = {
+    "insert.events_per_s": "higher",
+    "insert.flush_ms": "lower",
+    "unsynced.populate_s": "lower",
+    "unsynced.first_page_ms": "lower",
+    "unsynced.middle_page_ms": "lower",
+    "unsynced.full_pass_ms": "lower",
+    "sync.documents_batch_ms": "lower",
+    "sync.documents_resync_batch_ms": "lower",
+    "sync.compact_batch_ms": "lower",
+    "detector.raw_call_us": "lower",
+    "detector.timed_call_us": "lower",
+    "detector.service_sample_us": "lower",
+    "gui.create_ms": "lower",
+    "gui.merge_ms": "lower",
+    "gui.indicator_update_us": "lower",
+}
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Durate (secondi) di repeat chiamate"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _config(db_path: str) -> Config:
+    """Configurazione isolata sul database temporaneo"""
+    config = Config()
+    config.DB_PATH = db_path
+    config.MONGO_DB = f"bench_{os.getpid()}"
+    config.SYNC_MAX_RETRIES = 1
+    return config
+
+
+def _fill(db: DatabaseManager, rows: int, titles: int = 500):
+    """Inserisce rows eventi sintetici e attende la scrittura"""
+    for i in range(rows):
+        db.insert_activity(f"proc{i % 40}", f"title {i % titles}", 1.0, "dev", "user")
+    db.flush()
+
+
+def bench_insert(tmp: str, args) -> Dict[str, float]:
+    """Throughput di insert_activity con il writer in background"""
+    db = DatabaseManager(os.path.join(tmp, "insert.db"), metrics=MetricsRegistry())
+    events = args.events
+    start = time.perf_counter()
+    for i in range(events):
+        db.insert_activity(f"proc{i % 40}", f"title {i % 500}", 1.0, "dev", "user")
+    enqueued = time.perf_counter()
+    db.flush()
+    done = time.perf_counter()
+    db.close()
+    return {
+        "insert.events_per_s": events / (done - start),
+        "insert.flush_ms": (done - enqueued) * 1000,
+    }
+
+
+def bench_unsynced(tmp: str, args) -> Dict[str, float]:
+    """Latenza della paginazione dei record non sincronizzati su un DB grande"""
+    db = DatabaseManager(os.path.join(tmp, "unsynced.db"), metrics=MetricsRegistry())
+    start = time.perf_counter()
+    _fill(db, args.rows)
+    populate = time.perf_counter() - start
+
+    # Backlog realistico: solo le ultime righe non sono sincronizzate
+    backlog = min(args.backlog, args.rows)
+    db.mark_as_synced(1, args.rows - backlog)
+
+    first = _timeit(lambda: db.get_unsynced_records(0, 1000), 20)
+    middle_id = args.rows - backlog // 2
+    middle = _timeit(lambda: db.get_unsynced_records(middle_id, 1000), 20)
+    full = _timeit(lambda: sum(len(c) for c in db.iter_unsynced_chunks(1000)), 3)
+    db.close()
+    return {
+        "unsynced.populate_s": populate,
+        "unsynced.first_page_ms": statistics.median(first) * 1000,
+        "unsynced.middle_page_ms": statistics.median(middle) * 1000,
+        "unsynced.full_pass_ms": statistics.median(full) * 1000,
+    }
+
+
+def _mongo_client(args):
+    """Client reale (--mongo-uri) o sostituto in-process"""
+    if args.mongo_uri:
+        import pymongo
+
+        return pymongo.MongoClient(args.mongo_uri)
+    from benchmarks.fake_mongo import FakeMongoClient
+
+    return FakeMongoClient()
+
+
+def bench_sync(tmp: str, args) -> Dict[str, float]:
+    """Costo per blocco di sync_activities, nei due formati"""
+    from core.mongo_sync import MongoSyncManager
+
+    db_path = os.path.join(tmp, "sync.db")
+    db = DatabaseManager(db_path, metrics=MetricsRegistry())
+    _fill(db, args.batches * args.batch_size, titles=args.batch_size)
+    chunks = list(db.iter_unsynced_chunks(args.batch_size))
+    instance_id = db.instance_id
+    db.close()
+
+    results = {}
+    for sync_format in ("documents", "compact"):
+        config = _config(db_path)
+        config.SYNC_FORMAT = sync_format
+        client = _mongo_client(args)
+        manager = MongoSyncManager(config, client=client, metrics=MetricsRegistry())
+        manager._init_indexes()
+        try:
+            per_batch = [
+                d
+                for chunk in chunks
+                for d in _timeit(
+                    lambda chunk=chunk: manager.sync_activities(chunk, instance_id), 1
+                )
+            ]
+            results[f"sync.{sync_format}_batch_ms"] = (
+                statistics.median(per_batch) * 1000
+            )
+            if sync_format == "documents":
+                # Reinvio degli stessi blocchi: percorso dei duplicati (11000)
+                resync = [
+                    d
+                    for chunk in chunks
+                    for d in _timeit(
+                        lambda chunk=chunk: manager.sync_activities(chunk, instance_id),
+                        1,
+                    )
+                ]
+                results["sync.documents_resync_batch_ms"] = (
+                    statistics.median(resync) * 1000
+                )
+        finally:
+            if args.mongo_uri:
+                client.drop_database(config.MONGO_DB)
+    return results
+
+
+def bench_detector(tmp: str, args) -> Dict[str, float]:
+    """Latenza per chiamata del rilevamento con un backend finto"""
+    from core.window_detector import WindowDetector
+    from core.window_service import ActiveWindowService
+
+    def fake_backend():
+        return "code", "bench_hotpaths.py - project"
+
+    timed = WindowDetector._timed(fake_backend)
+    service = ActiveWindowService()
+    service._backend = timed
+    calls = args.calls
+
+    def per_call(fn) -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        return (time.perf_counter() - start) / calls * 1e6
+
+    return {
+        "detector.raw_call_us": per_call(fake_backend),
+        "detector.timed_call_us": per_call(timed),
+        "detector.service_sample_us": per_call(service.sample),
+    }
+
+
+class _Stub:
+    """Oggetto con attributi e metodi no-op per la GUI"""
+
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def bench_gui(tmp: str, args) -> Dict[str, float]:
+    """Creazione della lista e aggiornamento dell'indicatore con N righe"""
+    import tkinter
+
+    from core.window_service import ActiveWindowService
+    from gui.manager import GUIManager
+
+    try:
+        tkinter.Tk().destroy()
+    except tkinter.TclError as e:
+        raise RuntimeError(f"display non disponibile: {e}")
+
+    rows = args.gui_rows
+    apps = [
+        {"_id": str(i), "process": f"proc{i % 40}", "window_title": f"t{i}", "level": 5}
+        for i in range(rows)
+    ]
+    config = _config(os.path.join(tmp, "gui.db"))
+    config.RULES = []
+    window_cache = _Stub(load=lambda device_id: apps)
+    service = ActiveWindowService()
+    gui = GUIManager(
+        config,
+        _Stub(window_cache=window_cache),
+        service,
+        _Stub(is_pending=lambda doc_id: False),
+        _Stub(),
+    )
+
+    start = time.perf_counter()
+    gui.create_window()
+    gui.root.update()
+    create = time.perf_counter() - start
+
+    updated = [dict(app, level=7) for app in apps[: rows // 10]]
+    start = time.perf_counter()
+    gui._merge_rows(updated)
+    gui.root.update_idletasks()
+    merge = time.perf_counter() - start
+
+    switches = 200
+    start = time.perf_counter()
+    for i in range(switches):
+        app = apps[(i * 7919) % rows]
+        service._snapshot = (app["process"], app["window_title"])
+        gui._update_active_indicator()
+        gui.root.update_idletasks()
+    indicator = (time.perf_counter() - start) / switches
+    gui.root.destroy()
+    return {
+        "gui.create_ms": create * 1000,
+        "gui.merge_ms": merge * 1000,
+        "gui.indicator_update_us": indicator * 1e6,
+    }
+
+
+CASES = {
+    "insert": bench_insert,
+    "unsynced": bench_unsynced,
+    "sync": bench_sync,
+    "detector": bench_detector,
+    "gui": bench_gui,
+}
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float):
+    """Righe di confronto e lista delle regressioni"""
+    lines, regressions = [], []
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base == 0:
+            lines.append(f"{name:36s} {value:14.3f}")
+            continue
+        change = (value - base) / base
+        worse = (
+            change < -tolerance if DIRECTIONS[name] == "higher" else change > tolerance
+        )
+        flag = "  REGRESSIONE" if worse else ""
+        lines.append(f"{name:36s} {value:14.3f} {base:14.3f} {change:+8.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return lines, regressions
+
+
+def main():
+    """Entry point CLI"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--only", help="casi separati da virgola")
+    parser.add_argument("--quick", action="store_true", help="dimensioni ridotte")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--backlog", type=int, default=5000)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--gui-rows", type=int, default=5000)
+    parser.add_argument("--mongo-uri", help="mongod locale al posto del sostituto")
+    parser.add_argument("--output", help="file JSON dei risultati")
+    parser.add_argument("--baseline", help="file JSON di riferimento")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.quick:
+        args.events, args.rows, args.batches = 20000, 100000, 5
+        args.calls, args.gui_rows = 20000, 1000
+
+    selected = args.only.split(",") if args.only else list(CASES)
+    results: Dict[str, float] = {}
+    skipped: Dict[str, str] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in selected:
+            print(f"[BENCH] {name}...", file=sys.stderr)
+            try:
+                results.update(CASES[name](tmp, args))
+            except Exception as e:
+                skipped[name] = str(e)
+                print(f"[BENCH] {name} saltato: {e}", file=sys.stderr)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+    for name, reason in skipped.items():
+        print(f"{name:36s} saltato ({reason})")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "time": time.time(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                    "results": results,
+                    "skipped": skipped,
+                },
+                f,
+                indent=2,
+            )
+
+    if regressions:
+        print(f"[BENCH] regressioni: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
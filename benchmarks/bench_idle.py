@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark del rilevamento inattività sotto carico di input sintetico
+
+Un listener finto consegna movimenti del mouse alla frequenza data e si
+misura la CPU del processo (time.process_time) con la vecchia callback
+(time.time() ad ogni evento) e con la sorgente pynput limitata, che
+scarta i movimenti entro la finestra di throttle.
+
+    python benchmarks/bench_idle.py --rate 20000 --seconds 5
+    DISPLAY=:99 python benchmarks/bench_idle.py --real --seconds 10
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.idle import PynputIdleSource, create_idle_source  # noqa: E402
+
+
+class LegacyCallback:
+    """Callback originale del tracker: un time.time() per evento"""
+
+    def __init__(self):
+        self._last_input_time = time.time()
+
+    def _on_input_activity(self, *args, **kwargs):
+        self._last_input_time = time.time()
+
+
+class FakeListener(threading.Thread):
+    """Consegna on_move(x, y) alla frequenza data dal proprio thread
+
+    Come il listener di pynput: una chiamata Python per evento, in lotti
+    ogni TICK secondi per tenere il ritmo anche a decine di migliaia di
+    eventi al secondo.
+    """
+
+    TICK = 0.01
+
+    def __init__(self, on_move, rate: int, seconds: float):
+        super().__init__(daemon=True)
+        self.on_move = on_move
+        self.rate = rate
+        self.seconds = seconds
+        self.delivered = 0
+
+    def run(self):
+        per_tick = max(int(self.rate * self.TICK), 1)
+        on_move = self.on_move
+        tick = time.monotonic()
+        deadline = tick + self.seconds
+        while tick < deadline:
+            for i in range(per_tick):
+                on_move(i, i)
+            self.delivered += per_tick
+            tick += self.TICK
+            delay = tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def process_cpu(on_move, rate: int, seconds: float):
+    """Secondi CPU del processo ed eventi consegnati dal listener finto"""
+    listener = FakeListener(on_move, rate, seconds)
+    start = time.process_time()
+    listener.start()
+    listener.join()
+    return time.process_time() - start, listener.delivered
+
+
+def run_synthetic(rate: int, seconds: float, throttle: float):
+    """CPU del processo prima e dopo, con un listener finto ad alta frequenza
+
+    La riga "nessuna callback" misura la sola consegna, che con pynput è
+    a carico della libreria; la colonna "callback" è la differenza, cioè
+    il costo della sorgente di inattività.
+    """
+    legacy = LegacyCallback()
+    source = PynputIdleSource(throttle=throttle)
+    cases = [
+        ("nessuna callback", lambda *args: None),
+        ("prima: time.time()", legacy._on_input_activity),
+        (f"dopo: limitata ({throttle:g}s)", source._on_move),
+    ]
+
+    print(f"{'callback':<28}{'eventi/s':>10}{'CPU':>10}{'callback':>11}{'µs/ev':>8}")
+    baseline = None
+    for name, on_move in cases:
+        cpu, delivered = process_cpu(on_move, rate, seconds)
+        if baseline is None:
+            baseline = cpu
+        extra = max(cpu - baseline, 0.0)
+        print(
+            f"{name:<28}{delivered / seconds:>10.0f}{cpu / seconds * 100:>9.2f}%"
+            f"{extra / seconds * 100:>10.2f}%{extra / delivered * 1e6:>8.3f}"
+        )
+
+    try:
+        os_source = create_idle_source("os")
+        queries = 1000
+        start = time.process_time()
+        for _ in range(queries):
+            os_source.idle_seconds()
+        # Nessuna callback per evento: una query per campione del tracker
+        per_query = (time.process_time() - start) / queries
+        print(f"contatore OS: {per_query * 1e6:.2f} µs per query, una al secondo")
+    except Exception as e:
+        print(f"[INFO] contatore OS non disponibile: {e}")
+
+
+def run_real(rate: int, seconds: float):
+    """Muove davvero il mouse e misura la CPU del processo con psutil"""
+    import psutil
+    from pynput.mouse import Controller
+
+    for kind in ("pynput", "os"):
+        source = create_idle_source(kind)
+        source.start()
+        proc = psutil.Process()
+        controller = Controller()
+        stop = threading.Event()
+
+        def drive():
+            i = 0
+            while not stop.is_set():
+                controller.position = (100 + i % 200, 100 + i % 150)
+                i += 1
+                time.sleep(1 / rate)
+
+        driver = threading.Thread(target=drive, daemon=True)
+        proc.cpu_percent(None)
+        driver.start()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            source.idle_seconds()
+            time.sleep(1)
+        cpu = proc.cpu_percent(None)
+        stop.set()
+        driver.join()
+        source.stop()
+        print(f"{type(source).__name__:<28}CPU processo {cpu:.1f}% (incluso driver)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=int, default=20000, help="eventi al secondo")
+    parser.add_argument("--real", action="store_true", help="input reale via X")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--throttle", type=float, default=1.0, help="finestra del mouse (s)"
+    )
+    args = parser.parse_args()
+
+    if args.real:
+        run_real(args.rate, args.seconds)
+    else:
+        run_synthetic(args.rate, args.seconds, args.throttle)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Sostituto in-process di MongoDB per i benchmark
+
+Implementa solo le operazioni usate da MongoSyncManager (insert_many,
+replace_one, update_one, bulk_write, find, create_index) con indici
+unici ed errori 11000 reali di pymongo, così i percorsi di errore del
+codice vengono esercitati come contro un mongod. Non misura il costo del
+server: serve a isolare il costo lato client (costruzione documenti,
+BSON, logica di retry e deduplica).
+"""
+
+import copy
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def _get(doc: Dict, field: str):
+    value = doc
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set(doc: Dict, field: str, value):
+    """Assegnazione con notazione puntata (crea i sotto-documenti)"""
+    *parents, last = field.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _matches_condition(value, condition) -> bool:
+    if not isinstance(condition, dict) or not any(k.startswith("$") for k in condition):
+        return value == condition
+    for op, arg in condition.items():
+        if op == "$gte" and not (value is not None and value >= arg):
+            return False
+        if op == "$gt" and not (value is not None and value > arg):
+            return False
+        if op == "$lte" and not (value is not None and value <= arg):
+            return False
+        if op == "$lt" and not (value is not None and value < arg):
+            return False
+        if op == "$ne" and value == arg:
+            return False
+        if op == "$in" and value not in arg:
+            return False
+        if op == "$exists" and (value is not None) != bool(arg):
+            return False
+        if op == "$regex" and not (isinstance(value, str) and re.search(arg, value)):
+            return False
+        if op == "$not" and _matches_condition(value, arg):
+            return False
+    return True
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    """Filtro MongoDB ridotto: uguaglianza e operatori di confronto"""
+    for field, condition in (query or {}).items():
+        if field == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif not _matches_condition(_get(doc, field), condition):
+            return False
+    return True
+
+
+class FakeCollection:
+    """Collezione in memoria con indici unici"""
+
+    def __init__(self, client: "FakeMongoClient", name: str):
+        self.client = client
+        self.name = name
+        self.kind = "collection"
+        self.docs: Dict = {}
+        self.unique_indexes: List[Tuple[str, ...]] = []
+        self._index_maps: Dict[Tuple[str, ...], Dict] = {}
+
+    # Indici
+
+    def create_index(self, keys, unique: bool = False, **kwargs) -> str:
+        self.client._delay()
+        with self.client.lock:
+            fields = tuple(k for k, _ in keys)
+            if unique and fields not in self.unique_indexes:
+                self.unique_indexes.append(fields)
+                self._index_maps[fields] = {
+                    self._key(fields, d): _id for _id, d in self.docs.items()
+                }
+            return "_".join(f"{k}_{d}" for k, d in keys)
+
+    @staticmethod
+    def _key(fields: Tuple[str, ...], doc: Dict) -> Tuple:
+        return tuple(_get(doc, f) for f in fields)
+
+    def _check_unique(self, doc: Dict, ignore_id=None):
+        if doc["_id"] in self.docs and doc["_id"] != ignore_id:
+            raise DuplicateKeyError("duplicate _id", DUPLICATE_KEY_ERROR)
+        for fields in self.unique_indexes:
+            owner = self._index_maps[fields].get(self._key(fields, doc))
+            if owner is not None and owner != ignore_id:
+                raise DuplicateKeyError(f"duplicate {fields}", DUPLICATE_KEY_ERROR)
+
+    def _store(self, doc: Dict, old: Optional[Dict] = None):
+        if old is not None:
+            for fields in self.unique_indexes:
+                self._index_maps[fields].pop(self._key(fields, old), None)
+        self.docs[doc["_id"]] = doc
+        for fields in self.unique_indexes:
+            self._index_maps[fields][self._key(fields, doc)] = doc["_id"]
+
+    # Scritture (chiamate con il lock preso)
+
+    def _insert(self, doc: Dict):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self._store(doc)
+        return doc["_id"]
+
+    def _find_one_raw(self, query: Dict) -> Optional[Dict]:
+        if "_id" in query and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return doc if doc is not None and matches(doc, query) else None
+        for fields, index in self._index_maps.items():
+            if all(f in query and not isinstance(query[f], dict) for f in fields):
+                _id = index.get(tuple(query[f] for f in fields))
+                doc = self.docs.get(_id)
+                return doc if doc is not None and matches(doc, query) else None
+        for doc in self.docs.values():
+            if matches(doc, query):
+                return doc
+        return None
+
+    @staticmethod
+    def _apply_update(doc: Dict, update: Dict, inserting: bool) -> Dict:
+        doc = copy.deepcopy(doc)
+        for op, fields in update.items():
+            for field, value in fields.items():
+                if op == "$set" or (op == "$setOnInsert" and inserting):
+                    _set(doc, field, value)
+                elif op == "$inc":
+                    _set(doc, field, (_get(doc, field) or 0) + value)
+                elif op == "$max":
+                    doc[field] = value if field not in doc else max(doc[field], value)
+                elif op == "$min":
+                    doc[field] = value if field not in doc else min(doc[field], value)
+                elif op == "$currentDate":
+                    doc[field] = datetime.now(timezone.utc).replace(tzinfo=None)
+        return doc
+
+    def _update(self, query: Dict, update: Dict, upsert: bool) -> _Result:
+        current = self._find_one_raw(query)
+        if current is None:
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            base = {
+                k: v
+                for k, v in query.items()
+                if not k.startswith("$") and not isinstance(v, dict)
+            }
+            doc = self._apply_update(base, update, inserting=True)
+            return _Result(
+                matched_count=0, modified_count=0, upserted_id=self._insert(doc)
+            )
+        doc = self._apply_update(current, update, inserting=False)
+        modified = doc != current
+        if modified:
+            self._check_unique(doc, ignore_id=current["_id"])
+            self._store(doc, old=current)
+        return _Result(matched_count=1, modified_count=int(modified), upserted_id=None)
+
+    def _replace(self, query: Dict, replacement: Dict, upsert: bool) -> _Result:
+        current = self._find_one_raw(query)
+        if current is None:
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            doc = dict(replacement)
+            if "_id" in query:
+                doc.setdefault("_id", query["_id"])
+            return _Result(
+                matched_count=0, modified_count=0, upserted_id=self._insert(doc)
+            )
+        doc = copy.deepcopy(replacement)
+        doc["_id"] = current["_id"]
+        self._check_unique(doc, ignore_id=current["_id"])
+        self._store(doc, old=current)
+        return _Result(matched_count=1, modified_count=1, upserted_id=None)
+
+    def _bulk(self, ops: List, ordered: bool) -> _Result:
+        errors = []
+        counts = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0}
+        with self.client.lock:
+            for index, op in enumerate(ops):
+                try:
+                    if isinstance(op, InsertOne):
+                        self._insert(op._doc)
+                        counts["nInserted"] += 1
+                        continue
+                    if isinstance(op, UpdateOne):
+                        result = self._update(op._filter, op._doc, op._upsert)
+                    elif isinstance(op, ReplaceOne):
+                        result = self._replace(op._filter, op._doc, op._upsert)
+                    else:
+                        raise TypeError(f"operazione non supportata: {op!r}")
+                    counts["nMatched"] += result.matched_count
+                    counts["nModified"] += result.modified_count
+                    counts["nUpserted"] += int(result.upserted_id is not None)
+                except DuplicateKeyError as e:
+                    errors.append(
+                        {"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)}
+                    )
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError(
+                {"writeErrors": errors, "writeConcernErrors": [], **counts}
+            )
+        return _Result(
+            inserted_count=counts["nInserted"],
+            upserted_count=counts["nUpserted"],
+            matched_count=counts["nMatched"],
+            modified_count=counts["nModified"],
+        )
+
+    # API pubblica (sottoinsieme di pymongo.collection.Collection)
+
+    def insert_one(self, doc: Dict) -> _Result:
+        self.client._delay()
+        with self.client.lock:
+            return _Result(inserted_id=self._insert(doc))
+
+    def insert_many(self, docs: Iterable[Dict], ordered: bool = True) -> _Result:
+        self.client._delay()
+        docs = list(docs)
+        self._bulk([InsertOne(d) for d in docs], ordered)
+        return _Result(inserted_ids=[d.get("_id") for d in docs])
+
+    def update_one(self, query: Dict, update: Dict, upsert: bool = False) -> _Result:
+        self.client._delay()
+        with self.client.lock:
+            return self._update(query, update, upsert)
+
+    def replace_one(
+        self, query: Dict, replacement: Dict, upsert: bool = False
+    ) -> _Result:
+        self.client._delay()
+        with self.client.lock:
+            return self._replace(query, replacement, upsert)
+
+    def bulk_write(self, ops: Iterable, ordered: bool = True) -> _Result:
+        self.client._delay()
+        return self._bulk(list(ops), ordered)
+
+    def find(self, query: Optional[Dict] = None, projection: Optional[Dict] = None):
+        self.client._delay()
+        with self.client.lock:
+            found = [copy.deepcopy(d) for d in self.docs.values() if matches(d, query)]
+        if projection:
+            # Campi puntati: si tiene l'intero sotto-documento
+            keep = {k.split(".")[0] for k, v in projection.items() if v} | {"_id"}
+            found = [{k: v for k, v in d.items() if k in keep} for d in found]
+        return iter(found)
+
+    def find_one(self, query: Optional[Dict] = None, projection=None):
+        return next(self.find(query, projection), None)
+
+    def count_documents(self, query: Dict) -> int:
+        with self.client.lock:
+            return sum(1 for d in self.docs.values() if matches(d, query))
+
+
+class FakeDatabase:
+    def __init__(self, client: "FakeMongoClient"):
+        self.client = client
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        with self.client.lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(self.client, name)
+            return self._collections[name]
+
+    def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+    def list_collections(self, filter: Optional[Dict] = None):
+        self.client._delay()
+        with self.client.lock:
+            infos = [
+                {"name": name, "type": c.kind} for name, c in self._collections.items()
+            ]
+        return iter(i for i in infos if matches(i, filter))
+
+    def create_collection(self, name: str, timeseries: Optional[Dict] = None, **kw):
+        """Le time-series si comportano come collezioni normali (senza unici)"""
+        self.client._delay()
+        with self.client.lock:
+            collection = self[name]
+            if timeseries:
+                collection.kind = "timeseries"
+            return collection
+
+
+class FakeMongoClient:
+    """Client in memoria, thread-safe, con latenza di rete simulata opzionale"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.RLock()
+        self._databases: Dict[str, FakeDatabase] = {}
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        with self.lock:
+            if name not in self._databases:
+                self._databases[name] = FakeDatabase(self)
+            return self._databases[name]
@@ -1,5 +1,6 @@
 """Configurazione centralizzata dell'applicazione"""
 
+import glob
 import os
 import sys
 from pathlib import Path
@@ -23,14 +24,76 @@ class Config:
         self.DB_PATH = os.path.expanduser(os.getenv("DB_PATH", "~/activity.db"))
         self.MONGO_URI = os.getenv("MONGO_URI")
         self.MONGO_DB = os.getenv("MONGO_DB", "productivity")
+        # activity_logs come collezione time-series (metaField device_id);
+        # per una collezione già esistente: python migrate.py activity-logs
+        self.MONGO_TIMESERIES = os.getenv("MONGO_TIMESERIES", "0") == "1"
+
+        # Retention (0 = disattivata)
+        self.RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+        self.RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+        self.ARCHIVE_DIR = os.path.expanduser(
+            os.getenv("ARCHIVE_DIR", "~/activity_archive")
+        )
+
+        # SQLite write-behind
+        self.DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+        self.DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1") == "1"
+        self.DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+        self.DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "500"))
 
         # Intervals (seconds)
         self.SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", "300"))
+        # Campionamento adattivo: TRACKING_FAST_INTERVAL per TRACKING_FAST_WINDOW
+        # secondi dopo input o cambio finestra, poi TRACKING_INTERVAL; in pausa
+        # back-off esponenziale fino a TRACKING_MAX_INTERVAL
         self.TRACKING_INTERVAL = int(os.getenv("TRACKING_INTERVAL", "30"))
+        self.TRACKING_FAST_INTERVAL = float(os.getenv("TRACKING_FAST_INTERVAL", "1"))
+        self.TRACKING_FAST_WINDOW = float(os.getenv("TRACKING_FAST_WINDOW", "10"))
+        self.TRACKING_MAX_INTERVAL = float(os.getenv("TRACKING_MAX_INTERVAL", "60"))
+        self.LEVELS_REFRESH_INTERVAL = int(os.getenv("LEVELS_REFRESH_INTERVAL", "60"))
         self.INACTIVITY_THRESHOLD = 60
 
+        # Idle: "auto" (contatore di sistema, fallback pynput), "os", "pynput"
+        self.IDLE_SOURCE = os.getenv("IDLE_SOURCE", "auto")
+
+        # Sync
+        self.SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", "1000"))
+        # "documents": un documento per attività; "compact": uno per blocco
+        # (con SYNC_CHUNK_SIZE elevati attenzione al limite di 16MB per documento)
+        self.SYNC_FORMAT = os.getenv("SYNC_FORMAT", "documents")
+        self.SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "5"))
+        self.SYNC_BACKOFF_BASE = float(os.getenv("SYNC_BACKOFF_BASE", "0.5"))
+        self.KNOWN_KEYS_CACHE_SIZE = int(os.getenv("KNOWN_KEYS_CACHE_SIZE", "10000"))
+        # Destinazioni: "mongo", "http", "file" (separate da virgola); un
+        # record è sincronizzato quando tutte lo hanno confermato
+        self.SYNC_SINKS = [
+            s.strip() for s in os.getenv("SYNC_SINKS", "mongo").split(",") if s.strip()
+        ]
+        self.SYNC_HTTP_URL = os.getenv("SYNC_HTTP_URL", "")
+        self.SYNC_HTTP_TIMEOUT = float(os.getenv("SYNC_HTTP_TIMEOUT", "10"))
+        # File colonnari: "arrow" (IPC, memory-map) o "parquet"
+        self.SYNC_FILE_DIR = os.path.expanduser(
+            os.getenv("SYNC_FILE_DIR", "~/activity_export")
+        )
+        self.SYNC_FILE_FORMAT = os.getenv("SYNC_FILE_FORMAT", "arrow")
+        self.SYNC_FILE_COMPRESSION = os.getenv("SYNC_FILE_COMPRESSION", "none")
+        self.SYNC_FILE_MAX_MB = int(os.getenv("SYNC_FILE_MAX_MB", "64"))
+        self.SYNC_FILE_MAX_AGE = float(os.getenv("SYNC_FILE_MAX_AGE", "3600"))
+
+        # Socket Unix del collector daemon (python main.py --daemon)
+        self.IPC_SOCKET = os.path.expanduser(
+            os.getenv("IPC_SOCKET", "~/.activity_tracker.sock")
+        )
+
+        # Metriche: endpoint Prometheus locale (0 = off) e dump JSON periodico
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+        self.METRICS_DUMP_PATH = os.path.expanduser(os.getenv("METRICS_DUMP_PATH", ""))
+        self.METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))
+
         # Tables
         self.ACTIVITY_LOGS_TABLE = "activity_logs"
+        self.ACTIVITY_BATCHES_TABLE = "activity_batches"
+        self.DAILY_SUMMARIES_TABLE = "daily_summaries"
         self.PROCESS_WINDOW_TABLE = "process_windows"
         self.DEVICES_TABLE = "devices"
 
@@ -40,22 +103,41 @@ class Config:
         self.SYSTEM = platform.system()
         self.DEVICE_NAME = platform.node()
 
-        # Blacklists
-        self.PROCESS_BLACKLIST = [
-            "[PAUSE]",
-            "[RESUME]",
-            "unknown",
-            "Finder",
-            "Activity Monitor",
-            "AgentTracker",
-            "Electron",
-            "Python",
+        # Regole di classificazione (vedi core/rules.py): file JSON con la
+        # lista di regole, altrimenti le esclusioni di default. I nomi sono
+        # glob: escape, altrimenti "[PAUSE]" sarebbe una classe di caratteri
+        self.RULES_PATH = os.path.expanduser(os.getenv("RULES_PATH", ""))
+        self.RULES = [
+            {"process": glob.escape(name), "exclude": True}
+            for name in (
+                "[PAUSE]",
+                "[RESUME]",
+                "unknown",
+                "Finder",
+                "Activity Monitor",
+                "AgentTracker",
+                "Electron",
+                "Python",
+            )
         ]
+        self.RULES_RECLASSIFY_INTERVAL = int(
+            os.getenv("RULES_RECLASSIFY_INTERVAL", "3600")
+        )
         self.IGNORED_PROCESSES = ["[PAUSE]", "[RESUME]"]
 
         # Validation
-        if not self.MONGO_URI:
-            raise ValueError("❌ MONGO_URI mancante. Inseriscilo in .env")
+        if self.SYNC_FORMAT not in ("documents", "compact"):
+            raise ValueError(f"❌ SYNC_FORMAT non valido: {self.SYNC_FORMAT}")
+        for sink in self.SYNC_SINKS:
+            if sink not in ("mongo", "http", "file"):
+                raise ValueError(f"❌ Sink di sync non valido: {sink}")
+        if "http" in self.SYNC_SINKS and not self.SYNC_HTTP_URL:
+            raise ValueError("❌ SYNC_HTTP_URL richiesto dal sink http")
+        if self.SYNC_FILE_FORMAT not in ("arrow", "parquet"):
+            raise ValueError(f"❌ SYNC_FILE_FORMAT non valido: {self.SYNC_FILE_FORMAT}")
+        if self.DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"❌ DB_SYNCHRONOUS non valido: {self.DB_SYNCHRONOUS}")
+        # Senza MONGO_URI il tracking resta solo locale (sync disattivata)
 
 
 # Istanza globale configurazione
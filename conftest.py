@@ -0,0 +1 @@
+"""Configurazione pytest: la radice del repository è nel path di import"""
@@ -0,0 +1,215 @@
+"""Collector: tracking, scrittura locale e sync, senza interfaccia grafica"""
+
+import threading
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.settings import Config
+from core.database import DatabaseManager
+from core.ipc import IPCServer
+from core.level_dispatcher import LevelUpdateDispatcher
+from core.metrics import registry
+from core.mongo_sync import MongoSyncManager
+from core.reporting import ReportEngine
+from core.retention import RetentionManager
+from core.rules import RuleEngine
+from core.scheduler import Scheduler
+from core.sinks import build_sinks
+from core.tracker import ActivityTracker
+from core.window_service import ActiveWindowService
+
+LevelsSubscriber = Callable[[List[Dict]], None]
+
+
+class Collector:
+    """Possiede rilevamento, database e sync; GUI e CLI ne sono client
+
+    Nel processo della GUI (modalità singola) viene usato direttamente;
+    come daemon espone la stessa interfaccia su socket Unix con serve().
+    """
+
+    def __init__(self, config: Config, started_at: Optional[float] = None):
+        self.config = config
+        self.rules = RuleEngine.from_config(config)
+        # Componenti locali: nessun accesso alla rete
+        self.db_manager = DatabaseManager(
+            config.DB_PATH,
+            synchronous=config.DB_SYNCHRONOUS,
+            write_behind=config.DB_WRITE_BEHIND,
+            flush_interval=config.DB_FLUSH_INTERVAL,
+            batch_size=config.DB_BATCH_SIZE,
+        )
+        self.mongo_manager = MongoSyncManager(config, rules=self.rules)
+        self.window_service = ActiveWindowService()
+        self.tracker = ActivityTracker(
+            config,
+            self.db_manager,
+            self.mongo_manager,
+            self.window_service,
+            started_at=started_at,
+            sinks=build_sinks(config, self.mongo_manager, self.db_manager.instance_id),
+            rules=self.rules,
+        )
+        self.level_dispatcher = LevelUpdateDispatcher(
+            self.mongo_manager, config.DB_PATH
+        )
+        self.scheduler = Scheduler()
+        self.ipc: Optional[IPCServer] = None
+        self._levels_subscribers: List[LevelsSubscriber] = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Avvia il tracking prima di tutto il resto, poi rete e manutenzione"""
+        config = self.config
+        self.window_service.start()
+        self.tracker.schedule(self.scheduler)
+        self.scheduler.start()
+
+        # Metriche
+        if config.METRICS_PORT:
+            registry.serve(config.METRICS_PORT)
+            print(f"[INFO] Metriche su http://127.0.0.1:{config.METRICS_PORT}/metrics")
+        if config.METRICS_DUMP_PATH:
+            self.scheduler.add(
+                "metrics_dump",
+                partial(registry.dump_json, config.METRICS_DUMP_PATH),
+                config.METRICS_DUMP_INTERVAL,
+                delay=config.METRICS_DUMP_INTERVAL,
+                blocking=True,
+            )
+
+        # MongoDB (indici, device) e thread di supporto in background
+        self.mongo_manager.start()
+        self.level_dispatcher.start()
+        self.scheduler.add(
+            "levels_refresh",
+            self._refresh_levels,
+            config.LEVELS_REFRESH_INTERVAL,
+            blocking=True,
+        )
+        # Classificazioni dello storico: tutte se le regole sono cambiate
+        self.scheduler.add(
+            "reclassify",
+            partial(self.db_manager.reclassify, self.rules),
+            config.RULES_RECLASSIFY_INTERVAL,
+            blocking=True,
+        )
+        if config.RETENTION_DAYS > 0:
+            RetentionManager(
+                config.DB_PATH, config.ARCHIVE_DIR, config.RETENTION_DAYS
+            ).start(config.RETENTION_INTERVAL)
+
+    def serve(self, socket_path: str):
+        """Espone il collector ai client su socket Unix"""
+        self.ipc = IPCServer(
+            socket_path,
+            {
+                "ping": lambda: "pong",
+                "active_window": self.active_window,
+                "rows": self.rows,
+                "set_level": self.set_level,
+                "report": self.report,
+                "status": self.status,
+            },
+        )
+        self.ipc.start()
+        self.subscribe(
+            lambda process, title: self.ipc.publish("active_window", [process, title]),
+            partial(self.ipc.publish, "levels"),
+        )
+
+    def stop(self):
+        """Chiude la sessione in corso e scrive su disco gli eventi in coda"""
+        if self.ipc is not None:
+            self.ipc.stop()
+        self.scheduler.stop()
+        self.tracker.stop()
+        self.level_dispatcher.stop()
+        self.db_manager.close()
+
+    def _refresh_levels(self):
+        """Scarica i livelli cambiati e li notifica ai client
+
+        Le righe con una modifica locale non ancora inviata non vengono
+        notificate, così il valore remoto non sovrascrive quello nuovo.
+        """
+        apps = [
+            {**app, "_id": str(app["_id"])}
+            for app in self.mongo_manager.refresh_process_windows()
+            if not self.level_dispatcher.is_pending(str(app["_id"]))
+        ]
+        if not apps:
+            return
+        with self._lock:
+            subscribers = list(self._levels_subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber(apps)
+            except Exception as e:
+                print(f"[LEVELS SUBSCRIBER ERROR] {e}")
+
+    # Interfaccia per i client (GUI in-process o via IPC)
+
+    def rows(self) -> List[Dict]:
+        """Processi/finestre con livello, dalla cache locale (esclusi scartati)"""
+        return [
+            row
+            for row in self.mongo_manager.window_cache.load(self.config.DEVICE_ID)
+            if not self.rules.is_excluded(row["process"], row["window_title"])
+        ]
+
+    def active_window(self) -> Tuple[str, str]:
+        """Ultimo (processo, finestra) rilevato"""
+        return self.window_service.snapshot()
+
+    def set_level(self, app_id: str, level: int):
+        """Salva il livello nella cache e lo accoda per MongoDB"""
+        self.mongo_manager.window_cache.set_level(str(app_id), level)
+        self.level_dispatcher.submit(app_id, level)
+
+    def report(
+        self, kind: str, start: str, end: str, process: Optional[str] = None
+    ) -> List:
+        """Report aggregati sull'intervallo [start, end) (date/ore ISO, ora locale)
+
+        Gli eventi grezzi non passano di qui: una risposta IPC è una riga
+        JSON, mentre report.py events li legge in streaming dal database.
+        """
+        start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+        engine = ReportEngine(self.config.DB_PATH, self.config.ARCHIVE_DIR)
+        try:
+            if kind == "processes":
+                return engine.time_per_process(start_dt, end_dt, process)
+            if kind == "domains":
+                return engine.time_per_domain(start_dt, end_dt)
+            if kind == "levels":
+                levels = self.mongo_manager.window_cache.levels(self.config.DEVICE_ID)
+                return engine.time_per_level(start_dt, end_dt, levels)
+            if kind == "categories":
+                return engine.time_per_category(start_dt, end_dt, self.rules)
+            raise ValueError(f"report sconosciuto: {kind}")
+        finally:
+            engine.close()
+
+    def status(self) -> Dict:
+        """Stato del collector: finestra attiva, backlog e watermark dei sink"""
+        return {
+            "active_window": list(self.active_window()),
+            "unsynced": self.db_manager.unsynced_count(),
+            "sinks": {
+                sink.name: self.db_manager.get_sink_watermark(sink.name)
+                for sink in self.tracker.sinks
+            },
+            "mongo_ready": self.mongo_manager.ready.is_set(),
+        }
+
+    def subscribe(
+        self,
+        on_active: Callable[[str, str], None],
+        on_levels: LevelsSubscriber,
+    ):
+        """Notifiche di cambio finestra attiva e di livelli aggiornati"""
+        self.window_service.subscribe(on_active)
+        with self._lock:
+            self._levels_subscribers.append(on_levels)
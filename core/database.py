@@ -1,37 +1,309 @@
 """Gestione database SQLite locale"""
 
+import queue
 import sqlite3
-from typing import List, Tuple
-from datetime import datetime, timezone
+import threading
+import time
+import uuid
+from typing import Iterator, List, Optional, Tuple
+
+from core.dictionary import StringDictionary
+from core.metrics import SIZE_BUCKETS, MetricsRegistry, registry
+from core.rules import RuleEngine
+from core.sessions import SessionBuilder
+
+
+# Marcatore di arresto per il thread writer
+_STOP = object()
+
+# Versione dello schema (PRAGMA user_version)
+# 1: stringhe ripetute spostate in tabelle di lookup
+# 2: timestamp come millisecondi epoch (INTEGER) invece di stringhe ISO
+SCHEMA_VERSION = 2
+
+# Massimo rowid SQLite
+_MAX_ROWID = 2**63 - 1
+
+# Backoff tra i tentativi di scrittura del writer (secondi)
+_RETRY_BASE_DELAY = 0.5
+_MAX_RETRY_DELAY = 30.0
 
 
 class DatabaseManager:
     """Gestisce le operazioni sul database SQLite locale"""
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        synchronous: str = "NORMAL",
+        write_behind: bool = True,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
         self.db_path = db_path
+        self.synchronous = synchronous
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        # Connessione unica condivisa, protetta da lock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.dictionary = StringDictionary()
+        self.sessions = SessionBuilder(self.dictionary)
+        self._configure_connection()
         self._init_database()
+        self.instance_id = self._instance_id()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._closing = threading.Event()
+        # Righe che il writer non è riuscito a scrivere prima dell'arresto
+        self._unwritten: List[Tuple] = []
+
+        metrics = metrics or registry
+        self._m_write = metrics.histogram(
+            "sqlite_write_batch_seconds", "Durata di insert e commit di un batch"
+        )
+        self._m_rows = metrics.histogram(
+            "sqlite_write_batch_rows", "Righe per batch scritto", SIZE_BUCKETS
+        )
+        self._m_errors = metrics.counter(
+            "errors_total", "Errori per componente", component="sqlite"
+        )
+        metrics.gauge(
+            "sqlite_write_queue", "Eventi in attesa del writer", self._queue.qsize
+        )
+        metrics.gauge(
+            "unsynced_backlog", "Record locali non sincronizzati", self.unsynced_count
+        )
+        if self.write_behind:
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="sqlite-writer", daemon=True
+            )
+            self._writer.start()
+
+    def _configure_connection(self):
+        """Imposta WAL e livello di synchronous"""
+        with self._lock:
+            # Effettivo solo su database nuovi: permette incremental_vacuum
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._conn.execute("PRAGMA busy_timeout=5000")
 
     def _init_database(self):
         """Inizializza il database con le tabelle necessarie"""
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
+        with self._lock:
+            cur = self._conn.cursor()
+            version = cur.execute("PRAGMA user_version").fetchone()[0]
+            existing = self._table_exists(cur, "activity")
+            legacy = version < 1 and existing
+            iso_timestamps = version < 2 and existing
+
+            cur.execute("BEGIN")
+            try:
+                self.dictionary.init_schema(cur)
+                if legacy:
+                    self._migrate_dictionary(cur)
+                if iso_timestamps:
+                    self._migrate_epoch(cur)
+                self._create_activity(cur)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS sink_watermarks (
+                        name TEXT PRIMARY KEY,
+                        last_id INTEGER NOT NULL
+                    )
+                """
+                )
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT
+                    )
+                """
+                )
+                RuleEngine.init_schema(cur)
+                if self.sessions.init_schema(cur):
+                    self._rebuild_sessions(cur)
+                cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self.dictionary.invalidate()
+                raise
+
+            if iso_timestamps:
+                # Recupera lo spazio delle stringhe sostituite
+                print(
+                    f"[DB] Schema migrato alla versione {SCHEMA_VERSION}, compattazione..."
+                )
+                self._conn.execute("VACUUM")
+
+    def _instance_id(self) -> str:
+        """Identificativo casuale di questo database, generato una volta
+
+        Gli id locali ripartono da 1 in un database nuovo (reinstallazione,
+        file cancellato, altro DB_PATH): device + istanza + id resta unico.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('instance_id', ?)",
+                (uuid.uuid4().hex[:16],),
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'instance_id'"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _table_exists(cur: sqlite3.Cursor, name: str) -> bool:
+        return (
+            cur.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (name,),
+            ).fetchone()
+            is not None
+        )
+
+    @staticmethod
+    def _create_activity(cur: sqlite3.Cursor):
+        """Tabella activity con stringhe codificate e relativi indici"""
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS activity (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                process TEXT,
-                window_title TEXT,
+                timestamp INTEGER,
+                process_id INTEGER REFERENCES processes (id),
+                title_id INTEGER REFERENCES window_titles (id),
                 cpu_percent REAL,
                 synced INTEGER DEFAULT 0,
-                device_id TEXT,
-                username TEXT
+                identity_id INTEGER REFERENCES identities (id)
             )
         """
         )
-        conn.commit()
-        conn.close()
+        # Stesse colonne, nello stesso ordine, dello schema originale
+        cur.execute(
+            """
+            CREATE VIEW IF NOT EXISTS activity_expanded AS
+            SELECT a.id, a.timestamp, p.name AS process, w.title AS window_title,
+                   a.cpu_percent, a.synced, i.device_id, i.username
+            FROM activity a
+            JOIN processes p ON p.id = a.process_id
+            JOIN window_titles w ON w.id = a.title_id
+            JOIN identities i ON i.id = a.identity_id
+        """
+        )
+        # Indice parziale: la scansione dei non sincronizzati resta
+        # proporzionale al backlog, non alla dimensione della tabella
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_activity_unsynced
+            ON activity (id) WHERE synced = 0
+        """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_activity_timestamp
+            ON activity (timestamp)
+        """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_activity_process
+            ON activity (process_id, timestamp)
+        """
+        )
+
+    def _migrate_dictionary(self, cur: sqlite3.Cursor):
+        """Migra activity dallo schema a stringhe ripetute alle tabelle di lookup"""
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO processes (name)
+            SELECT DISTINCT IFNULL(process, '') FROM activity
+        """
+        )
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO window_titles (title)
+            SELECT DISTINCT IFNULL(window_title, '') FROM activity
+        """
+        )
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO identities (device_id, username)
+            SELECT DISTINCT IFNULL(device_id, ''), IFNULL(username, '') FROM activity
+        """
+        )
+        cur.execute("ALTER TABLE activity RENAME TO activity_legacy")
+        for index in ("unsynced", "timestamp", "process"):
+            cur.execute(f"DROP INDEX IF EXISTS idx_activity_{index}")
+        self._create_activity(cur)
+        cur.execute(
+            """
+            INSERT INTO activity (id, timestamp, process_id, title_id,
+                                  cpu_percent, synced, identity_id)
+            SELECT a.id, a.timestamp, p.id, w.id, a.cpu_percent, a.synced, i.id
+            FROM activity_legacy a
+            JOIN processes p ON p.name = IFNULL(a.process, '')
+            JOIN window_titles w ON w.title = IFNULL(a.window_title, '')
+            JOIN identities i ON i.device_id = IFNULL(a.device_id, '')
+                             AND i.username = IFNULL(a.username, '')
+            ORDER BY a.id
+        """
+        )
+        cur.execute("DROP TABLE activity_legacy")
+        # Sessioni ricostruite con gli id: vedi _rebuild_sessions
+        cur.execute("DROP VIEW IF EXISTS sessions_expanded")
+        cur.execute("DROP TABLE IF EXISTS sessions")
+        cur.execute("DROP TABLE IF EXISTS daily_rollup")
+
+    @staticmethod
+    def _epoch_ms_sql(column: str) -> str:
+        """Espressione SQL: stringa ISO 8601 → millisecondi epoch"""
+        return (
+            f"CASE WHEN typeof({column}) = 'text' "
+            f"THEN CAST(ROUND((julianday({column}) - 2440587.5) * 86400000) AS INTEGER) "
+            f"ELSE {column} END"
+        )
+
+    def _migrate_epoch(self, cur: sqlite3.Cursor):
+        """Ricrea activity con timestamp INTEGER convertendo le stringhe ISO"""
+        cur.execute("DROP VIEW IF EXISTS activity_expanded")
+        cur.execute("ALTER TABLE activity RENAME TO activity_v1")
+        for index in ("unsynced", "timestamp", "process"):
+            cur.execute(f"DROP INDEX IF EXISTS idx_activity_{index}")
+        self._create_activity(cur)
+        cur.execute(
+            f"""
+            INSERT INTO activity (id, timestamp, process_id, title_id,
+                                  cpu_percent, synced, identity_id)
+            SELECT id, {self._epoch_ms_sql("timestamp")}, process_id, title_id,
+                   cpu_percent, synced, identity_id
+            FROM activity_v1
+            ORDER BY id
+        """
+        )
+        cur.execute("DROP TABLE activity_v1")
+
+    def _rebuild_sessions(self, cur: sqlite3.Cursor):
+        """Ricostruisce sessioni e rollup dallo storico esistente"""
+        cur.execute("DELETE FROM sessions")
+        cur.execute("DELETE FROM daily_rollup")
+        history = self._conn.execute(
+            """
+            SELECT id, timestamp, process, window_title FROM activity_expanded
+            ORDER BY id
+        """
+        )
+        for event_id, timestamp, process, window_title in history:
+            self.sessions.apply(cur, event_id, timestamp / 1000, process, window_title)
+        # La fine dell'ultima sessione non è nota
+        self.sessions.reset()
 
     def insert_activity(
         self,
@@ -42,38 +314,257 @@ class DatabaseManager:
         username: str,
     ):
         """Inserisce un nuovo record di attività"""
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        timestamp = datetime.now(timezone.utc).isoformat()
+        now = time.time()
+        row = (
+            now,
+            round(now * 1000),
+            process,
+            window_title,
+            cpu_percent,
+            device_id,
+            username,
+        )
 
-        try:
-            cur.execute(
+        if self.write_behind and not self._closed:
+            # Scrittura differita: il thread writer esegue il commit a gruppi
+            self._queue.put(row)
+        else:
+            self._write_batch([row])
+
+    def _write_batch(self, rows: List[Tuple]):
+        """Scrive un gruppo di record e le sessioni chiuse in un'unica transazione"""
+        self._m_rows.observe(len(rows))
+        with self._lock, self._m_write.time():
+            cur = self._conn.cursor()
+            state = self.sessions.snapshot()
+            try:
+                for ts, timestamp, process, title, cpu, device_id, username in rows:
+                    cur.execute(
+                        """
+                        INSERT INTO activity (timestamp, process_id, title_id,
+                                              cpu_percent, synced, identity_id)
+                        VALUES (?, ?, ?, ?, 0, ?)
+                    """,
+                        (
+                            timestamp,
+                            self.dictionary.process_id(cur, process),
+                            self.dictionary.title_id(cur, title),
+                            cpu,
+                            self.dictionary.identity_id(cur, device_id, username),
+                        ),
+                    )
+                    self.sessions.apply(cur, cur.lastrowid, ts, process, title)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self.sessions.restore(state)
+                self.dictionary.invalidate()
+                self._m_errors.inc()
+                raise
+
+    def _writer_loop(self):
+        """Svuota la coda e committa a gruppi con latenza limitata"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch, waiters, stop = [], [], False
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    # Richiesta di flush: committa subito quanto accumulato
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+
+            if batch and not self._write_retrying(batch):
+                # Arresto con il database ancora in errore: ci riprova close()
+                self._unwritten.extend(batch)
+                stop = True
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write_retrying(self, rows: List[Tuple]) -> bool:
+        """Scrive il gruppo ritentando con backoff finché non riesce
+
+        Un errore (es. "database is locked" mentre retention o cache
+        scrivono sullo stesso file) non fa perdere eventi: intanto i nuovi
+        restano in coda. False se close() arriva prima che la scrittura
+        riesca.
+        """
+        attempt = 0
+        while True:
+            try:
+                self._write_batch(rows)
+                return True
+            except Exception as e:
+                delay = min(_MAX_RETRY_DELAY, _RETRY_BASE_DELAY * 2**attempt)
+                attempt += 1
+                print(
+                    f"[DB WRITE ERROR] {e}: {len(rows)} eventi, "
+                    f"tentativo {attempt}, nuovo in {delay:.1f}s"
+                )
+                if self._closing.wait(delay):
+                    return False
+
+    def flush(self, timeout: Optional[float] = None):
+        """Attende che gli eventi in coda siano scritti su disco"""
+        if not self._writer or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """Scrive gli eventi rimasti in coda e chiude la connessione"""
+        if self._closed:
+            return
+        self._closed = True
+        self._closing.set()
+        if self._writer and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+        # Eventi non scritti dal writer o arrivati dopo il suo arresto
+        pending = self._unwritten
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._write_batch(pending)
+
+        with self._lock:
+            self._conn.close()
+
+    def unsynced_count(self) -> int:
+        """Numero di record non sincronizzati (indice parziale)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM activity WHERE synced = 0"
+            ).fetchone()[0]
+
+    def get_unsynced_records(
+        self, after_id: int = 0, limit: int = 1000, max_id: int = _MAX_ROWID
+    ) -> List[Tuple]:
+        """Recupera un blocco di record non sincronizzati ordinati per id"""
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT * FROM activity_expanded
+                WHERE synced = 0 AND id > ? AND id <= ?
+                ORDER BY id
+                LIMIT ?
+            """,
+                (after_id, max_id, limit),
+            ).fetchall()
+
+    def iter_unsynced_chunks(
+        self, chunk_size: int = 1000, after_id: int = 0
+    ) -> Iterator[List[Tuple]]:
+        """Itera i record non sincronizzati a blocchi, usando l'id come watermark
+
+        Il passaggio si ferma all'ultimo id presente all'avvio: i record
+        inseriti nel frattempo vengono inviati al ciclo successivo.
+        """
+        with self._lock:
+            max_id = self._conn.execute("SELECT MAX(id) FROM activity").fetchone()[0]
+        if max_id is None:
+            return
+
+        last_id = after_id
+        while True:
+            chunk = self.get_unsynced_records(last_id, chunk_size, max_id)
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1][0]
+
+    def mark_as_synced(self, first_id: int, last_id: int):
+        """Marca come sincronizzati solo i record nell'intervallo confermato"""
+        with self._lock:
+            self._conn.execute(
                 """
-                INSERT INTO activity (timestamp, process, window_title, 
-                                    cpu_percent, synced, device_id, username)
-                VALUES (?, ?, ?, ?, 0, ?, ?)
+                UPDATE activity SET synced = 1
+                WHERE synced = 0 AND id BETWEEN ? AND ?
             """,
-                (timestamp, process, window_title, cpu_percent, device_id, username),
+                (first_id, last_id),
             )
-            conn.commit()
-        finally:
-            conn.close()
-
-    def get_unsynced_records(self) -> List[Tuple]:
-        """Recupera tutti i record non sincronizzati"""
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        try:
-            return cur.execute("SELECT * FROM activity WHERE synced = 0").fetchall()
-        finally:
-            conn.close()
-
-    def mark_as_synced(self):
-        """Marca tutti i record come sincronizzati"""
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        try:
-            cur.execute("UPDATE activity SET synced = 1 WHERE synced = 0")
-            conn.commit()
-        finally:
-            conn.close()
+            self._conn.commit()
+
+    def get_sink_watermark(self, name: str) -> int:
+        """Ultimo id confermato dal sink (0 se mai sincronizzato)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_id FROM sink_watermarks WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_sink_watermark(self, name: str, last_id: int):
+        """Avanza il watermark del sink"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO sink_watermarks (name, last_id) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)
+            """,
+                (name, last_id),
+            )
+            self._conn.commit()
+
+    def get_closed_sessions(
+        self, first_id: int, last_id: int
+    ) -> List[Tuple[float, float, str, int]]:
+        """Sessioni chiuse da un evento nell'intervallo di id
+
+        Tuple (start, end, processo, id dell'evento di chiusura). Ogni
+        sessione appartiene al blocco che contiene il suo evento di
+        chiusura, quindi viene contata una sola volta.
+        """
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT s.start_ts, s.end_ts, p.name, s.end_event_id FROM sessions s
+                JOIN processes p ON p.id = s.process_id
+                WHERE s.end_event_id BETWEEN ? AND ?
+            """,
+                (first_id, last_id),
+            ).fetchall()
+
+    def reclassify(self, rules: RuleEngine) -> int:
+        """Aggiorna le classificazioni dello storico (vedi RuleEngine.reclassify)"""
+        with self._lock:
+            return rules.reclassify(self._conn)
+
+    def get_daily_rollup(self, day: str) -> List[Tuple[str, float]]:
+        """Secondi per processo nel giorno dato (YYYY-MM-DD, ora locale)"""
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT process, duration FROM daily_rollup
+                WHERE day = ?
+                ORDER BY duration DESC
+            """,
+                (day,),
+            ).fetchall()
@@ -0,0 +1,106 @@
+"""Dizionario delle stringhe ripetute (processi, titoli, device/utente)"""
+
+import sqlite3
+from typing import Dict, Tuple
+
+# Oltre questa soglia la cache in memoria viene svuotata
+_MAX_CACHED = 100000
+
+
+class StringDictionary:
+    """Interna le stringhe in tabelle di lookup con id interi
+
+    Le righe di activity e sessions salvano solo gli id; le viste
+    activity_expanded e sessions_expanded ricostruiscono le stringhe.
+    """
+
+    def __init__(self):
+        self._processes: Dict[str, int] = {}
+        self._titles: Dict[str, int] = {}
+        self._identities: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def init_schema(cur: sqlite3.Cursor):
+        """Crea le tabelle di lookup"""
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processes (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS window_titles (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL UNIQUE
+            )
+        """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS identities (
+                id INTEGER PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                username TEXT NOT NULL,
+                UNIQUE (device_id, username)
+            )
+        """
+        )
+
+    def invalidate(self):
+        """Svuota la cache (es. dopo il rollback di una transazione)"""
+        self._processes.clear()
+        self._titles.clear()
+        self._identities.clear()
+
+    def process_id(self, cur: sqlite3.Cursor, name: str) -> int:
+        """Id del processo, creato se assente"""
+        return self._intern(cur, self._processes, "processes", ("name",), (name,))
+
+    def title_id(self, cur: sqlite3.Cursor, title: str) -> int:
+        """Id del titolo finestra, creato se assente"""
+        return self._intern(cur, self._titles, "window_titles", ("title",), (title,))
+
+    def identity_id(self, cur: sqlite3.Cursor, device_id: str, username: str) -> int:
+        """Id della coppia device/utente, creato se assente"""
+        return self._intern(
+            cur,
+            self._identities,
+            "identities",
+            ("device_id", "username"),
+            (device_id, username),
+        )
+
+    @staticmethod
+    def _intern(
+        cur: sqlite3.Cursor,
+        cache: Dict,
+        table: str,
+        columns: Tuple[str, ...],
+        values: Tuple[str, ...],
+    ) -> int:
+        """Cerca la stringa in cache, poi in tabella, altrimenti la inserisce"""
+        values = tuple("" if v is None else v for v in values)
+        key = values if len(values) > 1 else values[0]
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        where = " AND ".join(f"{c} = ?" for c in columns)
+        row = cur.execute(f"SELECT id FROM {table} WHERE {where}", values).fetchone()
+        if row:
+            string_id = row[0]
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            cur.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                values,
+            )
+            string_id = cur.lastrowid
+
+        if len(cache) >= _MAX_CACHED:
+            cache.clear()
+        cache[key] = string_id
+        return string_id
@@ -0,0 +1,178 @@
+"""Sorgenti del tempo di inattività dell'utente"""
+
+import ctypes
+import ctypes.util
+import os
+import platform
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class IdleTimeSource(ABC):
+    """Interfaccia: secondi trascorsi dall'ultimo input dell'utente"""
+
+    def start(self):
+        """Avvia eventuali listener"""
+
+    def stop(self):
+        """Ferma eventuali listener"""
+
+    @abstractmethod
+    def idle_seconds(self) -> float:
+        """Secondi dall'ultimo input"""
+
+
+class _XScreenSaverInfo(ctypes.Structure):
+    _fields_ = [
+        ("window", ctypes.c_ulong),
+        ("state", ctypes.c_int),
+        ("kind", ctypes.c_int),
+        ("til_or_since", ctypes.c_ulong),
+        ("idle", ctypes.c_ulong),
+        ("event_mask", ctypes.c_ulong),
+    ]
+
+
+class XScreenSaverIdleSource(IdleTimeSource):
+    """Contatore di inattività di X11 (estensione MIT-SCREEN-SAVER)
+
+    Nessuna callback Python per evento: il server X tiene il conteggio e
+    viene interrogato solo quando il tracker ne ha bisogno.
+    """
+
+    def __init__(self, display_name: Optional[str] = None):
+        xlib_path = ctypes.util.find_library("X11")
+        xss_path = ctypes.util.find_library("Xss")
+        if not xlib_path or not xss_path:
+            raise OSError("libX11/libXss non trovate")
+
+        self._xlib = ctypes.cdll.LoadLibrary(xlib_path)
+        self._xss = ctypes.cdll.LoadLibrary(xss_path)
+        self._xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self._xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self._xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(_XScreenSaverInfo)
+        self._xss.XScreenSaverQueryInfo.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.POINTER(_XScreenSaverInfo),
+        ]
+
+        name = display_name.encode() if display_name else None
+        self._display = self._xlib.XOpenDisplay(name)
+        if not self._display:
+            raise OSError("display X non disponibile")
+        self._root = self._xlib.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    def idle_seconds(self) -> float:
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            raise OSError("XScreenSaverQueryInfo fallita")
+        return self._info.contents.idle / 1000.0
+
+
+class WindowsIdleSource(IdleTimeSource):
+    """GetLastInputInfo di Windows"""
+
+    def __init__(self):
+        class _LastInputInfo(ctypes.Structure):
+            _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+        self._user32 = ctypes.windll.user32  # type: ignore[attr-defined]
+        self._kernel32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        self._info = _LastInputInfo()
+        self._info.cbSize = ctypes.sizeof(_LastInputInfo)
+
+    def idle_seconds(self) -> float:
+        self._user32.GetLastInputInfo(ctypes.byref(self._info))
+        elapsed = (self._kernel32.GetTickCount() - self._info.dwTime) & 0xFFFFFFFF
+        return elapsed / 1000.0
+
+
+class MacOSIdleSource(IdleTimeSource):
+    """CGEventSourceSecondsSinceLastEventType di Quartz"""
+
+    def __init__(self):
+        import Quartz  # type: ignore
+
+        self._quartz = Quartz
+
+    def idle_seconds(self) -> float:
+        q = self._quartz
+        return q.CGEventSourceSecondsSinceLastEventType(
+            q.kCGEventSourceStateCombinedSessionState, q.kCGAnyInputEventType
+        )
+
+
+class PynputIdleSource(IdleTimeSource):
+    """Fallback basato su pynput con i movimenti del mouse limitati
+
+    Un solo listener per dispositivo, sempre attivo. I movimenti del mouse
+    arrivano a centinaia al secondo: dopo averne registrato uno, quelli
+    entro throttle secondi vengono scartati con un solo confronto, senza
+    aggiornare lo stato. idle_seconds() è quindi in ritardo al più di
+    throttle secondi. Click, scroll e tasti vengono sempre registrati.
+    """
+
+    def __init__(self, throttle: float = 1.0):
+        self.throttle = throttle
+        self._last_input = time.monotonic()
+        # Istante dopo il quale il prossimo movimento viene registrato
+        self._next_move = 0.0
+        self._listeners = []
+
+    def start(self):
+        from pynput import mouse, keyboard
+
+        self._listeners = [
+            mouse.Listener(
+                on_move=self._on_move,
+                on_click=self._on_input,
+                on_scroll=self._on_input,
+            ),
+            keyboard.Listener(on_press=self._on_input),
+        ]
+        for listener in self._listeners:
+            listener.start()
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+
+    def _on_move(self, *args):
+        """Movimento del mouse: al più uno registrato per finestra"""
+        now = time.monotonic()
+        if now >= self._next_move:
+            self._last_input = now
+            self._next_move = now + self.throttle
+
+    def _on_input(self, *args):
+        """Click, scroll e tasti"""
+        self._last_input = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self._last_input
+
+
+def create_idle_source(kind: str = "auto") -> IdleTimeSource:
+    """Sceglie la sorgente: contatore del sistema operativo o pynput"""
+    if kind in ("auto", "os"):
+        system = platform.system()
+        try:
+            if system == "Linux" and os.getenv("DISPLAY"):
+                return XScreenSaverIdleSource()
+            if system == "Windows":
+                return WindowsIdleSource()
+            if system == "Darwin":
+                return MacOSIdleSource()
+        except Exception as e:
+            if kind == "os":
+                raise
+            print(f"[WARN] Idle di sistema non disponibile, uso pynput: {e}")
+        else:
+            if kind == "os":
+                raise OSError(f"Nessun contatore di inattività per {system}")
+    return PynputIdleSource()
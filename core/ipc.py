@@ -0,0 +1,315 @@
+"""IPC locale tra collector e client (GUI, CLI) su socket Unix
+
+Protocollo a righe JSON. Richiesta: {"id", "method", "params"}; risposta:
+{"id", "result"} oppure {"id", "error"}. Dopo "subscribe" il server invia
+sulla stessa connessione anche eventi {"event", "data"}.
+"""
+
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+Handler = Callable[..., Any]
+
+# Messaggi in uscita accodabili per client: oltre, il client è scollegato
+OUTBOX_SIZE = 1000
+
+# Marcatore di arresto per il thread di scrittura di una connessione
+_CLOSE = object()
+
+
+class IPCError(Exception):
+    """Errore riportato dal collector o connessione persa"""
+
+
+def available() -> bool:
+    """True se la piattaforma supporta i socket Unix"""
+    return hasattr(socket, "AF_UNIX")
+
+
+def _encode(message: Dict) -> bytes:
+    # default=str: ObjectId e datetime viaggiano come stringhe
+    return (json.dumps(message, ensure_ascii=False, default=str) + "\n").encode()
+
+
+class _Connection(socketserver.StreamRequestHandler):
+    """Una connessione client: richieste in ordine, eventi intercalati
+
+    Risposte ed eventi passano da una coda limitata svuotata da un thread
+    dedicato: send() non blocca mai chi pubblica (tracker, watcher). Un
+    client che smette di leggere riempie la coda e viene scollegato.
+    """
+
+    def setup(self):
+        super().setup()
+        self.topics: Set[str] = set()
+        self.outbox: "queue.Queue" = queue.Queue(maxsize=OUTBOX_SIZE)
+        self.closed = False
+        threading.Thread(target=self._writer, name="ipc-writer", daemon=True).start()
+
+    def send(self, message: Dict):
+        """Accoda un messaggio; con la coda piena il client viene chiuso"""
+        if self.closed:
+            raise OSError("connessione chiusa")
+        try:
+            self.outbox.put_nowait(message)
+        except queue.Full:
+            print("[IPC WARN] client lento: coda in uscita piena, disconnesso")
+            self.close()
+            raise OSError("coda in uscita piena")
+
+    def close(self):
+        """Chiude il socket: sblocca lettura e scrittura in corso"""
+        self.closed = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _writer(self):
+        """Scrive i messaggi accodati sul socket"""
+        while True:
+            message = self.outbox.get()
+            if message is _CLOSE:
+                return
+            try:
+                self.wfile.write(_encode(message))
+                self.wfile.flush()
+            except (OSError, ValueError):
+                # ValueError: file già chiuso da finish()
+                self.close()
+                return
+
+    def handle(self):
+        server: "IPCServer" = self.server.owner  # type: ignore[attr-defined]
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                self.send(server.dispatch(self, request))
+        except OSError:
+            pass
+        finally:
+            server.unsubscribe(self)
+            self.closed = True
+            try:
+                self.outbox.put_nowait(_CLOSE)
+            except queue.Full:
+                # Il writer è bloccato su un client che non legge
+                self.close()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class IPCServer:
+    """Server JSON-lines su socket Unix, un thread per client"""
+
+    def __init__(self, socket_path: str, handlers: Dict[str, Handler]):
+        self.socket_path = socket_path
+        self.handlers = dict(handlers)
+        self._lock = threading.Lock()
+        self._subscribers: List[_Connection] = []
+        self._server: Optional[_UnixServer] = None
+
+    def start(self):
+        """Apre il socket (rimuovendo quello di un collector terminato)"""
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path):
+                raise IPCError(f"collector già attivo su {self.socket_path}")
+            os.unlink(self.socket_path)
+        self._server = _UnixServer(self.socket_path, _Connection)
+        self._server.owner = self  # type: ignore[attr-defined]
+        # Solo l'utente corrente può collegarsi
+        os.chmod(self.socket_path, 0o600)
+        threading.Thread(
+            target=self._server.serve_forever, name="ipc-server", daemon=True
+        ).start()
+
+    def stop(self):
+        """Chiude il socket"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def dispatch(self, connection: _Connection, request: Dict) -> Dict:
+        """Esegue una richiesta e costruisce la risposta"""
+        request_id = request.get("id")
+        method = request.get("method")
+        params = request.get("params") or {}
+        try:
+            if method == "subscribe":
+                connection.topics.update(params.get("topics", []))
+                with self._lock:
+                    if connection not in self._subscribers:
+                        self._subscribers.append(connection)
+                return {"id": request_id, "result": sorted(connection.topics)}
+            handler = self.handlers.get(method)
+            if handler is None:
+                raise IPCError(f"metodo sconosciuto: {method}")
+            return {"id": request_id, "result": handler(**params)}
+        except Exception as e:
+            return {"id": request_id, "error": str(e)}
+
+    def unsubscribe(self, connection: _Connection):
+        with self._lock:
+            if connection in self._subscribers:
+                self._subscribers.remove(connection)
+
+    def publish(self, topic: str, data: Any):
+        """Invia un evento ai client iscritti al topic"""
+        with self._lock:
+            targets = [c for c in self._subscribers if topic in c.topics]
+        for connection in targets:
+            try:
+                connection.send({"event": topic, "data": data})
+            except OSError:
+                self.unsubscribe(connection)
+
+
+class IPCClient:
+    """Client del collector: chiamate sincrone ed eventi su un thread lettore"""
+
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        self.timeout = timeout
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(socket_path)
+        self._rfile = self._sock.makefile("rb")
+        self._write_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[threading.Event, Dict]] = {}
+        self._pending_lock = threading.Lock()
+        self._listeners: Dict[str, List[Callable[[Any], None]]] = {}
+        self._closed = False
+        threading.Thread(target=self._reader, name="ipc-client", daemon=True).start()
+
+    def call(self, method: str, **params) -> Any:
+        """Invoca un metodo del collector e ne ritorna il risultato"""
+        request_id = next(self._ids)
+        done = threading.Event()
+        reply: Dict = {}
+        with self._pending_lock:
+            if self._closed:
+                raise IPCError("connessione al collector chiusa")
+            self._pending[request_id] = (done, reply)
+        try:
+            with self._write_lock:
+                self._sock.sendall(
+                    _encode({"id": request_id, "method": method, "params": params})
+                )
+            if not done.wait(self.timeout):
+                raise IPCError(f"timeout in attesa di {method}")
+        except OSError as e:
+            raise IPCError(str(e)) from e
+        finally:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+        if "error" in reply:
+            raise IPCError(reply["error"])
+        return reply.get("result")
+
+    def subscribe(self, topic: str, callback: Callable[[Any], None]):
+        """Riceve gli eventi del topic (callback nel thread lettore)"""
+        self._listeners.setdefault(topic, []).append(callback)
+        self.call("subscribe", topics=list(self._listeners))
+
+    def _reader(self):
+        """Smista risposte ed eventi"""
+        try:
+            for line in self._rfile:
+                message = json.loads(line)
+                if "event" in message:
+                    for callback in self._listeners.get(message["event"], []):
+                        try:
+                            callback(message.get("data"))
+                        except Exception as e:
+                            print(f"[IPC SUBSCRIBER ERROR] {e}")
+                    continue
+                with self._pending_lock:
+                    waiter = self._pending.get(message.get("id"))
+                if waiter is not None:
+                    waiter[1].update(message)
+                    waiter[0].set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            # Sblocca le chiamate in corso: il collector non risponderà più
+            with self._pending_lock:
+                self._closed = True
+                for done, reply in self._pending.values():
+                    reply["error"] = "connessione al collector chiusa"
+                    done.set()
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+
+def ping(socket_path: str, timeout: float = 1.0) -> bool:
+    """True se un collector risponde sul socket"""
+    if not available() or not os.path.exists(socket_path):
+        return False
+    try:
+        client = IPCClient(socket_path, timeout=timeout)
+    except OSError:
+        return False
+    try:
+        return client.call("ping") == "pong"
+    except IPCError:
+        return False
+    finally:
+        client.close()
+
+
+class CollectorClient:
+    """Stessa interfaccia di Collector usata dalla GUI, via IPC"""
+
+    def __init__(self, socket_path: str):
+        self.client = IPCClient(socket_path)
+
+    def rows(self) -> List[Dict]:
+        return self.client.call("rows")
+
+    def active_window(self) -> Tuple[str, str]:
+        return tuple(self.client.call("active_window"))
+
+    def set_level(self, app_id: str, level: int):
+        self.client.call("set_level", app_id=str(app_id), level=level)
+
+    def report(self, kind: str, start: str, end: str, process: Optional[str] = None):
+        return self.client.call(
+            "report", kind=kind, start=start, end=end, process=process
+        )
+
+    def status(self) -> Dict:
+        return self.client.call("status")
+
+    def subscribe(
+        self,
+        on_active: Callable[[str, str], None],
+        on_levels: Callable[[List[Dict]], None],
+    ):
+        self.client.subscribe("active_window", lambda data: on_active(*data))
+        self.client.subscribe("levels", on_levels)
+
+    def close(self):
+        self.client.close()
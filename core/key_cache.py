@@ -0,0 +1,122 @@
+"""Cache locale delle chiavi process_windows già confermate su MongoDB"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Set, Tuple
+
+# (device_id, process, window_title)
+Key = Tuple[str, str, str]
+
+
+class KnownKeysCache:
+    """Cache LRU persistente delle chiavi già presenti in process_windows
+
+    Anche le chiavi trovate in cache tornano le più recenti: in memoria
+    subito, in SQLite (last_seen) con save_hits(), una scrittura per blocco
+    invece che per lookup. Così dopo un riavvio vengono ricaricate le
+    chiavi usate di recente, non solo quelle inserite di recente.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 10000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[Key, None]" = OrderedDict()
+        # Chiavi trovate in cache, con last_seen da aggiornare in SQLite
+        self._hits: Set[Key] = set()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._init_table()
+        self._load()
+
+    def _init_table(self):
+        """Crea la tabella di persistenza"""
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS known_process_windows (
+                device_id TEXT,
+                process TEXT,
+                window_title TEXT,
+                last_seen REAL,
+                PRIMARY KEY (device_id, process, window_title)
+            )
+        """
+        )
+        self._conn.commit()
+
+    def _load(self):
+        """Carica le chiavi più recenti, dalla meno alla più recente"""
+        rows = self._conn.execute(
+            """
+            SELECT device_id, process, window_title FROM (
+                SELECT * FROM known_process_windows
+                ORDER BY last_seen DESC LIMIT ?
+            ) ORDER BY last_seen
+        """,
+            (self.max_size,),
+        ).fetchall()
+        for row in rows:
+            self._keys[tuple(row)] = None
+
+    def __contains__(self, key: Key) -> bool:
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                self._hits.add(key)
+                return True
+            return False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def save_hits(self):
+        """Salva last_seen delle chiavi trovate in cache dall'ultima chiamata"""
+        with self._lock:
+            # Le chiavi espulse nel frattempo non hanno più una riga
+            hits = [key for key in self._hits if key in self._keys]
+            self._hits.clear()
+            if not hits:
+                return
+            now = time.time()
+            self._conn.executemany(
+                """
+                UPDATE known_process_windows SET last_seen = ?
+                WHERE device_id = ? AND process = ? AND window_title = ?
+            """,
+                [(now, *key) for key in hits],
+            )
+            self._conn.commit()
+
+    def add_many(self, keys: Iterable[Key]):
+        """Registra le chiavi confermate ed espelle le meno recenti"""
+        keys = list(keys)
+        if not keys:
+            return
+
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.max_size:
+                evicted.append(self._keys.popitem(last=False)[0])
+
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO known_process_windows
+                    (device_id, process, window_title, last_seen)
+                VALUES (?, ?, ?, ?)
+            """,
+                [(*key, now) for key in keys],
+            )
+            if evicted:
+                self._conn.executemany(
+                    """
+                    DELETE FROM known_process_windows
+                    WHERE device_id = ? AND process = ? AND window_title = ?
+                """,
+                    evicted,
+                )
+            self._conn.commit()
@@ -0,0 +1,132 @@
+"""Invio coalescente dei livelli di attenzione verso MongoDB"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from core.mongo_sync import MongoSyncManager
+
+
+class LevelUpdateDispatcher:
+    """Raccoglie le modifiche di livello e le invia con un solo bulk_write
+
+    Per ogni _id vale l'ultima modifica. Le modifiche in attesa sono
+    salvate in SQLite (pending_levels) e sopravvivono a riavvii e periodi
+    offline; una riga viene cancellata solo se il livello inviato è ancora
+    quello in coda.
+    """
+
+    def __init__(
+        self,
+        mongo_manager: MongoSyncManager,
+        db_path: str,
+        debounce: float = 0.5,
+        retry_interval: float = 30.0,
+    ):
+        self.mongo_manager = mongo_manager
+        self.debounce = debounce
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._init_table()
+        self._pending: Dict[str, int] = dict(
+            self._conn.execute("SELECT id, level FROM pending_levels")
+        )
+
+    def _init_table(self):
+        """Crea la coda persistente"""
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_levels (
+                id TEXT PRIMARY KEY,
+                level INTEGER NOT NULL,
+                queued_at REAL NOT NULL
+            )
+        """
+        )
+        self._conn.commit()
+
+    def submit(self, doc_id, level: int):
+        """Accoda un livello; sostituisce quello in attesa per lo stesso _id"""
+        doc_id = str(doc_id)
+        with self._lock:
+            self._pending[doc_id] = level
+            self._conn.execute(
+                """
+                INSERT INTO pending_levels (id, level, queued_at) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    level = excluded.level,
+                    queued_at = excluded.queued_at
+            """,
+                (doc_id, level, time.time()),
+            )
+            self._conn.commit()
+        self._wakeup.set()
+
+    def is_pending(self, doc_id) -> bool:
+        """True se il livello dell'_id non è ancora stato inviato"""
+        with self._lock:
+            return str(doc_id) in self._pending
+
+    def flush(self) -> int:
+        """Invia tutte le modifiche in attesa; ritorna quante sono state inviate"""
+        if not self.mongo_manager.enabled:
+            return 0
+        with self._lock:
+            batch = dict(self._pending)
+        if not batch:
+            return 0
+
+        self.mongo_manager.update_levels(batch)
+
+        with self._lock:
+            sent = [(i, lvl) for i, lvl in batch.items() if self._pending.get(i) == lvl]
+            for doc_id, _ in sent:
+                del self._pending[doc_id]
+            self._conn.executemany(
+                "DELETE FROM pending_levels WHERE id = ? AND level = ?", sent
+            )
+            self._conn.commit()
+        return len(batch)
+
+    def start(self):
+        """Avvia il thread di invio"""
+        self._thread = threading.Thread(
+            target=self._loop, name="level-dispatcher", daemon=True
+        )
+        self._thread.start()
+        if self._pending:
+            self._wakeup.set()
+
+    def stop(self):
+        """Ferma il thread e tenta un ultimo invio"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[SET LEVEL ERROR] {len(self._pending)} livelli in attesa: {e}")
+
+    def _loop(self):
+        """Attende le modifiche, lascia passare il debounce e invia"""
+        while not self._stopped.is_set():
+            timeout = self.retry_interval if self._pending else None
+            self._wakeup.wait(timeout)
+            if self._stopped.is_set():
+                break
+            # Le modifiche che arrivano durante il debounce finiscono nello stesso invio
+            time.sleep(self.debounce)
+            self._wakeup.clear()
+            try:
+                sent = self.flush()
+                if sent:
+                    print(f"✅ Aggiornati {sent} livelli")
+            except Exception as e:
+                print(f"[SET LEVEL ERROR] {e}")
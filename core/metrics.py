@@ -0,0 +1,258 @@
+"""Metriche interne: contatori, gauge e istogrammi con esportazione"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bucket di default (secondi): da 0.5ms a 10s
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    10.0,
+)
+
+# Bucket per dimensioni (righe per batch)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Valore che cresce soltanto"""
+
+    kind = "counter"
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def value(self) -> float:
+        return self._value
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        return [f"{name}{_format_labels(labels)} {self._value}"]
+
+    def to_json(self):
+        return self._value
+
+
+class Gauge:
+    """Valore istantaneo, impostato o calcolato alla lettura"""
+
+    kind = "gauge"
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None):
+        self._value = 0.0
+        self._fn = fn
+
+    def set(self, value: float):
+        self._value = value
+
+    def value(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        return [f"{name}{_format_labels(labels)} {self.value()}"]
+
+    def to_json(self):
+        return self.value()
+
+
+class Histogram:
+    """Distribuzione a bucket cumulativi (formato Prometheus)"""
+
+    kind = "histogram"
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self) -> "_Timer":
+        """Context manager che osserva la durata del blocco"""
+        return _Timer(self)
+
+    def samples(self, name: str, labels: Labels) -> List[str]:
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            le = _format_labels(labels, f'le="{bound}"')
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        le = _format_labels(labels, 'le="+Inf"')
+        lines.append(f"{name}_bucket{le} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return lines
+
+    def to_json(self):
+        with self._lock:
+            return {
+                "count": self._count,
+                "sum": self._sum,
+                "buckets": dict(zip(map(str, self.buckets), self._counts)),
+                "overflow": self._counts[-1],
+            }
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class MetricsRegistry:
+    """Registro delle metriche, identificate da nome ed etichette
+
+    Registrare due volte la stessa metrica ritorna l'istanza esistente,
+    quindi i componenti possono dichiarare le proprie metriche al momento.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Labels], object] = {}
+        self._help: Dict[str, str] = {}
+
+    def _get(self, factory, name: str, help_text: str, labels: Dict[str, str]):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = factory()
+                self._metrics[key] = metric
+                self._help.setdefault(name, help_text)
+            return metric
+
+    def counter(self, name: str, help_text: str = "", **labels: str) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str = "",
+        fn: Optional[Callable[[], float]] = None,
+        **labels: str,
+    ) -> Gauge:
+        gauge = self._get(lambda: Gauge(fn), name, help_text, labels)
+        if fn is not None:
+            # L'ultima istanza registrata (es. un nuovo DatabaseManager) fornisce il valore
+            gauge._fn = fn
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        **labels: str,
+    ) -> Histogram:
+        return self._get(lambda: Histogram(buckets), name, help_text, labels)
+
+    def render_prometheus(self) -> str:
+        """Testo nel formato di esposizione Prometheus"""
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+        lines = []
+        declared = set()
+        for (name, labels), metric in items:
+            if name not in declared:
+                declared.add(name)
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples(name, labels))
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict:
+        """Istantanea serializzabile in JSON"""
+        with self._lock:
+            items = list(self._metrics.items())
+        snapshot: Dict[str, Dict] = {}
+        for (name, labels), metric in items:
+            key = ",".join(f"{k}={v}" for k, v in labels) or "_"
+            snapshot.setdefault(name, {})[key] = metric.to_json()
+        return snapshot
+
+    def dump_json(self, path: str):
+        """Scrive l'istantanea su file (sostituzione atomica)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), "metrics": self.to_json()}, f)
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Espone /metrics via HTTP su localhost, in un thread daemon"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        return server
+
+
+# Registro condiviso dell'applicazione
+registry = MetricsRegistry()
@@ -1,109 +1,662 @@
 """Sincronizzazione con MongoDB"""
 
-import pymongo
-from typing import List, Tuple, Dict
+import threading
+import time
+from datetime import datetime, timezone
+from functools import partial
+
+from typing import Dict, Iterable, List, Optional, Tuple
 from config.settings import Config
+from core.key_cache import KnownKeysCache
+from core.metrics import SIZE_BUCKETS, MetricsRegistry, registry
+from core.retry import retry_with_backoff
+from core.rules import RuleEngine
+from core.sessions import split_by_day
+from core.timestamps import to_datetime, to_ms
+from core.window_cache import ProcessWindowCache
+
+# Codice errore MongoDB per chiave duplicata
+DUPLICATE_KEY_ERROR = 11000
+
+# Colonne delle righe nel formato compatto (indici nei dizionari del blocco)
+COMPACT_COLUMNS = (
+    "id",
+    "timestamp",
+    "process",
+    "window_title",
+    "cpu_percent",
+    "identity",
+)
 
 
 class MongoSyncManager:
-    """Gestisce la sincronizzazione con MongoDB"""
+    """Gestisce la sincronizzazione con MongoDB
+
+    pymongo viene importato e il client creato solo al primo accesso;
+    indici e registrazione del device partono in background con start(),
+    così il tracking locale non attende la rete.
+    """
 
-    def __init__(self, config: Config):
+    def __init__(
+        self,
+        config: Config,
+        client=None,
+        metrics: Optional[MetricsRegistry] = None,
+        rules: Optional[RuleEngine] = None,
+    ):
         self.config = config
-        self.client = pymongo.MongoClient(config.MONGO_URI)
-        self.db = self.client[config.MONGO_DB]
+        self.rules = rules or RuleEngine.from_config(config)
+        self._client = client
+        self._db = None
+        self._timeseries: Optional[bool] = None
+        self._client_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.known_keys = KnownKeysCache(config.DB_PATH, config.KNOWN_KEYS_CACHE_SIZE)
+        self.window_cache = ProcessWindowCache(config.DB_PATH)
+
+        metrics = metrics or registry
+        self._m_duration = metrics.histogram(
+            "sync_batch_seconds", "Durata dell'invio di un blocco a MongoDB"
+        )
+        self._m_size = metrics.histogram(
+            "sync_batch_rows", "Record per blocco sincronizzato", SIZE_BUCKETS
+        )
+        self._m_records = metrics.counter("sync_records_total", "Record sincronizzati")
+        self._m_errors = metrics.counter(
+            "errors_total", "Errori per componente", component="sync"
+        )
+        self._m_conflicts = metrics.counter(
+            "sync_duplicate_keys_total", "Scritture respinte come chiave duplicata"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """False se MONGO_URI non è configurato: si lavora solo in locale"""
+        return self._client is not None or bool(self.config.MONGO_URI)
+
+    @property
+    def client(self):
+        """Client MongoDB, creato al primo utilizzo"""
+        with self._client_lock:
+            if self._client is None:
+                if not self.config.MONGO_URI:
+                    raise RuntimeError("MONGO_URI non configurato")
+                import pymongo
+
+                self._client = pymongo.MongoClient(self.config.MONGO_URI)
+            return self._client
+
+    @property
+    def db(self):
+        """Database MongoDB, creato al primo utilizzo"""
+        if self._db is None:
+            self._db = self.client[self.config.MONGO_DB]
+        return self._db
+
+    def start(self):
+        """Crea indici e registra il device in background"""
+        if not self.enabled:
+            print("[WARN] MONGO_URI non configurato: sincronizzazione disattivata")
+            return
+        threading.Thread(
+            target=self._setup_loop, name="mongo-setup", daemon=True
+        ).start()
+
+    def _setup_loop(self):
+        """Ritenta la preparazione finché MongoDB non risponde"""
+        from pymongo.errors import PyMongoError
+
+        while True:
+            try:
+                retry_with_backoff(
+                    self._setup,
+                    attempts=self.config.SYNC_MAX_RETRIES,
+                    base_delay=self.config.SYNC_BACKOFF_BASE,
+                    retry_on=(PyMongoError,),
+                    label="MONGO SETUP RETRY",
+                )
+                self.ready.set()
+                return
+            except Exception as e:
+                print(f"[MONGO SETUP ERROR] {e}")
+                time.sleep(self.config.SYNC_INTERVAL)
+
+    def _setup(self):
+        """Indici e registrazione del device (idempotenti)"""
         self._init_indexes()
+        self._register_device()
+        print(f"[DEVICE SYNC] {self.config.DEVICE_ID}")
 
     def _init_indexes(self):
         """Crea gli indici necessari"""
+        self._ensure_activity_logs()
+        self.db[self.config.ACTIVITY_LOGS_TABLE].create_index(
+            [("device_id", 1), ("timestamp", 1)]
+        )
+        self.db[self.config.ACTIVITY_BATCHES_TABLE].create_index(
+            [("device_id", 1), ("start", 1)]
+        )
         self.db[self.config.PROCESS_WINDOW_TABLE].create_index(
             [("device_id", 1), ("process", 1), ("window_title", 1)], unique=True
         )
+        self.db[self.config.PROCESS_WINDOW_TABLE].create_index(
+            [("device_id", 1), ("updated_at", 1)]
+        )
         self.db[self.config.DEVICES_TABLE].create_index([("device_id", 1)], unique=True)
+        self.db[self.config.DAILY_SUMMARIES_TABLE].create_index(
+            [("day", 1), ("device_id", 1)]
+        )
+
+    def _register_device(self):
+        """Upsert del documento del device"""
+        self.db[self.config.DEVICES_TABLE].update_one(
+            {"device_id": self.config.DEVICE_ID},
+            {
+                "$setOnInsert": {
+                    "device_id": self.config.DEVICE_ID,
+                    "user_id": None,
+                }
+            },
+            upsert=True,
+        )
 
     def sync_device(self):
         """Sincronizza le informazioni del device"""
         try:
-            self.db[self.config.DEVICES_TABLE].update_one(
-                {"device_id": self.config.DEVICE_ID},
-                {
-                    "$setOnInsert": {
-                        "device_id": self.config.DEVICE_ID,
-                        "user_id": None,
-                    }
-                },
-                upsert=True,
-            )
+            self._register_device()
             print(f"[DEVICE SYNC] {self.config.DEVICE_ID}")
         except Exception as e:
             print(f"[DEVICE SYNC ERROR] {e}")
 
-    def sync_activities(self, records: List[Tuple]):
-        """Sincronizza i record di attività"""
+    def sync_activities(
+        self,
+        records: List[Tuple],
+        instance_id: str,
+        sessions: Optional[List[Tuple[float, float, str, int]]] = None,
+    ):
+        """Sincronizza i record di attività e i riepiloghi giornalieri
+
+        instance_id: identificativo del database locale (DatabaseManager)
+        sessions: sessioni chiuse dagli eventi del blocco
+            (start, end, processo, id dell'evento di chiusura)
+        """
         if not records:
             return
 
-        docs = [
-            {
-                "timestamp": r[1],
-                "process": r[2],
-                "window_title": r[3],
-                "cpu_percent": r[4],
-                "device_id": r[6],
-                "username": r[7],
-                "system": self.config.SYSTEM,
-                "device_name": self.config.DEVICE_NAME,
-            }
-            for r in records
-        ]
+        start = time.perf_counter()
+        try:
+            self._sync_activities(records, instance_id)
+            if sessions:
+                self._apply_daily_summaries(records[-1][6], instance_id, sessions)
+        except Exception:
+            self._m_errors.inc()
+            raise
+        self._m_duration.observe(time.perf_counter() - start)
+        self._m_size.observe(len(records))
+        self._m_records.inc(len(records))
+
+    def _sync_activities(self, records: List[Tuple], instance_id: str):
+        """Invio del blocco e upsert delle chiavi processo/finestra"""
+        from pymongo.errors import PyMongoError
+
+        if self.config.SYNC_FORMAT == "compact":
+            # Un documento per blocco, dizionario delle stringhe incluso
+            batch = self.encode_compact_batch(records, instance_id)
+            upload = partial(self._replace_compact_batch, batch)
+        else:
+            docs = [
+                {
+                    "_id": self.activity_doc_id(r[6], instance_id, r[0]),
+                    "timestamp": to_datetime(r[1]),
+                    "process": r[2],
+                    "window_title": r[3],
+                    "cpu_percent": r[4],
+                    "device_id": r[6],
+                    "username": r[7],
+                    "system": self.config.SYSTEM,
+                    "device_name": self.config.DEVICE_NAME,
+                }
+                for r in records
+            ]
+            # Idempotente: gli _id già presenti vengono ignorati
+            upload = partial(self._insert_activity_docs, docs)
 
         # Inserisci attività
-        self.db[self.config.ACTIVITY_LOGS_TABLE].insert_many(docs)
+        retry_with_backoff(
+            upload,
+            attempts=self.config.SYNC_MAX_RETRIES,
+            base_delay=self.config.SYNC_BACKOFF_BASE,
+            retry_on=(PyMongoError,),
+            label="SYNC RETRY",
+        )
 
         # Aggiorna tabella processi
-        for doc in docs:
+        self._upsert_process_windows(
+            {"device_id": r[6], "process": r[2], "window_title": r[3]} for r in records
+        )
+
+    def _apply_daily_summaries(
+        self,
+        device_id: str,
+        instance_id: str,
+        sessions: List[Tuple[float, float, str, int]],
+    ):
+        """$inc dei secondi per device/giorno/processo in un solo bulk_write
+
+        Ogni documento ricorda l'id dell'ultimo evento di chiusura già
+        contato per database locale (batches.<istanza>) e riceve solo le
+        sessioni successive: un blocco reinviato, anche più grande dopo un
+        bulk_write parziale, non conta due volte le stesse righe. Il filtro
+        scarta l'update se nel frattempo un altro invio ha già contato la
+        prima sessione inclusa (l'upsert collide sull'_id e il duplicato
+        viene ignorato). Un database nuovo riparte da id bassi con un'altra
+        istanza, quindi le sue sessioni non vengono scambiate per reinvii.
+        """
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError, PyMongoError
+
+        # (giorno, processo) → [(id evento di chiusura, secondi)]
+        parts: Dict[Tuple[str, str], List[Tuple[int, float]]] = {}
+        for start_ts, end_ts, process, end_id in sessions:
+            for day, seconds in split_by_day(start_ts, end_ts):
+                parts.setdefault((day, process), []).append((end_id, seconds))
+        if not parts:
+            return
+
+        applied = f"batches.{instance_id}"
+        collection = self.db[self.config.DAILY_SUMMARIES_TABLE]
+
+        def write():
+            ids = {key: f"{device_id}:{key[0]}:{key[1]}" for key in parts}
+            stored = {
+                doc["_id"]: doc.get("batches", {}).get(instance_id)
+                for doc in collection.find(
+                    {"_id": {"$in": list(ids.values())}}, {applied: 1}
+                )
+            }
+            requests = []
+            for key, items in parts.items():
+                last = stored.get(ids[key])
+                pending = [(i, s) for i, s in items if last is None or i > last]
+                if not pending:
+                    continue
+                requests.append(
+                    UpdateOne(
+                        {
+                            "_id": ids[key],
+                            # Nessuna delle sessioni incluse già contata
+                            applied: {"$not": {"$gte": min(i for i, _ in pending)}},
+                        },
+                        {
+                            "$inc": {"seconds": sum(s for _, s in pending)},
+                            "$set": {applied: max(i for i, _ in pending)},
+                            "$setOnInsert": {
+                                "device_id": device_id,
+                                "day": key[0],
+                                "process": key[1],
+                            },
+                        },
+                        upsert=True,
+                    )
+                )
+            if not requests:
+                return
             try:
-                self.db[self.config.PROCESS_WINDOW_TABLE].update_one(
-                    {
-                        "device_id": doc["device_id"],
-                        "process": doc["process"],
-                        "window_title": doc["window_title"],
-                    },
-                    {
-                        "$setOnInsert": {
-                            "device_id": doc["device_id"],
-                            "process": doc["process"],
-                            "window_title": doc["window_title"],
-                            "level": 5,
-                            "active": True,
-                        }
+                collection.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                    raise
+
+        retry_with_backoff(
+            write,
+            attempts=self.config.SYNC_MAX_RETRIES,
+            base_delay=self.config.SYNC_BACKOFF_BASE,
+            retry_on=(PyMongoError,),
+            label="SUMMARY RETRY",
+        )
+
+    def _collection_type(self, name: str) -> Optional[str]:
+        """Tipo della collezione ("collection", "timeseries"), None se assente"""
+        for info in self.db.list_collections(filter={"name": name}):
+            return info.get("type", "collection")
+        return None
+
+    def _ensure_activity_logs(self):
+        """Crea activity_logs come time-series se richiesto da MONGO_TIMESERIES"""
+        if not self.config.MONGO_TIMESERIES:
+            return
+        name = self.config.ACTIVITY_LOGS_TABLE
+        kind = self._collection_type(name)
+        if kind is None:
+            from pymongo.errors import CollectionInvalid
+
+            try:
+                self.db.create_collection(
+                    name,
+                    timeseries={
+                        "timeField": "timestamp",
+                        "metaField": "device_id",
+                        "granularity": "seconds",
                     },
-                    upsert=True,
                 )
-            except Exception as e:
-                print(f"[PROCESS UPSERT ERROR] {e}")
+            except CollectionInvalid:
+                # Creata nel frattempo da un altro device
+                pass
+        elif kind != "timeseries":
+            print(
+                f"[WARN] {name} non è time-series: eseguire python migrate.py activity-logs"
+            )
+
+    @property
+    def timeseries(self) -> bool:
+        """True se activity_logs è una collezione time-series (letto una volta)"""
+        if self._timeseries is None:
+            kind = self._collection_type(self.config.ACTIVITY_LOGS_TABLE)
+            self._timeseries = kind == "timeseries"
+        return self._timeseries
+
+    def migrate_activity_logs(self, batch_size: int = 1000) -> int:
+        """Porta activity_logs ai timestamp BSON date (e a time-series)
+
+        Senza MONGO_TIMESERIES converte sul posto le stringhe ISO. Con
+        MONGO_TIMESERIES la collezione esistente viene rinominata in
+        <nome>_legacy e copiata a blocchi nella nuova time-series; un
+        arresto a metà riprende dalla copia (gli _id già presenti vengono
+        saltati); la collezione legacy viene eliminata solo se tutti i suoi
+        documenti sono stati copiati. Ritorna i documenti convertiti o copiati.
+        """
+        name = self.config.ACTIVITY_LOGS_TABLE
+        legacy = f"{name}_legacy"
+        kind = self._collection_type(name)
+
+        if not self.config.MONGO_TIMESERIES:
+            converted = self._convert_string_timestamps(batch_size)
+            self._init_indexes()
+            return converted
+        if kind == "timeseries" and self._collection_type(legacy) is None:
+            return 0
+
+        if kind is not None and kind != "timeseries":
+            self.db[name].rename(legacy)
+        self._ensure_activity_logs()
+        self._timeseries = True
+
+        # Un solo cursore in ordine naturale: gli _id mescolano ObjectId e
+        # stringhe, e una paginazione con $gt su _id salterebbe un tipo
+        # (confronto BSON per tipo). La collezione legacy non riceve scritture.
+        copied = 0
+        source = self.db[legacy]
+        docs: List[Dict] = []
+        for doc in source.find({}, batch_size=batch_size):
+            timestamp = doc.get("timestamp")
+            if isinstance(timestamp, str):
+                doc["timestamp"] = to_datetime(to_ms(timestamp))
+            elif isinstance(timestamp, datetime) and timestamp.tzinfo is None:
+                # BSON date letta da pymongo: UTC senza fuso, come le altre
+                doc["timestamp"] = timestamp.replace(tzinfo=timezone.utc)
+            docs.append(doc)
+            if len(docs) >= batch_size:
+                self._insert_activity_docs(docs)
+                copied += len(docs)
+                docs = []
+        if docs:
+            self._insert_activity_docs(docs)
+            copied += len(docs)
+
+        expected = source.count_documents({})
+        present = self.db[name].count_documents({})
+        if copied != expected or present < expected:
+            raise RuntimeError(
+                f"copia incompleta di {legacy}: {copied} letti, {expected} attesi, "
+                f"{present} in {name}; {legacy} non eliminata"
+            )
+        source.drop()
+        self._init_indexes()
+        return copied
+
+    def _convert_string_timestamps(self, batch_size: int) -> int:
+        """Converte sul posto i timestamp stringa ISO in BSON date"""
+        from pymongo import UpdateOne
+
+        collection = self.db[self.config.ACTIVITY_LOGS_TABLE]
+        converted = 0
+        while True:
+            docs = list(
+                collection.find(
+                    {"timestamp": {"$type": "string"}}, {"timestamp": 1}
+                ).limit(batch_size)
+            )
+            if not docs:
+                return converted
+            collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": d["_id"]},
+                        {"$set": {"timestamp": to_datetime(to_ms(d["timestamp"]))}},
+                    )
+                    for d in docs
+                ],
+                ordered=False,
+            )
+            converted += len(docs)
+
+    def encode_compact_batch(self, records: List[Tuple], instance_id: str) -> Dict:
+        """Blocco compatto: stringhe inviate una volta, righe come indici"""
+        processes: Dict[str, int] = {}
+        titles: Dict[str, int] = {}
+        identities: Dict[Tuple[str, str], int] = {}
+        rows = []
+        for r in records:
+            rows.append(
+                [
+                    r[0],
+                    r[1],
+                    processes.setdefault(r[2], len(processes)),
+                    titles.setdefault(r[3], len(titles)),
+                    r[4],
+                    identities.setdefault((r[6], r[7]), len(identities)),
+                ]
+            )
+
+        device_id = records[0][6]
+        return {
+            # Stesso primo id → stesso documento: un nuovo invio lo sostituisce
+            "_id": self.activity_doc_id(device_id, instance_id, records[0][0]),
+            "device_id": device_id,
+            "start": to_datetime(min(r[1] for r in records)),
+            "end": to_datetime(max(r[1] for r in records)),
+            "system": self.config.SYSTEM,
+            "device_name": self.config.DEVICE_NAME,
+            "first_id": records[0][0],
+            "last_id": records[-1][0],
+            "processes": list(processes),
+            "titles": list(titles),
+            "identities": [list(identity) for identity in identities],
+            "columns": list(COMPACT_COLUMNS),
+            "rows": rows,
+        }
+
+    @staticmethod
+    def activity_doc_id(device_id: str, instance_id: str, row_id: int) -> str:
+        """_id deterministico di un'attività: device + database locale + id"""
+        return f"{device_id}:{instance_id}:{row_id}"
+
+    def _replace_compact_batch(self, batch: Dict):
+        """Scrive (o sostituisce) un blocco compatto"""
+        self.db[self.config.ACTIVITY_BATCHES_TABLE].replace_one(
+            {"_id": batch["_id"]}, batch, upsert=True
+        )
+
+    def _insert_activity_docs(self, docs: List[Dict]):
+        """Inserimento non ordinato che ignora i documenti già caricati"""
+        from pymongo.errors import BulkWriteError
+
+        if self.timeseries:
+            # Le time-series non hanno indici unici (nemmeno su _id): i
+            # documenti già presenti si cercano sull'indice device/timestamp
+            docs = self._skip_existing(docs)
+            if not docs:
+                return
+        try:
+            self.db[self.config.ACTIVITY_LOGS_TABLE].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                raise
+            if e.details.get("writeConcernErrors"):
+                raise
+            self._m_conflicts.inc(len(errors))
+
+    def _skip_existing(self, docs: List[Dict]) -> List[Dict]:
+        """Documenti del blocco non ancora presenti in activity_logs"""
+        existing = set()
+        for device_id in {d["device_id"] for d in docs}:
+            timestamps = [d["timestamp"] for d in docs if d["device_id"] == device_id]
+            query = {
+                "device_id": device_id,
+                "timestamp": {"$gte": min(timestamps), "$lte": max(timestamps)},
+            }
+            existing.update(
+                d["_id"]
+                for d in self.db[self.config.ACTIVITY_LOGS_TABLE].find(
+                    query, {"_id": 1}
+                )
+            )
+        if existing:
+            self._m_conflicts.inc(sum(1 for d in docs if d["_id"] in existing))
+        return [d for d in docs if d["_id"] not in existing]
 
-        print(f"[SYNC] {len(docs)} record sincronizzati")
+    def _upsert_process_windows(self, docs: Iterable[Dict]):
+        """Upsert in blocco delle sole chiavi processo/finestra nuove"""
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
 
-    def get_process_windows(self) -> List[Dict]:
-        """Recupera i processi/finestre dal database"""
-        return list(
-            self.db[self.config.PROCESS_WINDOW_TABLE].find(
+        keys = []
+        seen = set()
+        for doc in docs:
+            key = (doc["device_id"], doc["process"], doc["window_title"])
+            if key in seen or key in self.known_keys:
+                continue
+            # Esclusi (es. marcatori [PAUSE]/[RESUME]): niente livello da gestire
+            if self.rules.is_excluded(key[1], key[2]):
+                continue
+            seen.add(key)
+            keys.append(key)
+        self.known_keys.save_hits()
+
+        if not keys:
+            return
+
+        requests = [
+            UpdateOne(
+                {"device_id": device_id, "process": process, "window_title": title},
                 {
-                    "device_id": self.config.DEVICE_ID,
-                    "process": {"$not": {"$regex": r"\[PAUSE\]|\[RESUME\]|unknown"}},
+                    "$setOnInsert": {
+                        "device_id": device_id,
+                        "process": process,
+                        "window_title": title,
+                        "level": self.rules.classify(process, title).level or 5,
+                        "active": True,
+                    },
+                    # Orologio del server, come per le modifiche di livello: il
+                    # watermark $gte di refresh_process_windows confronta date
+                    # dello stesso orologio (se il documento esiste già viene
+                    # solo riletto al prossimo refresh)
+                    "$currentDate": {"updated_at": True},
                 },
-                {"_id": 1, "process": 1, "window_title": 1, "level": 1},
+                upsert=True,
             )
-        )
+            for device_id, process, title in keys
+        ]
+
+        try:
+            self.db[self.config.PROCESS_WINDOW_TABLE].bulk_write(
+                requests, ordered=False
+            )
+            self.known_keys.add_many(keys)
+        except BulkWriteError as e:
+            # Le chiavi duplicate (upsert concorrenti) risultano comunque presenti
+            errors = e.details.get("writeErrors", [])
+            failed = {
+                err["index"] for err in errors if err.get("code") != DUPLICATE_KEY_ERROR
+            }
+            self._m_conflicts.inc(len(errors) - len(failed))
+            self.known_keys.add_many(
+                key for i, key in enumerate(keys) if i not in failed
+            )
+            if failed:
+                print(f"[PROCESS UPSERT ERROR] {len(failed)} chiavi non salvate")
+        except Exception as e:
+            print(f"[PROCESS UPSERT ERROR] {e}")
+
+    def get_process_windows(self, since: Optional[datetime] = None) -> List[Dict]:
+        """Recupera i processi/finestre dal database
+
+        Con since solo i documenti modificati da quel momento (incluso).
+        Le coppie escluse dalle regole vengono scartate qui: la query resta
+        sull'indice (device_id, updated_at).
+        """
+        query: Dict = {"device_id": self.config.DEVICE_ID}
+        if since is not None:
+            query["updated_at"] = {"$gte": since}
+        return [
+            doc
+            for doc in self.db[self.config.PROCESS_WINDOW_TABLE].find(
+                query,
+                {
+                    "_id": 1,
+                    "process": 1,
+                    "window_title": 1,
+                    "level": 1,
+                    "updated_at": 1,
+                },
+            )
+            if not self.rules.is_excluded(doc["process"], doc["window_title"])
+        ]
+
+    def refresh_process_windows(self) -> List[Dict]:
+        """Scarica i documenti cambiati dall'ultimo refresh e aggiorna la cache"""
+        if not self.enabled:
+            return []
+        since = self.window_cache.watermark(self.config.DEVICE_ID)
+        docs = self.get_process_windows(since)
+        return self.window_cache.merge(self.config.DEVICE_ID, docs)
+
+    @staticmethod
+    def _object_id(voce_id):
+        """_id come ObjectId se arriva come stringa dalla cache locale"""
+        from bson import ObjectId
+
+        if isinstance(voce_id, str) and ObjectId.is_valid(voce_id):
+            return ObjectId(voce_id)
+        return voce_id
 
     def update_level(self, voce_id, level: int):
         """Aggiorna il livello di attenzione"""
         try:
             result = self.db[self.config.PROCESS_WINDOW_TABLE].update_one(
-                {"_id": voce_id}, {"$set": {"level": level}}
+                {"_id": self._object_id(voce_id)},
+                {"$set": {"level": level}, "$currentDate": {"updated_at": True}},
             )
             if result.modified_count:
                 print(f"✅ Aggiornato {voce_id} → level {level}")
         except Exception as e:
             print(f"[SET LEVEL ERROR] {e}")
+
+    def update_levels(self, levels: Dict[str, int]):
+        """Aggiorna più livelli con un solo bulk_write (solleva in caso di errore)"""
+        from pymongo import UpdateOne
+
+        if not levels:
+            return
+        self.db[self.config.PROCESS_WINDOW_TABLE].bulk_write(
+            [
+                UpdateOne(
+                    {"_id": self._object_id(voce_id)},
+                    {"$set": {"level": level}, "$currentDate": {"updated_at": True}},
+                )
+                for voce_id, level in levels.items()
+            ],
+            ordered=False,
+        )
@@ -0,0 +1,69 @@
+"""Cache LRU dei processi per la risoluzione PID → nome"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import psutil
+
+
+class ProcessNameCache:
+    """Risolve il nome di un processo dal PID tenendo gli handle in LRU
+
+    La chiave è il PID. Una lookup ripetuta restituisce il nome in memoria
+    senza system call; l'handle salvato viene ricontrollato (is_running,
+    che confronta il create_time) al più ogni validate_interval secondi,
+    così un PID riutilizzato da un nuovo processo non restituisce a lungo
+    il nome del precedente.
+    """
+
+    def __init__(self, max_size: int = 128, validate_interval: float = 5.0):
+        self.max_size = max_size
+        self.validate_interval = validate_interval
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[psutil.Process, str, float]]" = (
+            OrderedDict()
+        )
+
+    def name(self, pid: Optional[int]) -> str:
+        """Nome del processo, o "unknown" se non risolvibile"""
+        if not pid:
+            return "unknown"
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(pid)
+            if entry is not None:
+                self._entries.move_to_end(pid)
+                if now - entry[2] < self.validate_interval:
+                    return entry[1]
+
+        if entry is not None:
+            proc, name, _ = entry
+            try:
+                # Lettura del solo create_time tramite l'handle già creato
+                alive = proc.is_running()
+            except (psutil.Error, OSError):
+                alive = False
+            with self._lock:
+                if alive:
+                    self._entries[pid] = (proc, name, now)
+                    return name
+                self._entries.pop(pid, None)
+
+        try:
+            proc = psutil.Process(pid)
+            name = proc.name()
+        except (psutil.Error, OSError):
+            return "unknown"
+
+        with self._lock:
+            self._entries[pid] = (proc, name, now)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return name
+
+
+# Istanza condivisa dai backend di rilevamento
+process_names = ProcessNameCache()
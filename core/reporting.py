@@ -0,0 +1,209 @@
+"""Report locali sul database delle attività"""
+
+import heapq
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.retention import ArchiveReader
+from core.rules import RuleEngine, domain_of
+from core.timestamps import to_ms
+
+# Livello assegnato alle finestre senza livello esplicito
+DEFAULT_LEVEL = 5
+
+# Categoria delle finestre senza regola
+UNCATEGORIZED = "altro"
+
+# Durata di una sessione tagliata sull'intervallo [:start, :end)
+_CLIPPED = "MIN(end_ts, :end) - MAX(start_ts, :start)"
+
+
+def _midnight(day: date) -> float:
+    """Epoch della mezzanotte locale del giorno"""
+    return datetime.combine(day, time.min).timestamp()
+
+
+class ReportEngine:
+    """Risponde a domande sul tempo speso, per intervalli di date arbitrari
+
+    Usa i rollup giornalieri per i giorni interi e le sessioni (indicizzate
+    per inizio e fine) solo per i giorni parziali ai bordi dell'intervallo.
+    Le aggregazioni avvengono in SQLite sugli id del dizionario: la memoria
+    resta proporzionale al numero di processi/titoli, non ai giorni coperti.
+    """
+
+    def __init__(self, db_path: str, archive_dir: Optional[str] = None):
+        self.db_path = db_path
+        self.archive = ArchiveReader(archive_dir) if archive_dir else None
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+    def close(self):
+        """Chiude la connessione"""
+        self._conn.close()
+
+    @staticmethod
+    def _plan(
+        start: datetime, end: datetime
+    ) -> Tuple[List[Tuple[float, float]], Optional[Tuple[str, str]]]:
+        """Divide l'intervallo in bordi parziali (epoch) e giorni interi"""
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        first_day = (
+            start.date()
+            if start.time() == time.min
+            else start.date() + timedelta(days=1)
+        )
+        last_day = end.date()
+        if first_day >= last_day:
+            return [(start_ts, end_ts)], None
+
+        partials = []
+        if start_ts < _midnight(first_day):
+            partials.append((start_ts, _midnight(first_day)))
+        if _midnight(last_day) < end_ts:
+            partials.append((_midnight(last_day), end_ts))
+        return partials, (first_day.isoformat(), last_day.isoformat())
+
+    def _session_totals(
+        self, key: str, start_ts: float, end_ts: float, where: str = "", **params
+    ) -> Iterator[Tuple]:
+        """Somma le sessioni tagliate sull'intervallo, raggruppate per id"""
+        return self._conn.execute(
+            f"""
+            SELECT {key}, SUM({_CLIPPED}) FROM sessions
+            WHERE start_ts < :end AND end_ts > :start {where}
+            GROUP BY {key}
+        """,
+            {"start": start_ts, "end": end_ts, **params},
+        )
+
+    def _names(self, table: str, column: str) -> Dict[int, str]:
+        """Mappa id → stringa di una tabella di lookup"""
+        return dict(self._conn.execute(f"SELECT id, {column} FROM {table}"))
+
+    def time_per_process(
+        self, start: datetime, end: datetime, process: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Secondi per processo nell'intervallo [start, end)"""
+        totals: Dict[str, float] = {}
+
+        partials, days = self._plan(start, end)
+        if days:
+            where = "AND process = :process" if process else ""
+            rows = self._conn.execute(
+                f"""
+                SELECT process, SUM(duration) FROM daily_rollup
+                WHERE day >= :first AND day < :last {where}
+                GROUP BY process
+            """,
+                {"first": days[0], "last": days[1], "process": process},
+            )
+            for name, seconds in rows:
+                totals[name] = totals.get(name, 0.0) + seconds
+
+        if partials:
+            names = self._names("processes", "name")
+            where = (
+                "AND process_id = (SELECT id FROM processes WHERE name = :process)"
+                if process
+                else ""
+            )
+            for start_ts, end_ts in partials:
+                for process_id, seconds in self._session_totals(
+                    "process_id", start_ts, end_ts, where, process=process
+                ):
+                    name = names[process_id]
+                    totals[name] = totals.get(name, 0.0) + seconds
+
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def time_per_domain(
+        self, start: datetime, end: datetime
+    ) -> List[Tuple[str, float]]:
+        """Secondi per dominio web nell'intervallo [start, end)"""
+        titles = self._names("window_titles", "title")
+        totals: Dict[str, float] = {}
+        rows = self._session_totals("title_id", start.timestamp(), end.timestamp())
+        for title_id, seconds in rows:
+            domain = domain_of(titles[title_id])
+            if domain is not None:
+                totals[domain] = totals.get(domain, 0.0) + seconds
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def time_per_level(
+        self,
+        start: datetime,
+        end: datetime,
+        levels: Dict[Tuple[str, str], int],
+    ) -> List[Tuple[int, float]]:
+        """Secondi per livello di attenzione nell'intervallo [start, end)"""
+        names = self._names("processes", "name")
+        titles = self._names("window_titles", "title")
+        totals: Dict[int, float] = {}
+        rows = self._session_totals(
+            "process_id, title_id", start.timestamp(), end.timestamp()
+        )
+        for process_id, title_id, seconds in rows:
+            key = (names[process_id], titles[title_id])
+            level = levels.get(key, DEFAULT_LEVEL)
+            totals[level] = totals.get(level, 0.0) + seconds
+        return sorted(totals.items())
+
+    def time_per_category(
+        self, start: datetime, end: datetime, rules: RuleEngine
+    ) -> List[Tuple[str, float]]:
+        """Secondi per categoria delle regole nell'intervallo [start, end)
+
+        Usa le classificazioni salvate se calcolate con le stesse regole;
+        le coppie mancanti (o tutte, se le regole sono cambiate) vengono
+        classificate al volo. Le coppie escluse non vengono contate.
+        """
+        stored: Dict[Tuple[int, int], Tuple[int, Optional[str]]] = {}
+        if RuleEngine.stored_version(self._conn) == rules.version:
+            stored = {
+                (process_id, title_id): (excluded, category)
+                for process_id, title_id, excluded, category in self._conn.execute(
+                    "SELECT process_id, title_id, excluded, category FROM classifications"
+                )
+            }
+        names = titles = None
+        totals: Dict[str, float] = {}
+        rows = self._session_totals(
+            "process_id, title_id", start.timestamp(), end.timestamp()
+        )
+        for process_id, title_id, seconds in rows:
+            found = stored.get((process_id, title_id))
+            if found is None:
+                if names is None:
+                    names = self._names("processes", "name")
+                    titles = self._names("window_titles", "title")
+                result = rules.classify(names[process_id], titles[title_id])
+                found = (result.excluded, result.category)
+            excluded, category = found
+            if excluded:
+                continue
+            category = category or UNCATEGORIZED
+            totals[category] = totals.get(category, 0.0) + seconds
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+    def iter_events(self, start: datetime, end: datetime) -> Iterator[Tuple]:
+        """Eventi grezzi nell'intervallo, in ordine di tempo, archivio incluso
+
+        Il timestamp è in millisecondi epoch (UTC).
+        """
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        hot = self._conn.execute(
+            """
+            SELECT timestamp, process, window_title FROM activity_expanded
+            WHERE timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp
+        """,
+            (start_ms, end_ms),
+        )
+        if self.archive is None:
+            return hot
+
+        archived = (
+            (row[1], row[2], row[3]) for row in self.archive.iter_rows(start_ms, end_ms)
+        )
+        return heapq.merge(archived, hot, key=lambda event: event[0])
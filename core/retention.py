@@ -0,0 +1,270 @@
+"""Retention dei record sincronizzati e segmenti di archivio compressi"""
+
+import gzip
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.timestamps import to_ms
+
+# Colonne salvate nei segmenti, nell'ordine
+ARCHIVE_COLUMNS = (
+    "id",
+    "timestamp",
+    "process",
+    "window_title",
+    "cpu_percent",
+    "device_id",
+    "username",
+)
+
+INDEX_FILE = "index.jsonl"
+
+
+class ArchiveReader:
+    """Legge i segmenti di archivio filtrando per intervallo temporale"""
+
+    def __init__(self, archive_dir: str):
+        self.archive_dir = archive_dir
+
+    def segments(self) -> List[Dict]:
+        """Voci dell'indice dei segmenti, in ordine di scrittura
+
+        I segmenti scritti con lo schema v1 hanno start/end in ISO 8601:
+        vengono riportati a millisecondi epoch alla lettura.
+        """
+        path = os.path.join(self.archive_dir, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries:
+            entry["start"], entry["end"] = to_ms(entry["start"]), to_ms(entry["end"])
+        return entries
+
+    def iter_segment(self, segment: Dict) -> Iterator[Tuple]:
+        """Tutte le righe di un segmento, con timestamp in millisecondi epoch"""
+        path = os.path.join(self.archive_dir, segment["file"])
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                row[1] = to_ms(row[1])
+                yield tuple(row)
+
+    def iter_rows(
+        self, start_ms: Optional[int] = None, end_ms: Optional[int] = None
+    ) -> Iterator[Tuple]:
+        """Righe archiviate con start_ms <= timestamp < end_ms, in ordine"""
+        selected = [
+            segment
+            for segment in sorted(self.segments(), key=lambda s: s["start"])
+            if (end_ms is None or segment["start"] < end_ms)
+            and (start_ms is None or segment["end"] >= start_ms)
+        ]
+
+        # Solo i segmenti sovrapposti vengono fusi: i file aperti insieme
+        # restano pochi anche con un archivio di anni
+        group: List[Dict] = []
+        group_end = 0
+        for segment in selected + [None]:
+            if segment is not None and (not group or segment["start"] <= group_end):
+                group.append(segment)
+                group_end = max(group_end, segment["end"])
+                continue
+
+            merged = heapq.merge(
+                *(self.iter_segment(g) for g in group), key=lambda row: row[1]
+            )
+            for row in merged:
+                timestamp = row[1]
+                if start_ms is not None and timestamp < start_ms:
+                    continue
+                if end_ms is not None and timestamp >= end_ms:
+                    continue
+                yield row
+            if segment is not None:
+                group, group_end = [segment], segment["end"]
+
+
+class RetentionManager:
+    """Sposta i record sincronizzati più vecchi di N giorni in segmenti gzip
+
+    I segmenti sono append-only: ogni esecuzione ne scrive di nuovi e li
+    registra in index.jsonl prima di cancellare le righe corrispondenti.
+    Ogni segmento viene cancellato con una transazione breve su una
+    connessione separata, così in WAL il writer del tracker non resta
+    bloccato; poi si libera spazio con incremental_vacuum.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        archive_dir: str,
+        retention_days: int,
+        segment_rows: int = 10000,
+        vacuum_pages: int = 1000,
+    ):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.segment_rows = segment_rows
+        self.vacuum_pages = vacuum_pages
+        self.reader = ArchiveReader(archive_dir)
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def run_once(self) -> int:
+        """Archivia e cancella i record scaduti; ritorna le righe spostate"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        cutoff_ms = to_ms(cutoff)
+        last_id = 0
+        moved = 0
+
+        conn = self._connect()
+        try:
+            self._recover(conn)
+            instance_id = self._instance_id(conn)
+
+            while True:
+                rows = conn.execute(
+                    f"""
+                    SELECT {", ".join(ARCHIVE_COLUMNS)} FROM activity_expanded
+                    WHERE synced = 1 AND id > ? AND timestamp < ?
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                    (last_id, cutoff_ms, self.segment_rows),
+                ).fetchall()
+                if not rows:
+                    break
+
+                self._write_segment(rows, instance_id)
+                self._delete_ids(conn, [row[0] for row in rows])
+                last_id = rows[-1][0]
+                moved += len(rows)
+
+            if moved:
+                # Con execute() il pragma avanza di un solo passo (una
+                # pagina): executescript lo esegue fino in fondo
+                conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+        finally:
+            conn.close()
+        return moved
+
+    @staticmethod
+    def _instance_id(conn: sqlite3.Connection) -> str:
+        """Istanza del database locale (vedi DatabaseManager), "" se assente"""
+        try:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'instance_id'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return ""
+        return row[0] if row else ""
+
+    def _recover(self, conn: sqlite3.Connection):
+        """Cancella le righe dell'ultimo segmento se un arresto l'ha impedito
+
+        Solo le righe identiche a quelle archiviate (id e timestamp): dopo
+        un reset del database locale gli stessi id sono eventi nuovi.
+        """
+        segments = self.reader.segments()
+        if not segments:
+            return
+        last = segments[-1]
+        still_present = conn.execute(
+            "SELECT 1 FROM activity WHERE id BETWEEN ? AND ? LIMIT 1",
+            (last["first_id"], last["last_id"]),
+        ).fetchone()
+        if still_present:
+            stored = dict(
+                conn.execute(
+                    "SELECT id, timestamp FROM activity WHERE id BETWEEN ? AND ?",
+                    (last["first_id"], last["last_id"]),
+                )
+            )
+            ids = [
+                row[0]
+                for row in self.reader.iter_segment(last)
+                if stored.get(row[0]) == row[1]
+            ]
+            self._delete_ids(conn, ids)
+
+    def _write_segment(self, rows: List[Tuple], instance_id: str = ""):
+        """Scrive un segmento compresso e lo registra nell'indice
+
+        Il nome contiene l'istanza del database: un database nuovo riparte
+        dagli stessi id e non deve sovrascrivere i segmenti precedenti.
+        """
+        first_id, last_id = rows[0][0], rows[-1][0]
+        prefix = f"activity-{instance_id}" if instance_id else "activity"
+        name = f"{prefix}-{first_id:012d}-{last_id:012d}.jsonl.gz"
+        path = os.path.join(self.archive_dir, name)
+        tmp_path = path + ".tmp"
+
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        # Su disco prima dell'indice e della cancellazione delle righe
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        timestamps = [row[1] for row in rows]
+        entry = {
+            "file": name,
+            "first_id": first_id,
+            "last_id": last_id,
+            "start": min(timestamps),
+            "end": max(timestamps),
+            "rows": len(rows),
+        }
+        index_path = os.path.join(self.archive_dir, INDEX_FILE)
+        with open(index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _delete_ids(conn: sqlite3.Connection, ids: List[int]):
+        """Cancella esattamente le righe archiviate, in un'unica transazione"""
+        step = 500
+        try:
+            for i in range(0, len(ids), step):
+                chunk = ids[i : i + step]
+                conn.execute(
+                    f"DELETE FROM activity WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def start(self, interval: float):
+        """Esegue la retention periodicamente in background"""
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval,), name="retention", daemon=True
+        )
+        self._thread.start()
+
+    def _loop(self, interval: float):
+        """Loop di retention"""
+        while True:
+            try:
+                moved = self.run_once()
+                if moved:
+                    print(f"[RETENTION] {moved} record archiviati")
+            except Exception as e:
+                print(f"[RETENTION ERROR] {e}")
+            time.sleep(interval)
@@ -0,0 +1,30 @@
+"""Retry con backoff esponenziale e jitter"""
+
+import random
+import time
+from typing import Callable, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+
+def retry_with_backoff(
+    fn: Callable[[], T],
+    attempts: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    label: str = "RETRY",
+) -> T:
+    """Esegue fn ritentando con backoff esponenziale e full jitter"""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retry_on as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2**attempt))
+            print(
+                f"[{label}] tentativo {attempt + 1} fallito ({e}), nuovo in {delay:.1f}s"
+            )
+            time.sleep(delay)
+    raise RuntimeError("attempts deve essere >= 1")
@@ -0,0 +1,249 @@
+"""Regole di classificazione di processi e finestre
+
+Ogni regola ha una o più condizioni (tutte richieste) e uno o più effetti:
+
+    {"process": "Finder", "exclude": true}
+    {"process_regex": "^(Electron|Python)$", "exclude": true}
+    {"domain": "github.com", "category": "sviluppo", "level": 8}
+    {"process": "Slack", "title": "*huddle*", "category": "meeting"}
+
+Condizioni: process / title (glob), process_regex / title_regex (re.search),
+domain (titolo uguale al dominio o a un suo sottodominio). Effetti: exclude,
+category, level. Le regole si valutano in ordine e per ogni effetto vale la
+prima regola che lo imposta: un {"exclude": false} prima di un'esclusione
+più generica la annulla.
+"""
+
+import fnmatch
+import hashlib
+import json
+import re
+import sqlite3
+from typing import Dict, Iterable, List, NamedTuple, Optional, Pattern, Tuple
+
+# URL nel titolo della finestra (browser)
+_URL_DOMAIN_RE = re.compile(r"https?://([a-zA-Z0-9.-]+)")
+
+# Titoli già ridotti a dominio dai backend di rilevamento (es. "github.com")
+_DOMAIN_RE = re.compile(r"^(?:[a-z0-9-]+\.)+[a-z]{2,}$", re.IGNORECASE)
+
+# Oltre questa soglia la cache dei risultati viene svuotata
+_MAX_CACHED = 100000
+
+_CONDITIONS = ("process", "process_regex", "title", "title_regex", "domain")
+
+
+def extract_domain(title: str) -> str:
+    """Riduce un URL nel titolo al solo dominio"""
+    match = _URL_DOMAIN_RE.search(title)
+    return match.group(1) if match else title
+
+
+def domain_of(title: Optional[str]) -> Optional[str]:
+    """Il titolo se è un dominio, altrimenti None"""
+    if title and _DOMAIN_RE.match(title):
+        return title.lower()
+    return None
+
+
+class Classification(NamedTuple):
+    """Esito delle regole per una coppia (processo, titolo)"""
+
+    excluded: bool = False
+    category: Optional[str] = None
+    level: Optional[int] = None
+
+
+def _pattern(kind: str, value: str) -> str:
+    """Condizione come espressione regolare da usare con search()"""
+    if kind in ("process", "title"):
+        return "^" + fnmatch.translate(value)
+    if kind == "domain":
+        return r"(?i:^(?:[a-z0-9-]+\.)*" + re.escape(value) + "$)"
+    return value
+
+
+class _Rule:
+    def __init__(self, spec: Dict):
+        unknown = set(spec) - set(_CONDITIONS) - {"exclude", "category", "level"}
+        if unknown:
+            raise ValueError(f"chiavi non valide nella regola {spec}: {unknown}")
+        self.process: List[Pattern] = []
+        self.title: List[Pattern] = []
+        for kind in _CONDITIONS:
+            if kind in spec:
+                field = self.process if kind.startswith("process") else self.title
+                field.append(re.compile(_pattern(kind, spec[kind])))
+        if not self.process and not self.title:
+            raise ValueError(f"regola senza condizioni: {spec}")
+        self.exclude: Optional[bool] = spec.get("exclude")
+        self.category: Optional[str] = spec.get("category")
+        self.level: Optional[int] = spec.get("level")
+
+    def matches(self, process: str, title: str) -> bool:
+        return all(p.search(process) for p in self.process) and all(
+            p.search(title) for p in self.title
+        )
+
+
+class RuleEngine:
+    """Regole compilate una volta, con risultato memorizzato per coppia
+
+    Un'unica espressione combinata per campo scarta subito le coppie che
+    nessuna regola può riguardare; le altre vengono valutate regola per
+    regola. La cache rende il costo per evento una lookup di dizionario.
+    """
+
+    def __init__(self, rules: Iterable[Dict]):
+        rules = list(rules)
+        self._rules = [_Rule(spec) for spec in rules]
+        # Identifica l'insieme di regole: cambia → storico da riclassificare
+        self.version = hashlib.sha1(
+            json.dumps(rules, sort_keys=True).encode()
+        ).hexdigest()
+        self._any_process = self._combine(r.process for r in self._rules)
+        self._any_title = self._combine(r.title for r in self._rules)
+        self._cache: Dict[Tuple[str, str], Classification] = {}
+
+    @classmethod
+    def from_config(cls, config) -> "RuleEngine":
+        """Regole da RULES_PATH (JSON) o quelle di default della configurazione"""
+        if config.RULES_PATH:
+            with open(config.RULES_PATH, encoding="utf-8") as f:
+                return cls(json.load(f))
+        return cls(config.RULES)
+
+    @staticmethod
+    def _combine(groups: Iterable[List[Pattern]]) -> Optional[Pattern]:
+        """Alternanza di tutte le condizioni di un campo (None: nessun filtro)"""
+        patterns = [p.pattern for group in groups for p in group]
+        if not patterns:
+            return re.compile(r"(?!)")
+        try:
+            return re.compile("|".join(f"(?:{p})" for p in patterns))
+        except re.error:
+            # Es. flag inline globali in una regex utente: niente prefiltro
+            return None
+
+    def classify(self, process: Optional[str], title: Optional[str]) -> Classification:
+        """Classificazione di una coppia (memorizzata)"""
+        key = (process or "", title or "")
+        result = self._cache.get(key)
+        if result is None:
+            result = self._evaluate(*key)
+            if len(self._cache) >= _MAX_CACHED:
+                self._cache.clear()
+            self._cache[key] = result
+        return result
+
+    def is_excluded(self, process: Optional[str], title: Optional[str] = "") -> bool:
+        return self.classify(process, title).excluded
+
+    def _evaluate(self, process: str, title: str) -> Classification:
+        if (
+            self._any_process is not None
+            and self._any_title is not None
+            and not self._any_process.search(process)
+            and not self._any_title.search(title)
+        ):
+            return Classification()
+
+        exclude = category = level = None
+        for rule in self._rules:
+            if not rule.matches(process, title):
+                continue
+            if exclude is None:
+                exclude = rule.exclude
+            if category is None:
+                category = rule.category
+            if level is None:
+                level = rule.level
+            if exclude is not None and category is not None and level is not None:
+                break
+        return Classification(bool(exclude), category, level)
+
+    # Storico locale
+
+    @staticmethod
+    def init_schema(cur: sqlite3.Cursor):
+        """Classificazioni delle coppie (processo, titolo) dello storico"""
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classifications (
+                process_id INTEGER NOT NULL,
+                title_id INTEGER NOT NULL,
+                excluded INTEGER NOT NULL,
+                category TEXT,
+                level INTEGER,
+                PRIMARY KEY (process_id, title_id)
+            ) WITHOUT ROWID
+        """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rules_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """
+        )
+
+    @staticmethod
+    def stored_version(conn: sqlite3.Connection) -> Optional[str]:
+        """Versione delle regole con cui è stato classificato lo storico"""
+        try:
+            row = conn.execute(
+                "SELECT value FROM rules_state WHERE key = 'version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def reclassify(self, conn: sqlite3.Connection) -> int:
+        """Classifica lo storico in blocco; ritorna le coppie scritte
+
+        Si lavora sulle coppie distinte delle sessioni, non sugli eventi:
+        con regole invariate vengono aggiunte solo le coppie nuove, se le
+        regole cambiano la tabella viene ricalcolata da zero, in un'unica
+        transazione.
+        """
+        cur = conn.cursor()
+        try:
+            if self.stored_version(conn) != self.version:
+                cur.execute("DELETE FROM classifications")
+            pairs = cur.execute(
+                """
+                SELECT DISTINCT s.process_id, s.title_id, p.name, w.title
+                FROM sessions s
+                JOIN processes p ON p.id = s.process_id
+                JOIN window_titles w ON w.id = s.title_id
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM classifications c
+                    WHERE c.process_id = s.process_id AND c.title_id = s.title_id
+                )
+            """
+            ).fetchall()
+            rows = []
+            for process_id, title_id, process, title in pairs:
+                result = self.classify(process, title)
+                rows.append(
+                    (
+                        process_id,
+                        title_id,
+                        int(result.excluded),
+                        result.category,
+                        result.level,
+                    )
+                )
+            cur.executemany(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?)", rows
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO rules_state (key, value) VALUES ('version', ?)",
+                (self.version,),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
@@ -0,0 +1,147 @@
+"""Scheduler a scadenze assolute sul clock monotono"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Un task ritorna l'intervallo fino alla prossima esecuzione (None = il suo default)
+TaskFn = Callable[[], Optional[float]]
+
+
+class _Task:
+    def __init__(self, name: str, fn: TaskFn, interval: float, blocking: bool):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.blocking = blocking
+        self.deadline = 0.0
+        self.running = False
+
+
+class Scheduler:
+    """Esegue tutti i task periodici da un solo thread
+
+    Le scadenze sono assolute (time.monotonic): la prossima esecuzione è
+    calcolata dalla scadenza precedente, non dalla fine del lavoro, quindi
+    il tempo di esecuzione non si accumula come deriva. Se un task è in
+    ritardo di più di un intervallo le esecuzioni perse vengono saltate.
+    Il thread dorme fino alla prima scadenza: nessun risveglio a vuoto.
+
+    I task bloccanti (rete) girano su un worker separato, così non
+    ritardano il campionamento; vengono ripianificati al termine.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, _Task]] = []
+        self._tasks: Dict[str, _Task] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sched-io")
+
+    def add(
+        self,
+        name: str,
+        fn: TaskFn,
+        interval: float,
+        delay: float = 0.0,
+        blocking: bool = False,
+    ):
+        """Registra un task; la prima esecuzione avviene dopo delay secondi"""
+        task = _Task(name, fn, interval, blocking)
+        with self._cond:
+            self._tasks[name] = task
+            self._push(task, time.monotonic() + delay)
+
+    def wake(self, name: str):
+        """Anticipa subito la prossima esecuzione del task"""
+        with self._cond:
+            task = self._tasks.get(name)
+            if task is None or task.running:
+                return
+            if task.deadline > time.monotonic():
+                self._push(task, time.monotonic())
+
+    def _push(self, task: _Task, deadline: float):
+        """Inserisce la scadenza; le voci superate restano nell'heap e si scartano"""
+        task.deadline = deadline
+        heapq.heappush(self._heap, (deadline, next(self._seq), task))
+        self._cond.notify()
+
+    def start(self):
+        """Avvia il thread dello scheduler"""
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, name="scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Ferma lo scheduler e attende i task in corso
+
+        Chi chiama stop() può poi chiudere database e sink senza che un
+        sync sia ancora in esecuzione sul worker; i task in attesa di
+        esecuzione vengono annullati.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        # Il loop non sottomette più task al worker dopo essere uscito
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._worker.shutdown(wait=True, cancel_futures=True)
+
+    def _loop(self):
+        """Attende la prima scadenza ed esegue il task"""
+        while True:
+            with self._cond:
+                task = None
+                while self._running:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    deadline, _, candidate = self._heap[0]
+                    if deadline != candidate.deadline or candidate.running:
+                        heapq.heappop(self._heap)
+                        continue
+                    wait = deadline - time.monotonic()
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                    heapq.heappop(self._heap)
+                    task = candidate
+                    task.running = True
+                    break
+                if not self._running:
+                    return
+
+            if task.blocking:
+                self._worker.submit(self._run, task)
+            else:
+                self._run(task)
+
+    def _run(self, task: _Task):
+        """Esegue il task e calcola la scadenza successiva"""
+        try:
+            interval = task.fn()
+        except Exception as e:
+            print(f"[{task.name.upper()} ERROR] {e}")
+            interval = None
+        if interval is None:
+            interval = task.interval
+
+        with self._cond:
+            task.running = False
+            now = time.monotonic()
+            if task.blocking:
+                # La durata di un task di rete non deve provocare esecuzioni a raffica
+                deadline = now + interval
+            else:
+                deadline = task.deadline + interval
+                if deadline <= now - interval:
+                    deadline = now
+            self._push(task, deadline)
@@ -0,0 +1,173 @@
+"""Sessioni di utilizzo e rollup giornalieri calcolati in modo incrementale"""
+
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+from core.dictionary import StringDictionary
+
+PAUSE = "[PAUSE]"
+RESUME = "[RESUME]"
+
+
+def split_by_day(start_ts: float, end_ts: float) -> Iterator[Tuple[str, float]]:
+    """Divide l'intervallo in (giorno locale, secondi) ai confini di mezzanotte"""
+    current = start_ts
+    while current < end_ts:
+        day = datetime.fromtimestamp(current).date()
+        midnight = datetime.combine(day + timedelta(days=1), datetime.min.time())
+        boundary = min(end_ts, midnight.timestamp())
+        yield day.isoformat(), boundary - current
+        current = boundary
+
+
+class SessionBuilder:
+    """Trasforma gli eventi di cambio finestra in sessioni chiuse
+
+    Ogni evento chiude la sessione aperta; [PAUSE] la sospende e [RESUME]
+    la riapre sulla stessa finestra. Sessioni e rollup vengono scritti con
+    il cursore ricevuto, quindi nella stessa transazione dell'evento.
+    """
+
+    def __init__(self, dictionary: StringDictionary):
+        self.dictionary = dictionary
+        # (start_ts, start_event_id, process, window_title)
+        self._open: Optional[Tuple[float, int, str, str]] = None
+        self._paused: Optional[Tuple[str, str]] = None
+
+    @staticmethod
+    def init_schema(cur: sqlite3.Cursor) -> bool:
+        """Crea le tabelle; ritorna True se le sessioni sono nuove"""
+        exists = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'"
+        ).fetchone()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                start_ts REAL,
+                end_ts REAL,
+                duration REAL,
+                process_id INTEGER REFERENCES processes (id),
+                title_id INTEGER REFERENCES window_titles (id),
+                start_event_id INTEGER,
+                end_event_id INTEGER
+            )
+        """
+        )
+        cur.execute(
+            """
+            CREATE VIEW IF NOT EXISTS sessions_expanded AS
+            SELECT s.id, s.start_ts, s.end_ts, s.duration,
+                   p.name AS process, w.title AS window_title,
+                   s.start_event_id, s.end_event_id
+            FROM sessions s
+            JOIN processes p ON p.id = s.process_id
+            JOIN window_titles w ON w.id = s.title_id
+        """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_ts)"
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions (end_ts)")
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_sessions_process
+            ON sessions (process_id, start_ts)
+        """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_sessions_end_event
+            ON sessions (end_event_id)
+        """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS daily_rollup (
+                day TEXT,
+                process TEXT,
+                duration REAL,
+                PRIMARY KEY (day, process)
+            ) WITHOUT ROWID
+        """
+        )
+        return exists is None
+
+    def reset(self):
+        """Dimentica la sessione aperta (es. dopo un riavvio)"""
+        self._open = None
+        self._paused = None
+
+    def snapshot(self) -> Tuple:
+        """Stato corrente, da ripristinare se la transazione fallisce"""
+        return self._open, self._paused
+
+    def restore(self, state: Tuple):
+        """Ripristina uno stato salvato con snapshot()"""
+        self._open, self._paused = state
+
+    def apply(
+        self,
+        cur: sqlite3.Cursor,
+        event_id: int,
+        ts: float,
+        process: str,
+        window_title: str,
+    ):
+        """Applica un evento: chiude la sessione aperta e ne apre una nuova"""
+        previous = self._open
+        if previous is not None:
+            self._close(cur, previous, ts, event_id)
+            self._open = None
+
+        if process == PAUSE:
+            if previous is not None:
+                self._paused = (previous[2], previous[3])
+        elif process == RESUME:
+            if self._paused is not None:
+                self._open = (ts, event_id, *self._paused)
+                self._paused = None
+        else:
+            self._paused = None
+            self._open = (ts, event_id, process, window_title)
+
+    def _close(
+        self,
+        cur: sqlite3.Cursor,
+        session: Tuple[float, int, str, str],
+        end_ts: float,
+        end_event_id: int,
+    ):
+        """Scrive la sessione chiusa e aggiorna i rollup giornalieri"""
+        start_ts, start_event_id, process, window_title = session
+        if end_ts <= start_ts:
+            return
+
+        cur.execute(
+            """
+            INSERT INTO sessions (start_ts, end_ts, duration, process_id,
+                                  title_id, start_event_id, end_event_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+            (
+                start_ts,
+                end_ts,
+                end_ts - start_ts,
+                self.dictionary.process_id(cur, process),
+                self.dictionary.title_id(cur, window_title),
+                start_event_id,
+                end_event_id,
+            ),
+        )
+        cur.executemany(
+            """
+            INSERT INTO daily_rollup (day, process, duration) VALUES (?, ?, ?)
+            ON CONFLICT (day, process) DO UPDATE
+            SET duration = duration + excluded.duration
+        """,
+            [
+                (day, process, seconds)
+                for day, seconds in split_by_day(start_ts, end_ts)
+            ],
+        )
@@ -0,0 +1,373 @@
+"""Destinazioni della sincronizzazione: MongoDB, collector HTTP, file colonnari"""
+
+import glob
+import gzip
+import json
+import os
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import Config
+from core.mongo_sync import MongoSyncManager
+from core.retention import ARCHIVE_COLUMNS
+from core.retry import retry_with_backoff
+
+
+class SinkRejectedError(Exception):
+    """Blocco rifiutato dalla destinazione (es. HTTP 4xx): ritentare non serve"""
+
+
+class RetriableSinkError(Exception):
+    """Errore temporaneo della destinazione (HTTP 5xx o 429)"""
+
+
+class SyncSink(ABC):
+    """Interfaccia: riceve blocchi di record non sincronizzati in ordine di id
+
+    write() e flush() ritornano l'id più alto scritto in modo durevole
+    (0 = nessuno): il tracker avanza il watermark del sink solo fin lì.
+    Un sink può quindi accumulare record e confermarli più tardi; i record
+    oltre il watermark vengono rinviati e il sink deve ignorare quelli già
+    ricevuti.
+    """
+
+    name = "sink"
+
+    def ready(self) -> bool:
+        """False finché la destinazione non è raggiungibile"""
+        return True
+
+    @abstractmethod
+    def write(
+        self, records: List[Tuple], sessions: List[Tuple[float, float, str, int]]
+    ) -> int:
+        """Riceve un blocco; ritorna l'id più alto scritto in modo durevole"""
+
+    def flush(self, force: bool = False) -> int:
+        """Scrive quanto accumulato (sempre con force, es. all'arresto)"""
+        return 0
+
+
+class MongoSink(SyncSink):
+    """Sincronizzazione su MongoDB tramite MongoSyncManager"""
+
+    name = "mongo"
+
+    def __init__(self, mongo_manager: MongoSyncManager, instance_id: str):
+        self.mongo_manager = mongo_manager
+        self.instance_id = instance_id
+
+    def ready(self) -> bool:
+        return self.mongo_manager.ready.is_set()
+
+    def write(
+        self, records: List[Tuple], sessions: List[Tuple[float, float, str, int]]
+    ) -> int:
+        self.mongo_manager.sync_activities(records, self.instance_id, sessions)
+        return records[-1][0]
+
+
+class HttpSink(SyncSink):
+    """POST di blocchi JSON compressi a un collector HTTP
+
+    Ogni blocco ha una Idempotency-Key (device, database locale e
+    intervallo di id): il collector può scartare i rinvii dopo un timeout.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        url: str,
+        instance_id: str,
+        timeout: float = 10.0,
+        attempts: int = 5,
+        base_delay: float = 0.5,
+    ):
+        self.url = url
+        self.instance_id = instance_id
+        self.timeout = timeout
+        self.attempts = attempts
+        self.base_delay = base_delay
+
+    def write(
+        self, records: List[Tuple], sessions: List[Tuple[float, float, str, int]]
+    ) -> int:
+        first_id, last_id = records[0][0], records[-1][0]
+        body = {
+            "first_id": first_id,
+            "last_id": last_id,
+            "columns": list(ARCHIVE_COLUMNS),
+            "rows": [[*r[:5], *r[6:8]] for r in records],
+            "sessions": [list(s) for s in sessions],
+        }
+        data = gzip.compress(json.dumps(body, ensure_ascii=False).encode())
+        request = urllib.request.Request(
+            self.url,
+            data=data,
+            method="POST",
+            headers={
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip",
+                "Idempotency-Key": (
+                    f"{records[0][6]}:{self.instance_id}:{first_id}-{last_id}"
+                ),
+            },
+        )
+
+        def send():
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+            except urllib.error.HTTPError as e:
+                # HTTPError è anche URLError: va distinto prima
+                if e.code >= 500 or e.code == 429:
+                    raise RetriableSinkError(f"HTTP {e.code} {e.reason}") from e
+                raise SinkRejectedError(f"HTTP {e.code} {e.reason}") from e
+
+        # Solo errori di connessione, timeout, 5xx e 429; gli altri 4xx no
+        retry_with_backoff(
+            send,
+            attempts=self.attempts,
+            base_delay=self.base_delay,
+            retry_on=(
+                RetriableSinkError,
+                urllib.error.URLError,
+                ConnectionError,
+                socket.timeout,
+            ),
+            label="HTTP SINK RETRY",
+        )
+        return last_id
+
+
+class ArrowFileSink(SyncSink):
+    """File colonnari a rotazione per l'analisi offline (Arrow IPC o Parquet)
+
+    Ogni blocco viene scritto una sola volta, come record batch (o row
+    group Parquet), su un file .tmp tenuto aperto; il file viene chiuso e
+    rinominato, e solo allora i suoi record sono confermati, quando supera
+    max_bytes o dopo max_age secondi. Dopo un crash il .tmp incompleto
+    viene scartato e i record non confermati vengono rinviati.
+
+    Il nome del file contiene il database locale e l'intervallo di id,
+    così dopo un riavvio il sink riparte dall'ultimo file scritto senza
+    duplicare righe (e un database nuovo, con id da 1, non viene scambiato
+    per uno già esportato). Nei file Arrow le stringhe usano un dizionario
+    per file, esteso con delta da un blocco all'altro. Senza compressione
+    (il default) i file Arrow si leggono zero-copy con
+    pyarrow.memory_map; con zstd sono più piccoli ma vanno decompressi.
+    """
+
+    name = "file"
+
+    # Indici nei record delle colonne stringa (process, window_title,
+    # device_id, username): dizionario per file nei file Arrow
+    _STRING_COLUMNS = (2, 3, 6, 7)
+
+    def __init__(
+        self,
+        directory: str,
+        device_id: str,
+        instance_id: str,
+        file_format: str = "arrow",
+        compression: str = "none",
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age: float = 3600.0,
+    ):
+        # Dipendenza opzionale: pip install pyarrow
+        import pyarrow
+
+        self._pa = pyarrow
+        self.directory = directory
+        self.device_id = device_id
+        self.instance_id = instance_id
+        self.file_format = file_format
+        self.compression = None if compression == "none" else compression
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        # File aperto: handle, writer, primo e ultimo id, apertura
+        self._file = None
+        self._writer = None
+        self._first_id = 0
+        self._received_id = 0
+        self._opened_at = 0.0
+        self._dictionaries: Dict[int, Dict[str, int]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._discard_partial()
+        self._written_id = self._last_written_id()
+
+    @property
+    def _extension(self) -> str:
+        return "parquet" if self.file_format == "parquet" else "arrow"
+
+    def _prefix(self) -> str:
+        return os.path.join(
+            self.directory, f"activity-{self.device_id}-{self.instance_id}"
+        )
+
+    def _discard_partial(self):
+        """Rimuove i .tmp lasciati da un crash: i loro record verranno rinviati"""
+        for path in glob.glob(f"{self._prefix()}-*.{self._extension}.tmp"):
+            os.remove(path)
+
+    def _last_written_id(self) -> int:
+        """Ultimo id presente nei file già scritti da questo database"""
+        last_id = 0
+        for path in glob.glob(f"{self._prefix()}-*-*.{self._extension}"):
+            match = re.search(r"-(\d+)-(\d+)\.\w+$", path)
+            if match:
+                last_id = max(last_id, int(match.group(2)))
+        return last_id
+
+    def write(
+        self, records: List[Tuple], sessions: List[Tuple[float, float, str, int]]
+    ) -> int:
+        received = self._received_id if self._writer else self._written_id
+        new = [r for r in records if r[0] > received]
+        if new:
+            if self._writer is None:
+                self._open(new[0][0])
+            self._write_batch(new)
+            self._received_id = new[-1][0]
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+        return self._written_id
+
+    def flush(self, force: bool = False) -> int:
+        if self._writer is not None and (
+            force or time.monotonic() - self._opened_at >= self.max_age
+        ):
+            self._rotate()
+        return self._written_id
+
+    def _tmp_path(self) -> str:
+        return f"{self._prefix()}-{self._first_id:012d}.{self._extension}.tmp"
+
+    def _schema(self):
+        pa = self._pa
+        string = (
+            pa.string()
+            if self.file_format == "parquet"
+            else pa.dictionary(pa.int32(), pa.string())
+        )
+        return pa.schema(
+            [
+                ("id", pa.int64()),
+                ("timestamp", pa.timestamp("ms", tz="UTC")),
+                ("process", string),
+                ("window_title", string),
+                ("cpu_percent", pa.float64()),
+                ("device_id", string),
+                ("username", string),
+            ]
+        )
+
+    def _open(self, first_id: int):
+        """Apre il file .tmp e il writer per i blocchi successivi"""
+        pa = self._pa
+        self._first_id = first_id
+        self._opened_at = time.monotonic()
+        self._dictionaries = {i: {} for i in self._STRING_COLUMNS}
+        self._file = pa.OSFile(self._tmp_path(), "wb")
+        if self.file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(
+                self._file, self._schema(), compression=self.compression or "none"
+            )
+        else:
+            options = pa.ipc.IpcWriteOptions(
+                compression=self.compression, emit_dictionary_deltas=True
+            )
+            self._writer = pa.ipc.new_file(self._file, self._schema(), options=options)
+
+    def _string_column(self, index: int, values):
+        """Colonna stringa: indici nel dizionario del file (solo Arrow)"""
+        pa = self._pa
+        if self.file_format == "parquet":
+            return pa.array(values, pa.string())
+        # Il dizionario cresce solo in coda: il writer emette i delta
+        dictionary = self._dictionaries[index]
+        indices = [dictionary.setdefault(v, len(dictionary)) for v in values]
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), pa.array(list(dictionary), pa.string())
+        )
+
+    def _write_batch(self, rows: List[Tuple]):
+        pa = self._pa
+        columns = list(zip(*rows))
+        batch = pa.record_batch(
+            [
+                pa.array(columns[0], pa.int64()),
+                pa.array(columns[1], pa.timestamp("ms", tz="UTC")),
+                self._string_column(2, columns[2]),
+                self._string_column(3, columns[3]),
+                pa.array(columns[4], pa.float64()),
+                self._string_column(6, columns[6]),
+                self._string_column(7, columns[7]),
+            ],
+            schema=self._schema(),
+        )
+        self._writer.write_batch(batch)
+
+    def _rotate(self):
+        """Chiude il file aperto e lo pubblica col nome definitivo"""
+        self._writer.close()
+        self._file.close()
+        self._writer = self._file = None
+
+        tmp_path = self._tmp_path()
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(
+            tmp_path,
+            f"{self._prefix()}-{self._first_id:012d}-{self._received_id:012d}"
+            f".{self._extension}",
+        )
+        self._written_id = self._received_id
+
+
+def build_sinks(
+    config: Config, mongo_manager: MongoSyncManager, instance_id: str
+) -> List[SyncSink]:
+    """Sink configurati in SYNC_SINKS, nell'ordine
+
+    instance_id: identificativo del database locale (DatabaseManager)
+    """
+    sinks: List[SyncSink] = []
+    for name in config.SYNC_SINKS:
+        sink: Optional[SyncSink] = None
+        if name == "mongo":
+            sink = MongoSink(mongo_manager, instance_id)
+        elif name == "http":
+            sink = HttpSink(
+                config.SYNC_HTTP_URL,
+                instance_id,
+                timeout=config.SYNC_HTTP_TIMEOUT,
+                attempts=config.SYNC_MAX_RETRIES,
+                base_delay=config.SYNC_BACKOFF_BASE,
+            )
+        elif name == "file":
+            try:
+                sink = ArrowFileSink(
+                    config.SYNC_FILE_DIR,
+                    config.DEVICE_ID,
+                    instance_id,
+                    file_format=config.SYNC_FILE_FORMAT,
+                    compression=config.SYNC_FILE_COMPRESSION,
+                    max_bytes=config.SYNC_FILE_MAX_MB * 1024 * 1024,
+                    max_age=config.SYNC_FILE_MAX_AGE,
+                )
+            except ImportError:
+                print("[WARN] pyarrow non installato: sink file disattivato")
+        if sink is not None:
+            sinks.append(sink)
+    return sinks
@@ -0,0 +1,21 @@
+"""Conversioni dei timestamp: epoch in millisecondi (UTC) come formato unico"""
+
+from datetime import datetime, timezone
+from typing import Union
+
+
+def to_ms(value: Union[int, float, str, datetime]) -> int:
+    """Millisecondi epoch da datetime, stringa ISO (schema v1) o numero
+
+    Come datetime.timestamp(), un datetime senza fuso è in ora locale.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return round(value.timestamp() * 1000)
+    return int(value)
+
+
+def to_datetime(ms: int) -> datetime:
+    """Datetime UTC (BSON date lato MongoDB) dai millisecondi epoch"""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc)
@@ -1,13 +1,17 @@
 """Logica di tracking attività utente"""
 
-import os
-import re
+import threading
 import time
+from typing import List, Optional
 import psutil
-from pynput import mouse, keyboard
 from core.database import DatabaseManager
+from core.idle import IdleTimeSource, create_idle_source
+from core.metrics import MetricsRegistry, registry
 from core.mongo_sync import MongoSyncManager
-from core.window_detector import WindowDetector
+from core.rules import RuleEngine
+from core.scheduler import Scheduler
+from core.sinks import MongoSink, SyncSink
+from core.window_service import ActiveWindowService
 from config.settings import Config
 
 
@@ -19,33 +23,64 @@ class ActivityTracker:
         config: Config,
         db_manager: DatabaseManager,
         mongo_manager: MongoSyncManager,
+        window_service: ActiveWindowService,
+        idle_source: Optional[IdleTimeSource] = None,
+        started_at: Optional[float] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        sinks: Optional[List[SyncSink]] = None,
+        rules: Optional[RuleEngine] = None,
     ):
         self.config = config
         self.db_manager = db_manager
         self.mongo_manager = mongo_manager
-        self._last_input_time = time.time()
+        if sinks is None:
+            sinks = [MongoSink(mongo_manager, db_manager.instance_id)]
+        self.sinks = sinks
+        self.rules = rules or RuleEngine.from_config(config)
+        self.window_service = window_service
         self._paused = False
         self._last_window = None
         self._last_process = None
-        self._init_input_listeners()
-
-    def _init_input_listeners(self):
-        """Inizializza i listener per mouse e tastiera"""
-        mouse.Listener(
-            on_move=self._on_input_activity,
-            on_click=self._on_input_activity,
-            on_scroll=self._on_input_activity,
-        ).start()
-        keyboard.Listener(on_press=self._on_input_activity).start()
-
-    def _on_input_activity(self, *args, **kwargs):
-        """Callback per attività input"""
-        self._last_input_time = time.time()
+        self._window_lock = threading.Lock()
+        # Metrica di avvio: secondi (perf_counter) dall'avvio al primo evento
+        self.started_at = started_at
+        self.first_event_latency: Optional[float] = None
+        self._scheduler: Optional[Scheduler] = None
+        self._last_focus_change = 0.0
+        self._idle_interval = 0.0
+
+        metrics = metrics or registry
+        self._m_watermarks = {
+            sink.name: metrics.gauge(
+                "sync_sink_watermark", "Ultimo id confermato dal sink", sink=sink.name
+            )
+            for sink in self.sinks
+        }
+        self._m_events = metrics.counter("tracked_events_total", "Eventi registrati")
+        self._m_errors = metrics.counter(
+            "errors_total", "Errori per componente", component="tracker"
+        )
+        self._m_interval = metrics.gauge(
+            "tracking_interval_seconds", "Intervallo di campionamento corrente"
+        )
+        self._m_startup = metrics.gauge(
+            "startup_first_event_seconds", "Tempo dall'avvio al primo evento"
+        )
+        self.idle_source = idle_source or create_idle_source(config.IDLE_SOURCE)
+        self.idle_source.start()
+        self.window_service.subscribe(self._on_focus_change)
+
+    def _idle_seconds(self) -> float:
+        """Secondi dall'ultimo input (0 se la sorgente non risponde)"""
+        try:
+            return self.idle_source.idle_seconds()
+        except Exception as e:
+            print(f"[IDLE ERROR] {e}")
+            return 0.0
 
     def is_user_active(self) -> bool:
         """Verifica se l'utente è attivo"""
-        elapsed = time.time() - self._last_input_time
-        return elapsed < self.config.INACTIVITY_THRESHOLD
+        return self._idle_seconds() < self.config.INACTIVITY_THRESHOLD
 
     def track_event(self, process_name: str, window_title: str):
         """Registra un evento di attività"""
@@ -58,63 +93,156 @@ class ActivityTracker:
                 self.config.DEVICE_ID,
                 self.config.USERNAME,
             )
-            print(f"[TRACK] {process_name} - {window_title}")
+            self._m_events.inc()
+            if self.started_at is not None and self.first_event_latency is None:
+                self.first_event_latency = time.perf_counter() - self.started_at
+                self._m_startup.set(self.first_event_latency)
+                print(
+                    f"[STARTUP] primo evento dopo {self.first_event_latency * 1000:.0f}ms"
+                )
         except Exception as e:
+            self._m_errors.inc()
             print(f"[TRACK ERROR] {e}")
 
-    def tracking_loop(self):
-        """Loop principale di tracking"""
-
-        while True:
+    def _handle_window(self, process_name: str, window_title: str):
+        """Registra la finestra attiva se diversa dall'ultima tracciata"""
+        # Ignora processi e finestre esclusi dalle regole
+        if self.rules.is_excluded(process_name, window_title):
+            return
+
+        with self._window_lock:
+            # Traccia solo se cambiato
+            if window_title == self._last_window and process_name == self._last_process:
+                return
+            self._last_window = window_title
+            self._last_process = process_name
+        self.track_event(process_name, window_title)
+
+    def _on_focus_change(self, process_name: str, window_title: str):
+        """Cambio di finestra pubblicato dal servizio: cattura i cambi tra due poll"""
+        self._last_focus_change = time.monotonic()
+        if self._scheduler is not None:
+            # Torna subito al campionamento veloce (anche per uscire dalla pausa)
+            self._scheduler.wake("tracking")
+        if self._paused:
+            return
+        try:
+            self._handle_window(process_name, window_title)
+        except Exception as e:
+            print(f"[TRACKING ERROR] {e}")
+
+    def stop(self):
+        """Chiude la sessione in corso prima dell'arresto"""
+        if not self._paused:
+            self._paused = True
+            self.track_event("[PAUSE]", "[PAUSE]")
+        self.idle_source.stop()
+        # I sink che accumulano scrivono quanto ricevuto finora
+        for sink in self.sinks:
             try:
-                # Gestione pausa per inattività
-                if not self.is_user_active():
-                    if not self._paused:
-                        print("[PAUSE] ⏸️")
-                        self._paused = True
-                        self.track_event("[PAUSE]", "[PAUSE]")
-                    time.sleep(self.config.TRACKING_INTERVAL)
-                    continue
-                elif self._paused:
-                    print("[RESUME] ✅")
-                    self._paused = False
-                    self.track_event("[RESUME]", "[RESUME]")
-
-                # Rileva finestra attiva
-                process_name, window_title = WindowDetector.get_active_window()
-                process_name = os.path.basename(process_name)
-                process_name = re.sub(r"\.app$", "", process_name, flags=re.IGNORECASE)
-
-                # Ignora processi blacklist
-                if process_name in self.config.PROCESS_BLACKLIST:
-                    time.sleep(self.config.TRACKING_INTERVAL)
-                    continue
-
-                # Traccia solo se cambiato
-                if (
-                    window_title != self._last_window
-                    or process_name != self._last_process
-                ):
-                    self.track_event(process_name, window_title)
-                    self._last_window = window_title
-                    self._last_process = process_name
-
-                time.sleep(self.config.TRACKING_INTERVAL)
-
+                self._advance(sink, sink.flush(force=True))
             except Exception as e:
-                print(f"[TRACKING ERROR] {e}")
-                time.sleep(self.config.TRACKING_INTERVAL)
-
-    def sync_loop(self):
-        """Loop di sincronizzazione periodica"""
-        print("[SYNC] Loop avviato...")
+                print(f"[SYNC ERROR] {sink.name}: {e}")
+        self._mark_synced()
+
+    def schedule(self, scheduler: Scheduler):
+        """Registra campionamento adattivo e sync sullo scheduler"""
+        self._scheduler = scheduler
+        scheduler.add("tracking", self.tracking_tick, self.config.TRACKING_INTERVAL)
+        scheduler.add(
+            "sync",
+            self.sync_pending,
+            self.config.SYNC_INTERVAL,
+            delay=self.config.SYNC_INTERVAL,
+            blocking=True,
+        )
+
+    def tracking_tick(self) -> float:
+        """Campionamento con registrazione dell'intervallo scelto"""
+        interval = self._tracking_tick()
+        self._m_interval.set(interval)
+        return interval
+
+    def _tracking_tick(self) -> float:
+        """Un campionamento; ritorna i secondi fino al prossimo
+
+        Veloce subito dopo input o cambio di finestra, intervallo base
+        durante l'uso tranquillo, back-off esponenziale in pausa.
+        """
+        fast = self.config.TRACKING_FAST_INTERVAL
+        try:
+            idle = self._idle_seconds()
+
+            # Gestione pausa per inattività
+            if idle >= self.config.INACTIVITY_THRESHOLD:
+                if not self._paused:
+                    print("[PAUSE] ⏸️")
+                    self._paused = True
+                    self.track_event("[PAUSE]", "[PAUSE]")
+                self._idle_interval = min(
+                    self._idle_interval * 2 if self._idle_interval else fast,
+                    self.config.TRACKING_MAX_INTERVAL,
+                )
+                return self._idle_interval
+            self._idle_interval = 0.0
+            if self._paused:
+                print("[RESUME] ✅")
+                self._paused = False
+                self.track_event("[RESUME]", "[RESUME]")
+
+            # Rileva finestra attiva
+            process_name, window_title = self.window_service.sample()
+            self._handle_window(process_name, window_title)
+
+            since_focus = time.monotonic() - self._last_focus_change
+            if min(idle, since_focus) < self.config.TRACKING_FAST_WINDOW:
+                return fast
+            return self.config.TRACKING_INTERVAL
 
-        while True:
-            time.sleep(self.config.SYNC_INTERVAL)
+        except Exception as e:
+            self._m_errors.inc()
+            print(f"[TRACKING ERROR] {e}")
+            return self.config.TRACKING_INTERVAL
+
+    def sync_pending(self):
+        """Invia il backlog a ogni sink; synced = intervallo confermato da tutti
+
+        Un sink in errore non blocca gli altri: l'errore viene rilanciato
+        dopo aver aggiornato i record confermati.
+        """
+        error = None
+        for sink in self.sinks:
+            # Offline o destinazione non ancora pronta: i record restano in coda
+            if not sink.ready():
+                continue
             try:
-                records = self.db_manager.get_unsynced_records()
-                if records:
-                    self.mongo_manager.sync_activities(records)
-                    self.db_manager.mark_as_synced()
+                self._sync_sink(sink)
             except Exception as e:
-                print(f"[SYNC ERROR] {e}")
+                error = error or e
+        self._mark_synced()
+        if error is not None:
+            raise error
+
+    def _sync_sink(self, sink: SyncSink):
+        """Invia a blocchi i record oltre il watermark del sink"""
+        watermark = self.db_manager.get_sink_watermark(sink.name)
+        for chunk in self.db_manager.iter_unsynced_chunks(
+            self.config.SYNC_CHUNK_SIZE, after_id=watermark
+        ):
+            sessions = self.db_manager.get_closed_sessions(chunk[0][0], chunk[-1][0])
+            self._advance(sink, sink.write(chunk, sessions))
+        self._advance(sink, sink.flush())
+
+    def _advance(self, sink: SyncSink, acked_id: int):
+        """Salva il watermark del sink se è avanzato"""
+        if acked_id:
+            self.db_manager.set_sink_watermark(sink.name, acked_id)
+            self._m_watermarks[sink.name].set(acked_id)
+
+    def _mark_synced(self):
+        """Marca synced i record confermati da tutti i sink configurati"""
+        if not self.sinks:
+            return
+        done = min(self.db_manager.get_sink_watermark(s.name) for s in self.sinks)
+        if done:
+            self.db_manager.mark_as_synced(1, done)
@@ -0,0 +1,136 @@
+"""Cache locale dei documenti process_windows e dei livelli di attenzione"""
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """Datetime BSON (naive = UTC) in epoch"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class ProcessWindowCache:
+    """Copia locale di process_windows per avviare la GUI senza MongoDB
+
+    Il watermark è il massimo updated_at ricevuto dal server: i refresh
+    successivi scaricano solo i documenti modificati da quel momento.
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._init_table()
+
+    def _init_table(self):
+        """Crea la tabella della cache"""
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS process_windows_cache (
+                id TEXT PRIMARY KEY,
+                device_id TEXT NOT NULL,
+                process TEXT NOT NULL,
+                window_title TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                updated_at REAL
+            )
+        """
+        )
+        self._conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_process_windows_cache_device
+            ON process_windows_cache(device_id, updated_at)
+        """
+        )
+        self._conn.commit()
+
+    def load(self, device_id: str) -> List[Dict]:
+        """Documenti in cache per il device"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, process, window_title, level FROM process_windows_cache
+                WHERE device_id = ?
+                ORDER BY rowid
+            """,
+                (device_id,),
+            ).fetchall()
+        return [
+            {"_id": r[0], "process": r[1], "window_title": r[2], "level": r[3]}
+            for r in rows
+        ]
+
+    def levels(self, device_id: str) -> Dict[Tuple[str, str], int]:
+        """Livello per (processo, finestra)"""
+        return {
+            (d["process"], d["window_title"]): d["level"] for d in self.load(device_id)
+        }
+
+    def watermark(self, device_id: str) -> Optional[datetime]:
+        """Ultimo updated_at ricevuto dal server, None se mai sincronizzato"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(updated_at) FROM process_windows_cache WHERE device_id = ?",
+                (device_id,),
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0], timezone.utc)
+
+    def merge(self, device_id: str, docs: Iterable[Dict]) -> List[Dict]:
+        """Salva i documenti ricevuti dal server; ritorna quelli normalizzati"""
+        merged = [
+            {
+                "_id": str(doc["_id"]),
+                "process": doc["process"],
+                "window_title": doc["window_title"],
+                "level": doc.get("level", 5),
+                "updated_at": _epoch(doc.get("updated_at")),
+            }
+            for doc in docs
+        ]
+        if not merged:
+            return merged
+
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO process_windows_cache
+                    (id, device_id, process, window_title, level, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    level = excluded.level,
+                    updated_at = excluded.updated_at
+            """,
+                [
+                    (
+                        d["_id"],
+                        device_id,
+                        d["process"],
+                        d["window_title"],
+                        d["level"],
+                        d["updated_at"],
+                    )
+                    for d in merged
+                ],
+            )
+            self._conn.commit()
+        return merged
+
+    def set_level(self, doc_id: str, level: int):
+        """Aggiorna il livello in cache dopo una modifica locale
+
+        updated_at non cambia: resta il riferimento del server.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE process_windows_cache SET level = ? WHERE id = ?",
+                (level, str(doc_id)),
+            )
+            self._conn.commit()
@@ -1,29 +1,78 @@
 """Rilevamento finestra attiva cross-platform"""
 
 import os
-import re
 import platform
 import subprocess
-from typing import Tuple, Optional
-import psutil
+import threading
+import time
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
+
+from core.metrics import registry
+from core.process_cache import process_names
+from core.rules import extract_domain
+
+if TYPE_CHECKING:
+    from core.x11_watcher import X11ActiveWindowWatcher
 
 
 class WindowDetector:
     """Rileva la finestra attiva in modo cross-platform"""
 
+    # Backend della piattaforma, risolto al primo utilizzo
+    _backend: Optional[Callable[[], Tuple[str, str]]] = None
+
+    # Backend Linux basato su eventi (python-xlib), condiviso
+    _linux_watcher: Optional["X11ActiveWindowWatcher"] = None
+    _linux_failed = False
+    _linux_lock = threading.Lock()
+
     @staticmethod
     def get_active_window() -> Tuple[str, str]:
         """Ritorna (process_name, window_title)"""
-        system = platform.system()
-
-        if system == "Darwin":
-            return WindowDetector._get_macos_window()
-        elif system == "Windows":
-            return WindowDetector._get_windows_window()
-        elif system == "Linux":
-            return WindowDetector._get_linux_window()
-        else:
-            return "unknown", "Unknown"
+        return WindowDetector.resolve_backend()()
+
+    @staticmethod
+    def resolve_backend() -> Callable[[], Tuple[str, str]]:
+        """Sceglie il backend della piattaforma una sola volta"""
+        if WindowDetector._backend is None:
+            system = platform.system()
+            if system == "Darwin":
+                backend = WindowDetector._get_macos_window
+            elif system == "Windows":
+                backend = WindowDetector._get_windows_window
+            elif system == "Linux":
+                backend = WindowDetector._get_linux_window
+            else:
+                backend = WindowDetector._get_unknown_window
+            WindowDetector._backend = WindowDetector._timed(backend)
+        return WindowDetector._backend
+
+    @staticmethod
+    def _timed(backend: Callable[[], Tuple[str, str]]) -> Callable[[], Tuple[str, str]]:
+        """Registra latenza ed errori del backend"""
+        latency = registry.histogram(
+            "window_detect_seconds", "Latenza del rilevamento finestra attiva"
+        )
+        errors = registry.counter(
+            "errors_total", "Errori per componente", component="window_detector"
+        )
+
+        def timed() -> Tuple[str, str]:
+            start = time.perf_counter()
+            try:
+                return backend()
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+
+        return timed
+
+    @staticmethod
+    def _get_unknown_window() -> Tuple[str, str]:
+        """Piattaforma non supportata"""
+        return "unknown", "Unknown"
 
     @staticmethod
     def _get_macos_window() -> Tuple[str, str]:
@@ -46,8 +95,7 @@ class WindowDetector:
             if app_name in browsers:
                 url = WindowDetector._get_browser_url(app_name)
                 if url:
-                    match = re.search(r"https?://([a-zA-Z0-9.-]+)", url)
-                    window_title = match.group(1) if match else url
+                    window_title = extract_domain(url)
         except Exception as e:
             print(f"[WARN] macOS detection failed: {e}")
 
@@ -86,38 +134,84 @@ class WindowDetector:
 
             hwnd = win32gui.GetForegroundWindow()
             _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            proc = psutil.Process(pid)
-            window_title = win32gui.GetWindowText(hwnd)
-
-            match = re.search(r"https?://([a-zA-Z0-9.-]+)", window_title)
-            if match:
-                window_title = match.group(1)
+            process_name = process_names.name(pid)
+            window_title = extract_domain(win32gui.GetWindowText(hwnd))
 
-            return proc.name(), window_title or proc.name()
+            return process_name, window_title or process_name
         except Exception as e:
             print(f"[WARN] Windows detection failed: {e}")
             return "unknown", "Unknown"
 
+    @staticmethod
+    def _get_linux_watcher() -> Optional["X11ActiveWindowWatcher"]:
+        """Watcher X11 condiviso, avviato al primo utilizzo"""
+        if WindowDetector._linux_watcher is None and not WindowDetector._linux_failed:
+            with WindowDetector._linux_lock:
+                if (
+                    WindowDetector._linux_watcher is None
+                    and not WindowDetector._linux_failed
+                ):
+                    try:
+                        from core.x11_watcher import X11ActiveWindowWatcher
+
+                        watcher = X11ActiveWindowWatcher()
+                        watcher.start()
+                        WindowDetector._linux_watcher = watcher
+                    except Exception as e:
+                        # python-xlib assente o display non raggiungibile
+                        print(f"[WARN] X11 watcher non disponibile, uso xdotool: {e}")
+                        WindowDetector._linux_failed = True
+        return WindowDetector._linux_watcher
+
+    @staticmethod
+    def add_focus_listener(listener: Callable[[str, str], None]) -> bool:
+        """Registra una callback sui cambi di focus, se la piattaforma li notifica"""
+        if platform.system() != "Linux":
+            return False
+        watcher = WindowDetector._get_linux_watcher()
+        if watcher is None:
+            return False
+        watcher.add_listener(
+            lambda process, title: listener(process, extract_domain(title))
+        )
+        return True
+
     @staticmethod
     def _get_linux_window() -> Tuple[str, str]:
         """Rileva finestra attiva su Linux"""
+        watcher = WindowDetector._get_linux_watcher()
+        if watcher is not None and watcher.is_running():
+            process, title = watcher.current()
+            return process, extract_domain(title)
+        return WindowDetector._get_linux_window_xdotool()
+
+    @staticmethod
+    def _get_linux_window_xdotool() -> Tuple[str, str]:
+        """Rileva finestra attiva su Linux tramite xdotool"""
+        pid = None
         try:
-            title = (
-                subprocess.check_output(
-                    ["xdotool", "getwindowfocus", "getwindowname"],
-                    stderr=subprocess.DEVNULL,
-                )
-                .decode()
-                .strip()
-            )
+            output = WindowDetector._xdotool("getwindowpid", "getwindowname")
+            pid = int(output[0]) if output[0].isdigit() else None
+            title = output[-1]
+        except subprocess.CalledProcessError:
+            # Finestre senza _NET_WM_PID: xdotool fallisce su getwindowpid
+            try:
+                title = WindowDetector._xdotool("getwindowname")[-1]
+            except Exception:
+                return "unknown", "Unknown"
+        except Exception:
+            return "unknown", "Unknown"
 
-            if not title:
-                title = "Unknown"
+        if not title:
+            title = "Unknown"
 
-            match = re.search(r"https?://([a-zA-Z0-9.-]+)", title)
-            if match:
-                title = match.group(1)
+        return process_names.name(pid), extract_domain(title)
 
-            return "unknown", title
-        except Exception:
-            return "unknown", "Unknown"
+    @staticmethod
+    def _xdotool(*commands: str) -> List[str]:
+        """Esegue xdotool sulla finestra con il focus, una riga per comando"""
+        output = subprocess.check_output(
+            ["xdotool", "getwindowfocus", *commands], stderr=subprocess.DEVNULL
+        )
+        lines = [line.strip() for line in output.decode().splitlines()]
+        return lines or [""]
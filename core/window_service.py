@@ -0,0 +1,92 @@
+"""Servizio condiviso di rilevamento della finestra attiva"""
+
+import os
+import re
+import threading
+from typing import Callable, List, Tuple
+
+from core.window_detector import WindowDetector
+
+# Callback invocata ad ogni cambio: (process_name, window_title)
+Subscriber = Callable[[str, str], None]
+
+_APP_SUFFIX_RE = re.compile(r"\.app$", re.IGNORECASE)
+
+
+def normalize_process_name(process_name: str) -> str:
+    """Nome processo senza percorso né suffisso .app"""
+    return _APP_SUFFIX_RE.sub("", os.path.basename(process_name))
+
+
+class ActiveWindowService:
+    """Rileva la finestra attiva e pubblica i cambi agli iscritti
+
+    Il backend della piattaforma viene risolto una volta sola; tracker e GUI
+    leggono lo stesso snapshot, quindi aggiungere consumatori non aumenta il
+    costo di rilevamento.
+    """
+
+    def __init__(self):
+        self._backend = WindowDetector.resolve_backend()
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscriber] = []
+        self._snapshot: Tuple[str, str] = ("unknown", "Unknown")
+        self._running = False
+
+    def start(self):
+        """Registra i backend a eventi e rileva la finestra iniziale
+
+        Il campionamento periodico non ha un thread proprio: lo esegue il
+        tracker dallo scheduler, con frequenza adattiva.
+        """
+        if self._running:
+            return
+        self._running = True
+        # I backend a eventi notificano subito i cambi tra due campioni
+        WindowDetector.add_focus_listener(self.publish)
+        self.sample()
+
+    def stop(self):
+        """Ferma il servizio"""
+        self._running = False
+
+    def sample(self) -> Tuple[str, str]:
+        """Interroga il backend e pubblica il risultato"""
+        try:
+            process_name, window_title = self._backend()
+        except Exception as e:
+            print(f"[WINDOW ERROR] {e}")
+            return self.snapshot()
+        return self.publish(process_name, window_title)
+
+    def publish(self, process_name: str, window_title: str) -> Tuple[str, str]:
+        """Aggiorna lo snapshot e notifica gli iscritti se è cambiato"""
+        snapshot = (normalize_process_name(process_name), window_title)
+        with self._lock:
+            changed = snapshot != self._snapshot
+            self._snapshot = snapshot
+            subscribers = list(self._subscribers)
+
+        if changed:
+            for subscriber in subscribers:
+                try:
+                    subscriber(*snapshot)
+                except Exception as e:
+                    print(f"[WINDOW SUBSCRIBER ERROR] {e}")
+        return snapshot
+
+    def snapshot(self) -> Tuple[str, str]:
+        """Ultimo (process_name, window_title) rilevato"""
+        with self._lock:
+            return self._snapshot
+
+    def subscribe(self, subscriber: Subscriber):
+        """Registra una callback sui cambi di finestra attiva"""
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Rimuove una callback registrata"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
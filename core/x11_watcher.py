@@ -0,0 +1,154 @@
+"""Rilevamento finestra attiva su X11 basato su eventi"""
+
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from core.process_cache import process_names
+
+# Callback invocata ad ogni cambio di focus: (process_name, window_title)
+FocusListener = Callable[[str, str], None]
+
+
+class X11ActiveWindowWatcher:
+    """Mantiene una connessione X11 e segue i cambi di _NET_ACTIVE_WINDOW
+
+    Funziona con qualsiasi display X (anche Xvfb): basta passare il nome
+    del display o impostare DISPLAY.
+    """
+
+    def __init__(self, display_name: Optional[str] = None):
+        # Import opzionale: python-xlib serve solo su Linux
+        from Xlib import X, display
+
+        self._X = X
+        self._display = display.Display(display_name)
+        self._root = self._display.screen().root
+        self._atom_active = self._display.intern_atom("_NET_ACTIVE_WINDOW")
+        self._atom_name = self._display.intern_atom("_NET_WM_NAME")
+        self._atom_utf8 = self._display.intern_atom("UTF8_STRING")
+        self._atom_pid = self._display.intern_atom("_NET_WM_PID")
+
+        self._lock = threading.Lock()
+        self._listeners: List[FocusListener] = []
+        self._window = None
+        self._process = "unknown"
+        self._snapshot: Tuple[str, str] = ("unknown", "Unknown")
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._refresh_active()
+
+    def start(self):
+        """Avvia il thread che riceve gli eventi X"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._event_loop, name="x11-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Ferma il watcher e chiude la connessione"""
+        self._running = False
+        try:
+            self._display.close()
+        except Exception:
+            pass
+
+    def is_running(self) -> bool:
+        """True finché la connessione X è attiva"""
+        return self._running
+
+    def add_listener(self, listener: FocusListener):
+        """Registra una callback per i cambi di finestra attiva"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def current(self) -> Tuple[str, str]:
+        """Ultimo (process_name, window_title) noto, senza chiamate a X"""
+        with self._lock:
+            return self._snapshot
+
+    def _event_loop(self):
+        """Riceve PropertyNotify su root e sulla finestra attiva"""
+        X = self._X
+        while self._running:
+            try:
+                event = self._display.next_event()
+            except Exception as e:
+                if self._running:
+                    print(f"[WARN] X11 watcher interrotto: {e}")
+                self._running = False
+                return
+
+            if event.type != X.PropertyNotify:
+                continue
+            if event.atom == self._atom_active:
+                self._refresh_active()
+            elif event.atom in (self._atom_name, X.Atom.WM_NAME):
+                # Cambio titolo della finestra attiva (es. nuova tab)
+                if self._window is not None and event.window == self._window:
+                    self._refresh_active()
+
+    def _refresh_active(self):
+        """Rilegge finestra attiva e titolo, notificando se cambiati"""
+        X = self._X
+        window = None
+        title = "Unknown"
+        try:
+            prop = self._root.get_full_property(self._atom_active, X.AnyPropertyType)
+            window_id = prop.value[0] if prop and len(prop.value) else 0
+            if window_id:
+                window = self._display.create_resource_object("window", window_id)
+                title = self._read_title(window) or "Unknown"
+        except Exception:
+            window = None
+
+        if window is not None and window != self._window:
+            try:
+                # Segue anche i cambi di titolo della nuova finestra attiva
+                window.change_attributes(event_mask=X.PropertyChangeMask)
+            except Exception:
+                pass
+            self._process = process_names.name(self._read_pid(window))
+        elif window is None:
+            self._process = "unknown"
+        self._window = window
+
+        snapshot = (self._process, title)
+        with self._lock:
+            changed = snapshot != self._snapshot
+            self._snapshot = snapshot
+            listeners = list(self._listeners)
+
+        if changed:
+            for listener in listeners:
+                try:
+                    listener(*snapshot)
+                except Exception as e:
+                    print(f"[WARN] focus listener: {e}")
+
+    def _read_pid(self, window) -> Optional[int]:
+        """Legge il PID del proprietario della finestra (_NET_WM_PID)"""
+        try:
+            prop = window.get_full_property(self._atom_pid, self._X.AnyPropertyType)
+        except Exception:
+            return None
+        if prop and len(prop.value):
+            return int(prop.value[0])
+        return None
+
+    def _read_title(self, window) -> Optional[str]:
+        """Legge _NET_WM_NAME (UTF-8) con fallback su WM_NAME"""
+        prop = window.get_full_property(self._atom_name, self._atom_utf8)
+        if prop and prop.value:
+            value = prop.value
+            return (
+                value.decode("utf-8", "replace") if isinstance(value, bytes) else value
+            )
+        name = window.get_wm_name()
+        if isinstance(name, bytes):
+            return name.decode("latin-1")
+        return name
@@ -1,26 +1,38 @@
 """Interfaccia grafica Tkinter"""
 
-import threading
 import tkinter as tk
 from tkinter import ttk
-from typing import Dict
-from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
-from core.mongo_sync import MongoSyncManager
-from core.window_detector import WindowDetector
 from config.settings import Config
 
+if TYPE_CHECKING:
+    from core.collector import Collector
+    from core.ipc import CollectorClient
+
 
 class GUIManager:
-    """Gestisce l'interfaccia grafica Tkinter"""
+    """Gestisce l'interfaccia grafica Tkinter
+
+    Client del collector: in-process (Collector) o del daemon via socket
+    (CollectorClient), con la stessa interfaccia.
+    """
 
-    def __init__(self, config: Config, mongo_manager: MongoSyncManager):
+    def __init__(
+        self, config: Config, collector: Union["Collector", "CollectorClient"]
+    ):
         self.config = config
-        self.mongo_manager = mongo_manager
-        self.indicators = {}
-        self.executor = ThreadPoolExecutor(max_workers=2)
-        self._last_timer = {}
+        self.collector = collector
         self.root = None
+        self.tree: Optional[ttk.Treeview] = None
+        self.scale: Optional[ttk.Scale] = None
+
+        # (process, window_title) → iid della riga, e iid → dati riga
+        self._row_index: Dict[Tuple[str, str], str] = {}
+        self._rows: Dict[str, Dict] = {}
+        self._active_iid: Optional[str] = None
+        self._active_window: Tuple[str, str] = ("unknown", "Unknown")
+        self._selected_iid: Optional[str] = None
 
     def create_window(self):
         """Crea la finestra principale"""
@@ -28,104 +40,140 @@ class GUIManager:
         self.root.title("Livelli di attenzione")
         self.root.geometry("640x480")
         self.root.configure(bg="white")
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
 
-        # Intestazioni
-        tk.Label(
+        # Treeview: Tk disegna solo le righe visibili
+        self.tree = ttk.Treeview(
             self.root,
-            text="Finestra",
-            bg="white",
-            fg="black",
-            font=("Arial", 10, "bold"),
-        ).grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+            columns=("status", "window", "level"),
+            show="headings",
+            selectmode="browse",
+        )
+        self.tree.heading("status", text="")
+        self.tree.heading("window", text="Finestra", anchor="w")
+        self.tree.heading("level", text="Livello")
+        self.tree.column("status", width=30, stretch=False, anchor="center")
+        self.tree.column("window", width=480, anchor="w")
+        self.tree.column("level", width=70, stretch=False, anchor="center")
+        self.tree.tag_configure(
+            "active", foreground="green", font=("Arial", 10, "bold")
+        )
+        self.tree.tag_configure("inactive", foreground="black", font=("Arial", 10))
+        self.tree.grid(row=0, column=0, sticky="nsew", padx=(10, 0), pady=5)
 
+        scrollbar = ttk.Scrollbar(self.root, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.grid(row=0, column=1, sticky="ns", pady=5)
+
+        # Un solo slider per la riga selezionata
+        controls = tk.Frame(self.root, bg="white")
+        controls.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10, pady=5)
         tk.Label(
-            self.root,
-            text="Livello",
-            bg="white",
-            fg="black",
-            font=("Arial", 10, "bold"),
-        ).grid(row=0, column=2, padx=10, pady=5, sticky="e")
-
-        # Carica applicazioni
-        apps = self.mongo_manager.get_process_windows()
-        for i, app in enumerate(apps, start=1):
-            if app["process"] not in self.config.PROCESS_BLACKLIST:
-                self._add_process_row(i, app)
-
-        # Avvia aggiornamento indicatori
+            controls, text="Livello", bg="white", fg="black", font=("Arial", 10, "bold")
+        ).pack(side="left")
+        self.scale = ttk.Scale(
+            controls, from_=1, to=10, orient="horizontal", length=250
+        )
+        self.scale.pack(side="left", padx=10)
+        self.scale.state(["disabled"])
+        self.scale.bind("<ButtonRelease-1>", self._on_scale_release)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+
+        # Iscrizione prima della lettura della cache: un refresh che cade in
+        # mezzo arriva comunque come notifica (_merge_rows è idempotente)
+        self.collector.subscribe(self._on_active_window, self._on_levels)
+        self._merge_rows(self.collector.rows())
+        self._active_window = self.collector.active_window()
         self._update_active_indicator()
 
         return self.root
 
-    def _add_process_row(self, row: int, app: Dict):
+    def _on_levels(self, apps: List[Dict]):
+        """Livelli cambiati (thread del collector): unisce nel thread della GUI"""
+        if self.root:
+            self.root.after(0, self._merge_rows, apps)
+
+    def _on_active_window(self, process_name: str, window_title: str):
+        """Cambio di finestra attiva: ridisegna nel thread della GUI"""
+        self._active_window = (process_name, window_title)
+        if self.root:
+            self.root.after(0, self._update_active_indicator)
+
+    def _merge_rows(self, apps: List[Dict]):
+        """Aggiunge le righe nuove e aggiorna il livello di quelle esistenti"""
+        for app in apps:
+            iid = str(app["_id"])
+            row = self._rows.get(iid)
+            if row is None:
+                self._add_process_row(app)
+                continue
+
+            level = app.get("level", 5)
+            if level != row["level"]:
+                row["level"] = level
+                self.tree.set(iid, "level", level)
+                if iid == self._selected_iid:
+                    self.scale.set(level)
+
+    def _add_process_row(self, app: Dict):
         """Aggiunge una riga per un processo"""
+        iid = str(app["_id"])
         level = app.get("level", 5)
-
-        # Indicatore stato
-        indicator = tk.Label(
-            self.root, text="●", fg="gray", bg="white", font=("Arial", 12)
-        )
-        indicator.grid(row=row, column=0, padx=5, pady=3, sticky="w")
-
-        # Nome applicazione
-        label = tk.Label(
-            self.root,
-            text=f"{app['process']} ({app['window_title']})",
-            bg="white",
-            fg="black",
-            font=("Arial", 10),
-        )
-        label.grid(row=row, column=1, sticky="w", padx=5, pady=3)
-
-        # Slider livello
-        scale = ttk.Scale(self.root, from_=1, to=10, orient="horizontal", length=150)
-        scale.set(level)
-        scale.grid(row=row, column=2, padx=10, pady=3)
-        scale.bind(
-            "<ButtonRelease-1>", lambda e, aid=app["_id"]: self._on_level_change(e, aid)
-        )
-
-        self.indicators[app["_id"]] = {
-            "indicator": indicator,
-            "label": label,
-            "process": app["process"],
-            "window_title": app["window_title"],
-        }
-
-    def _on_level_change(self, event, app_id):
-        """Callback per cambio livello"""
-        level = int(float(event.widget.get()))
-
-        if app_id in self._last_timer:
-            self._last_timer[app_id].cancel()
-
-        self._last_timer[app_id] = threading.Timer(
-            0.3, lambda: self.mongo_manager.update_level(app_id, level)
+        key = (app["process"], app["window_title"])
+
+        self.tree.insert(
+            "",
+            "end",
+            iid=iid,
+            values=("●", f"{app['process']} ({app['window_title']})", level),
+            tags=("inactive",),
         )
-        self._last_timer[app_id].start()
+        self._rows[iid] = {"_id": app["_id"], "level": level, "key": key}
+        self._row_index[key] = iid
+
+    def _on_select(self, event=None):
+        """Mostra sullo slider il livello della riga selezionata"""
+        selection = self.tree.selection()
+        self._selected_iid = selection[0] if selection else None
+        if self._selected_iid is None:
+            self.scale.state(["disabled"])
+            return
+        self.scale.state(["!disabled"])
+        self.scale.set(self._rows[self._selected_iid]["level"])
+
+    def _on_scale_release(self, event=None):
+        """Applica il livello dello slider alla riga selezionata"""
+        iid = self._selected_iid
+        if iid is None:
+            return
+        level = int(float(self.scale.get()))
+        row = self._rows[iid]
+        if level == row["level"]:
+            return
+        row["level"] = level
+        self.tree.set(iid, "level", level)
+        self._on_level_change(row["_id"], level)
+
+    def _on_level_change(self, app_id, level: int):
+        """Salva il livello: il collector lo invia in blocco a MongoDB"""
+        try:
+            self.collector.set_level(app_id, level)
+        except Exception as e:
+            print(f"[LEVEL UPDATE ERROR] {e}")
 
     def _update_active_indicator(self):
-        """Aggiorna gli indicatori per l'app attiva"""
+        """Aggiorna gli indicatori: ridisegna solo le righe cambiate"""
         try:
-            active_process, active_title = WindowDetector.get_active_window()
-
-            for data in self.indicators.values():
-                is_active = (
-                    data["process"] == active_process
-                    and data["window_title"] == active_title
-                )
-
-                if is_active:
-                    data["indicator"].config(fg="green")
-                    data["label"].config(fg="green", font=("Arial", 10, "bold"))
-                else:
-                    data["indicator"].config(fg="gray")
-                    data["label"].config(fg="black", font=("Arial", 10))
+            active_iid = self._row_index.get(tuple(self._active_window))
+            if active_iid != self._active_iid:
+                if self._active_iid is not None and self.tree.exists(self._active_iid):
+                    self.tree.item(self._active_iid, tags=("inactive",))
+                if active_iid is not None:
+                    self.tree.item(active_iid, tags=("active",))
+                self._active_iid = active_iid
         except Exception as e:
             print(f"[UI UPDATE ERROR] {e}")
-        finally:
-            if self.root:
-                self.root.after(1000, self._update_active_indicator)
 
     def run(self):
         """Avvia la GUI"""
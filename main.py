@@ -1,40 +1,93 @@
 #!/usr/bin/env python3
 """
 Activity Tracker - Entry point principale
+
+    python main.py              # GUI; collector in-process se il daemon non è attivo
+    python main.py --daemon     # collector senza GUI, client su socket Unix
+    python main.py --gui        # solo GUI, collegata al daemon
 """
+import argparse
+import signal
 import threading
+import time
+
+STARTED_AT = time.perf_counter()
+
 from config.settings import config
-from core.database import DatabaseManager
-from core.mongo_sync import MongoSyncManager
-from core.tracker import ActivityTracker
-from gui.manager import GUIManager
+from core import ipc
+
+
+def run_daemon():
+    """Collector headless: termina con SIGTERM o Ctrl+C"""
+    from core.collector import Collector
+
+    if not ipc.available():
+        raise SystemExit("❌ Modalità daemon non supportata: socket Unix assenti")
+    # Prima di creare il collector: un secondo tracking sullo stesso
+    # database duplicherebbe gli eventi e all'arresto scriverebbe [PAUSE]
+    if ipc.ping(config.IPC_SOCKET):
+        raise SystemExit(f"❌ Collector già attivo su {config.IPC_SOCKET}")
+
+    collector = Collector(config, started_at=STARTED_AT)
+    collector.start()
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    try:
+        collector.serve(config.IPC_SOCKET)
+        print(f"[INFO] Collector in ascolto su {config.IPC_SOCKET}")
+        print("=" * 60)
+        while not stop.wait(1.0):
+            pass
+    finally:
+        collector.stop()
+
+
+def run_gui(collector):
+    """Avvia la GUI (blocking); tkinter viene importato solo ora"""
+    from gui.manager import GUIManager
+
+    gui_manager = GUIManager(config, collector)
+    gui_manager.create_window()
+    gui_manager.run()
 
 
 def main():
     """Entry point principale"""
+    parser = argparse.ArgumentParser(description="Activity Tracker")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--daemon", action="store_true", help="collector senza GUI")
+    mode.add_argument("--gui", action="store_true", help="solo GUI (daemon attivo)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🔍 ACTIVITY TRACKER")
     print("=" * 60)
 
-    # Inizializza componenti
-    db_manager = DatabaseManager(config.DB_PATH)
-    mongo_manager = MongoSyncManager(config)
-    tracker = ActivityTracker(config, db_manager, mongo_manager)
-    gui_manager = GUIManager(config, mongo_manager)
+    if args.daemon:
+        run_daemon()
+        return
 
-    # Sincronizza device
-    mongo_manager.sync_device()
+    # Con un daemon attivo la GUI è solo un client: niente rilevamento,
+    # database o sync duplicati in questo processo
+    if args.gui or ipc.ping(config.IPC_SOCKET):
+        client = ipc.CollectorClient(config.IPC_SOCKET)
+        print(f"[INFO] GUI collegata al collector su {config.IPC_SOCKET}")
+        try:
+            run_gui(client)
+        finally:
+            client.close()
+        return
 
-    # Avvia thread background
-    threading.Thread(target=tracker.tracking_loop, daemon=True).start()
-    threading.Thread(target=tracker.sync_loop, daemon=True).start()
+    from core.collector import Collector
 
+    collector = Collector(config, started_at=STARTED_AT)
+    collector.start()
     print("[INFO] Tracking avviato. Premi Ctrl+C per fermare.")
     print("=" * 60)
-
-    # Avvia GUI (blocking)
-    gui_manager.create_window()
-    gui_manager.run()
+    try:
+        run_gui(collector)
+    finally:
+        collector.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Activity Tracker - Migrazioni lato MongoDB
+
+    python migrate.py activity-logs
+
+Converte i timestamp stringa di activity_logs in BSON date; con
+MONGO_TIMESERIES=1 ricrea activity_logs come collezione time-series
+copiando i documenti esistenti. Il database locale migra da solo
+all'avvio (PRAGMA user_version).
+"""
+import argparse
+
+from config.settings import config
+from core.mongo_sync import MongoSyncManager
+
+
+def main():
+    """Entry point CLI"""
+    parser = argparse.ArgumentParser(description="Migrazioni MongoDB")
+    parser.add_argument("migration", choices=["activity-logs"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    mongo_manager = MongoSyncManager(config)
+    if not mongo_manager.enabled:
+        parser.error("MONGO_URI non configurato")
+
+    moved = mongo_manager.migrate_activity_logs(args.batch_size)
+    print(f"[MIGRATE] {moved} documenti migrati in {config.ACTIVITY_LOGS_TABLE}")
+
+
+if __name__ == "__main__":
+    main()
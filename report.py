@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Activity Tracker - Report locali sul database delle attività
+
+    python report.py processes --from 2026-01-01 --to 2026-02-01
+    python report.py domains
+    python report.py levels --from 2026-10-01
+    python report.py categories --from 2026-10-01
+    python report.py events --from 2026-10-18
+"""
+import argparse
+import copy
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from config.settings import config
+from core import ipc
+from core.reporting import ReportEngine
+from core.rules import RuleEngine
+from core.window_cache import ProcessWindowCache
+
+
+def _parse_day(value: str) -> datetime:
+    """Data YYYY-MM-DD (o data e ora ISO) in ora locale"""
+    parsed = datetime.fromisoformat(value)
+    return (
+        parsed if "T" in value or " " in value else datetime.combine(parsed, time.min)
+    )
+
+
+def _format_duration(seconds: float) -> str:
+    """Durata come HH:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _load_levels(db_path: str) -> Dict[Tuple[str, str], int]:
+    """Livelli di attenzione per (processo, finestra), dalla cache locale o MongoDB"""
+    levels = ProcessWindowCache(db_path).levels(config.DEVICE_ID)
+    if levels:
+        return levels
+    try:
+        from core.mongo_sync import MongoSyncManager
+
+        # Cache locali del manager sul database di --db, non su DB_PATH
+        local_config = copy.copy(config)
+        local_config.DB_PATH = db_path
+        docs = MongoSyncManager(local_config).get_process_windows()
+    except Exception as e:
+        print(f"[WARN] Livelli non disponibili, uso il default: {e}", file=sys.stderr)
+        return {}
+    return {(d["process"], d["window_title"]): d.get("level", 5) for d in docs}
+
+
+def _local_report(
+    kind: str, db_path: str, start: datetime, end: datetime, process: Optional[str]
+) -> Iterable:
+    """Report letto direttamente dal database (collector non attivo)
+
+    Generatore: gli eventi vengono letti in streaming, la connessione si
+    chiude a fine iterazione.
+    """
+    engine = ReportEngine(db_path, config.ARCHIVE_DIR)
+    try:
+        if kind == "processes":
+            yield from engine.time_per_process(start, end, process)
+        elif kind == "domains":
+            yield from engine.time_per_domain(start, end)
+        elif kind == "levels":
+            yield from engine.time_per_level(start, end, _load_levels(db_path))
+        elif kind == "categories":
+            yield from engine.time_per_category(
+                start, end, RuleEngine.from_config(config)
+            )
+        else:
+            yield from engine.iter_events(start, end)
+    finally:
+        engine.close()
+
+
+def main():
+    """Entry point CLI"""
+    today = datetime.combine(date.today(), time.min)
+    parser = argparse.ArgumentParser(description="Report sulle attività tracciate")
+    parser.add_argument(
+        "report",
+        choices=["processes", "domains", "levels", "categories", "events"],
+    )
+    parser.add_argument(
+        "--from", dest="start", type=_parse_day, default=today, help="inizio (incluso)"
+    )
+    parser.add_argument(
+        "--to", dest="end", type=_parse_day, help="fine (esclusa), default: domani"
+    )
+    parser.add_argument("--process", help="filtra per processo")
+    parser.add_argument("--db", default=config.DB_PATH, help="percorso database")
+    args = parser.parse_args()
+    end = args.end or today + timedelta(days=1)
+
+    # Gli eventi si leggono sempre in streaming dal database (WAL: lettura
+    # concorrente al collector); gli aggregati dal collector se attivo
+    if (
+        args.report != "events"
+        and args.db == config.DB_PATH
+        and ipc.ping(config.IPC_SOCKET)
+    ):
+        # Collector attivo: il report usa la sua connessione e la sua cache
+        client = ipc.CollectorClient(config.IPC_SOCKET)
+        try:
+            rows = client.report(
+                args.report, args.start.isoformat(), end.isoformat(), args.process
+            )
+        finally:
+            client.close()
+    else:
+        rows = _local_report(args.report, args.db, args.start, end, args.process)
+
+    if args.report == "events":
+        for timestamp, process, window_title in rows:
+            when = datetime.fromtimestamp(timestamp / 1000).isoformat(
+                timespec="milliseconds"
+            )
+            print(f"{when}  {process}  {window_title}")
+        return
+    for key, seconds in rows:
+        print(f"{_format_duration(seconds)}  {key}")
+
+
+if __name__ == "__main__":
+    main()
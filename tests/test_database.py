@@ -0,0 +1,56 @@
+"""Test del database locale"""
+
+import sqlite3
+import threading
+
+from core.database import DatabaseManager
+from core.metrics import MetricsRegistry
+
+
+def _count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM activity").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_writer_keeps_batch_while_database_is_locked(tmp_path):
+    path = str(tmp_path / "activity.db")
+    db = DatabaseManager(path, flush_interval=0.05, metrics=MetricsRegistry())
+    db._conn.execute("PRAGMA busy_timeout=50")
+
+    # Un'altra connessione tiene il lock di scrittura
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    for i in range(5):
+        db.insert_activity("app", f"doc {i}", 1.0, "device", "utente")
+    threading.Event().wait(0.5)
+    other.rollback()
+    other.close()
+
+    db.flush(timeout=10)
+    assert _count(path) == 5
+    db.close()
+
+
+def test_close_writes_batch_left_by_failing_writer(tmp_path):
+    path = str(tmp_path / "activity.db")
+    db = DatabaseManager(path, flush_interval=0.05, metrics=MetricsRegistry())
+    db._conn.execute("PRAGMA busy_timeout=50")
+
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    for i in range(5):
+        db.insert_activity("app", f"doc {i}", 1.0, "device", "utente")
+    threading.Event().wait(0.3)
+    # La scrittura finale di close() attende il lock come di consueto
+    db._conn.execute("PRAGMA busy_timeout=5000")
+    closer = threading.Thread(target=db.close)
+    closer.start()
+    threading.Event().wait(0.2)
+    other.rollback()
+    other.close()
+    closer.join(10)
+
+    assert _count(path) == 5
@@ -0,0 +1,91 @@
+"""Test delle sorgenti di inattività"""
+
+import sys
+import time
+import types
+from unittest import mock
+
+import pytest
+
+from core.idle import IdleTimeSource, PynputIdleSource
+
+
+class _Listener:
+    """Listener pynput finto: registra le callback ricevute"""
+
+    created = []
+
+    def __init__(self, **callbacks):
+        self.callbacks = callbacks
+        self.stopped = False
+        _Listener.created.append(self)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def fake_pynput():
+    _Listener.created = []
+    module = types.SimpleNamespace(
+        mouse=types.SimpleNamespace(Listener=_Listener),
+        keyboard=types.SimpleNamespace(Listener=_Listener),
+    )
+    with mock.patch.dict(
+        sys.modules,
+        {
+            "pynput": module,
+            "pynput.mouse": module.mouse,
+            "pynput.keyboard": module.keyboard,
+        },
+    ):
+        yield
+
+
+def test_idle_source_is_abstract():
+    with pytest.raises(TypeError):
+        IdleTimeSource()
+
+
+def test_mouse_moves_are_dropped_within_the_throttle_window(fake_pynput):
+    source = PynputIdleSource(throttle=0.2)
+    source.start()
+    try:
+        mouse_listeners = [l for l in _Listener.created if "on_move" in l.callbacks]
+        assert len(mouse_listeners) == 1
+        on_move = mouse_listeners[0].callbacks["on_move"]
+
+        time.sleep(0.05)
+        on_move(1, 1)
+        assert source.idle_seconds() < 0.05
+
+        # Entro la finestra il movimento viene scartato
+        time.sleep(0.1)
+        on_move(2, 2)
+        assert source.idle_seconds() >= 0.1
+
+        # Dopo la finestra viene registrato, sempre con lo stesso listener
+        time.sleep(0.15)
+        on_move(3, 3)
+        assert source.idle_seconds() < 0.05
+        assert len(_Listener.created) == 2
+        assert not mouse_listeners[0].stopped
+    finally:
+        source.stop()
+    assert all(l.stopped for l in _Listener.created)
+
+
+def test_clicks_are_always_recorded(fake_pynput):
+    source = PynputIdleSource(throttle=10)
+    source.start()
+    try:
+        mouse = next(l for l in _Listener.created if "on_move" in l.callbacks)
+        mouse.callbacks["on_move"](1, 1)
+        time.sleep(0.05)
+        mouse.callbacks["on_click"](1, 1, None, True)
+        assert source.idle_seconds() < 0.05
+    finally:
+        source.stop()
@@ -0,0 +1,54 @@
+"""Test dell'IPC tra collector e client"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from core import ipc
+
+pytestmark = pytest.mark.skipif(not ipc.available(), reason="socket Unix assenti")
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = ipc.IPCServer(str(tmp_path / "collector.sock"), {"ping": lambda: "pong"})
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_calls_and_events(server):
+    client = ipc.IPCClient(server.socket_path)
+    try:
+        assert client.call("ping") == "pong"
+        received = threading.Event()
+        client.subscribe("active_window", lambda data: received.set())
+        server.publish("active_window", ["editor", "note.txt"])
+        assert received.wait(5)
+    finally:
+        client.close()
+
+
+def test_subscriber_that_never_reads_does_not_block_publish(server):
+    # Client che si iscrive e poi non legge più il socket
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(server.socket_path)
+    stalled.sendall(b'{"id": 1, "method": "subscribe", "params": {"topics": ["t"]}}\n')
+    deadline = time.monotonic() + 5
+    while not server._subscribers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server._subscribers
+
+    done = threading.Event()
+
+    def publish_many():
+        for i in range(ipc.OUTBOX_SIZE * 5):
+            server.publish("t", ["processo", "titolo " * 50 + str(i)])
+        done.set()
+
+    threading.Thread(target=publish_many, daemon=True).start()
+    assert done.wait(10), "publish bloccata da un client che non legge"
+    assert not server._subscribers
+    stalled.close()
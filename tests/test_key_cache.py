@@ -0,0 +1,38 @@
+"""Test della cache delle chiavi process_windows"""
+
+from unittest import mock
+
+from core.key_cache import KnownKeysCache
+
+A = ("dev", "code", "main.py")
+B = ("dev", "firefox", "Docs")
+
+
+def test_hits_refresh_last_seen_across_restarts(tmp_path):
+    path = str(tmp_path / "activity.db")
+    cache = KnownKeysCache(path, max_size=2)
+    with mock.patch("time.time", return_value=100.0):
+        cache.add_many([A])
+    with mock.patch("time.time", return_value=200.0):
+        cache.add_many([B])
+    assert A in cache
+    with mock.patch("time.time", return_value=300.0):
+        cache.save_hits()
+
+    # Al riavvio con meno posto resta la chiave usata più di recente
+    cache = KnownKeysCache(path, max_size=1)
+    assert A in cache
+    assert B not in cache
+
+
+def test_evicted_hits_are_not_saved(tmp_path):
+    path = str(tmp_path / "activity.db")
+    cache = KnownKeysCache(path, max_size=1)
+    cache.add_many([A])
+    assert A in cache
+    cache.add_many([B])
+    cache.save_hits()
+
+    cache = KnownKeysCache(path, max_size=2)
+    assert len(cache) == 1
+    assert B in cache
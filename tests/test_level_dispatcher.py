@@ -0,0 +1,102 @@
+"""Test dell'invio coalescente dei livelli"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from core.level_dispatcher import LevelUpdateDispatcher
+
+
+class _Mongo:
+    """MongoSyncManager finto: registra i bulk_write dei livelli"""
+
+    def __init__(self):
+        self.enabled = True
+        self.calls = []
+        self.fail = False
+        self.sent = threading.Event()
+        self.on_update = None
+
+    def update_levels(self, batch):
+        self.calls.append(dict(batch))
+        if self.on_update is not None:
+            self.on_update()
+        if self.fail:
+            raise ConnectionError("MongoDB non raggiungibile")
+        self.sent.set()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "activity.db")
+
+
+def _queued(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT id, level FROM pending_levels"))
+    finally:
+        conn.close()
+
+
+def test_changes_within_the_debounce_are_sent_in_one_batch(db_path):
+    mongo = _Mongo()
+    dispatcher = LevelUpdateDispatcher(mongo, db_path, debounce=0.2)
+    dispatcher.start()
+    try:
+        for i in range(5):
+            dispatcher.submit(f"id{i}", i + 1)
+        assert mongo.sent.wait(5)
+    finally:
+        dispatcher.stop()
+
+    assert mongo.calls == [{f"id{i}": i + 1 for i in range(5)}]
+    assert _queued(db_path) == {}
+
+
+def test_repeated_ids_keep_only_the_last_level(db_path):
+    mongo = _Mongo()
+    dispatcher = LevelUpdateDispatcher(mongo, db_path)
+    for level in (3, 7, 9):
+        dispatcher.submit("a", level)
+    dispatcher.submit("b", 2)
+    assert _queued(db_path) == {"a": 9, "b": 2}
+
+    assert dispatcher.flush() == 2
+    assert mongo.calls == [{"a": 9, "b": 2}]
+    assert not dispatcher.is_pending("a")
+
+
+def test_failed_batch_stays_queued_across_restarts(db_path):
+    mongo = _Mongo()
+    mongo.fail = True
+    dispatcher = LevelUpdateDispatcher(mongo, db_path)
+    dispatcher.submit("a", 4)
+    with pytest.raises(ConnectionError):
+        dispatcher.flush()
+    assert dispatcher.is_pending("a")
+    assert _queued(db_path) == {"a": 4}
+
+    # Riavvio: la coda viene riletta da SQLite e inviata
+    mongo = _Mongo()
+    dispatcher = LevelUpdateDispatcher(mongo, db_path)
+    assert dispatcher.flush() == 1
+    assert mongo.calls == [{"a": 4}]
+    assert _queued(db_path) == {}
+
+
+def test_change_during_send_is_not_dropped(db_path):
+    mongo = _Mongo()
+    dispatcher = LevelUpdateDispatcher(mongo, db_path)
+    dispatcher.submit("a", 4)
+    # Nuovo livello mentre il bulk_write precedente è in volo
+    mongo.on_update = lambda: dispatcher.submit("a", 6)
+    dispatcher.flush()
+    mongo.on_update = None
+
+    assert dispatcher.is_pending("a")
+    assert _queued(db_path) == {"a": 6}
+    dispatcher.flush()
+    assert mongo.calls == [{"a": 4}, {"a": 6}]
+    assert _queued(db_path) == {}
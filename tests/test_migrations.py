@@ -0,0 +1,236 @@
+"""Test delle migrazioni: database locale (schema v0/v1) e activity_logs"""
+
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from config.settings import Config
+from core.database import SCHEMA_VERSION, DatabaseManager
+from core.metrics import MetricsRegistry
+from core.mongo_sync import MongoSyncManager
+from core.timestamps import to_datetime
+
+# (timestamp ISO come lo scriveva lo schema originale, processo, titolo, synced)
+BASELINE_ROWS = [
+    ("2024-03-01T09:59:58.250400+00:00", "code", "main.py", 1),
+    ("2024-03-01T10:00:00.000000+00:00", "firefox", "Docs", 1),
+    ("2024-03-01T10:00:05.999900+00:00", "code", "main.py", 0),
+    ("2024-03-01T10:00:07.500000+00:00", "firefox", "Mail", 0),
+]
+
+
+def _ms(iso: str) -> int:
+    return round(datetime.fromisoformat(iso).timestamp() * 1000)
+
+
+def _open(path: str) -> DatabaseManager:
+    return DatabaseManager(path, write_behind=False, metrics=MetricsRegistry())
+
+
+def _snapshot(path: str):
+    """Contenuto delle tabelle migrate, per confrontare due aperture"""
+    conn = sqlite3.connect(path)
+    try:
+        return (
+            conn.execute("SELECT * FROM activity ORDER BY id").fetchall(),
+            conn.execute("SELECT * FROM sessions ORDER BY id").fetchall(),
+            conn.execute("SELECT * FROM processes ORDER BY id").fetchall(),
+        )
+    finally:
+        conn.close()
+
+
+def test_baseline_schema_is_migrated_once(tmp_path):
+    path = str(tmp_path / "activity.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            process TEXT,
+            window_title TEXT,
+            cpu_percent REAL,
+            synced INTEGER DEFAULT 0,
+            device_id TEXT,
+            username TEXT
+        )
+    """
+    )
+    conn.executemany(
+        """
+        INSERT INTO activity (timestamp, process, window_title, cpu_percent,
+                              synced, device_id, username)
+        VALUES (?, ?, ?, 1.5, ?, 'dev', 'utente')
+    """,
+        BASELINE_ROWS,
+    )
+    conn.commit()
+    conn.close()
+
+    _open(path).close()
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        rows = conn.execute(
+            """
+            SELECT id, timestamp, typeof(timestamp), process, window_title,
+                   synced, device_id, username
+            FROM activity_expanded ORDER BY id
+        """
+        ).fetchall()
+        assert rows == [
+            (i, _ms(ts), "integer", process, title, synced, "dev", "utente")
+            for i, (ts, process, title, synced) in enumerate(BASELINE_ROWS, 1)
+        ]
+        # Stringhe nelle tabelle di lookup, una volta sola
+        assert conn.execute("SELECT COUNT(*) FROM processes").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM window_titles").fetchone()[0] == 3
+        # Sessioni ricostruite dallo storico migrato
+        sessions = conn.execute(
+            "SELECT process, end_event_id FROM sessions_expanded ORDER BY id"
+        ).fetchall()
+        assert sessions == [("code", 2), ("firefox", 3), ("code", 4)]
+    finally:
+        conn.close()
+
+    before = _snapshot(path)
+    _open(path).close()
+    assert _snapshot(path) == before
+
+
+def test_iso_timestamps_of_schema_v1_are_converted(tmp_path):
+    path = str(tmp_path / "activity.db")
+    db = _open(path)
+    for _, process, title, _ in BASELINE_ROWS:
+        db.insert_activity(process, title, 1.5, "dev", "utente")
+    db.mark_as_synced(1, 2)
+    db.close()
+    expected = (
+        sqlite3.connect(path)
+        .execute("SELECT id, timestamp, synced FROM activity ORDER BY id")
+        .fetchall()
+    )
+
+    # Schema v1: tabelle di lookup ma timestamp come stringhe ISO
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        UPDATE activity
+        SET timestamp = strftime('%Y-%m-%dT%H:%M:%f', timestamp / 1000.0,
+                                 'unixepoch') || '+00:00'
+    """
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    _open(path).close()
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert (
+            conn.execute(
+                "SELECT id, timestamp, synced FROM activity ORDER BY id"
+            ).fetchall()
+            == expected
+        )
+        assert conn.execute("SELECT COUNT(*) FROM activity_expanded").fetchone()[
+            0
+        ] == len(BASELINE_ROWS)
+    finally:
+        conn.close()
+
+    before = _snapshot(path)
+    _open(path).close()
+    assert _snapshot(path) == before
+
+
+@pytest.fixture
+def mongo(tmp_path, monkeypatch):
+    """MongoSyncManager su mongomock, che non ha list_collections né time-series"""
+    mongomock = pytest.importorskip("mongomock")
+    config = Config()
+    config.DB_PATH = str(tmp_path / "activity.db")
+    config.SYNC_FORMAT = "documents"
+    config.RULES = []
+    manager = MongoSyncManager(
+        config, client=mongomock.MongoClient(), metrics=MetricsRegistry()
+    )
+    db = manager.db
+    kinds = {}
+
+    def collection_type(name):
+        if name not in db.list_collection_names():
+            return None
+        return kinds.get(name, "collection")
+
+    def create_collection(name, timeseries=None, **kwargs):
+        kinds[name] = "timeseries" if timeseries else "collection"
+        return db[name]
+
+    monkeypatch.setattr(manager, "_collection_type", collection_type)
+    monkeypatch.setattr(db, "create_collection", create_collection)
+    return manager, kinds
+
+
+def _legacy_docs():
+    """activity_logs dello schema originale: _id misti, timestamp ISO o date"""
+    docs = []
+    for i, (ts, process, title, _) in enumerate(BASELINE_ROWS):
+        docs.append(
+            {
+                "_id": ObjectId() if i % 2 else f"dev:{i + 1}",
+                "timestamp": ts if i < 3 else datetime.fromisoformat(ts),
+                "process": process,
+                "window_title": title,
+                "device_id": "dev",
+            }
+        )
+    return docs
+
+
+def _timestamps(collection):
+    """Timestamp letti (date BSON: UTC senza fuso, al millisecondo)"""
+    return sorted(
+        doc["timestamp"].replace(tzinfo=timezone.utc) for doc in collection.find()
+    )
+
+
+def test_activity_logs_are_copied_into_a_timeseries(mongo):
+    manager, kinds = mongo
+    manager.config.MONGO_TIMESERIES = True
+    name = manager.config.ACTIVITY_LOGS_TABLE
+    manager.db[name].insert_many(_legacy_docs())
+
+    assert manager.migrate_activity_logs(batch_size=3) == len(BASELINE_ROWS)
+
+    assert kinds[name] == "timeseries"
+    assert f"{name}_legacy" not in manager.db.list_collection_names()
+    assert _timestamps(manager.db[name]) == [
+        to_datetime(_ms(ts)) for ts, _, _, _ in BASELINE_ROWS
+    ]
+
+    assert manager.migrate_activity_logs(batch_size=3) == 0
+    assert manager.db[name].count_documents({}) == len(BASELINE_ROWS)
+
+
+def test_activity_logs_string_timestamps_are_converted_in_place(mongo):
+    manager, kinds = mongo
+    name = manager.config.ACTIVITY_LOGS_TABLE
+    manager.db[name].insert_many(_legacy_docs())
+
+    assert manager.migrate_activity_logs(batch_size=2) == 3
+
+    assert name not in kinds
+    assert manager.db[name].count_documents({"timestamp": {"$type": "string"}}) == 0
+    assert _timestamps(manager.db[name]) == [
+        to_datetime(_ms(ts)) for ts, _, _, _ in BASELINE_ROWS
+    ]
+
+    assert manager.migrate_activity_logs(batch_size=2) == 0
+    assert manager.db[name].count_documents({}) == len(BASELINE_ROWS)
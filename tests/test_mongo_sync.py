@@ -0,0 +1,106 @@
+"""Test della sincronizzazione su MongoDB (benchmarks/fake_mongo)"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+fake_mongo = pytest.importorskip("fake_mongo")
+
+from config.settings import Config  # noqa: E402
+from core.database import DatabaseManager  # noqa: E402
+from core.metrics import MetricsRegistry  # noqa: E402
+from core.mongo_sync import MongoSyncManager  # noqa: E402
+from core.sinks import MongoSink  # noqa: E402
+
+
+@pytest.fixture
+def setup(tmp_path):
+    config = Config()
+    config.DB_PATH = str(tmp_path / "activity.db")
+    config.SYNC_FORMAT = "documents"
+    config.RULES = []
+    client = fake_mongo.FakeMongoClient()
+    mongo = MongoSyncManager(config, client=client, metrics=MetricsRegistry())
+    mongo._init_indexes()
+    return config, client, mongo
+
+
+def _sync_events(config, mongo, count, replay=1):
+    """Registra count eventi in un database locale e li sincronizza"""
+    db = DatabaseManager(config.DB_PATH, write_behind=False, metrics=MetricsRegistry())
+    try:
+        for i in range(count):
+            db.insert_activity("app", f"doc {i}", 1.0, config.DEVICE_ID, "utente")
+        sink = MongoSink(mongo, db.instance_id)
+        for _ in range(replay):
+            for chunk in db.iter_unsynced_chunks(100):
+                sink.write(chunk, db.get_closed_sessions(chunk[0][0], chunk[-1][0]))
+    finally:
+        db.close()
+
+
+def _summary_seconds(config, client):
+    summaries = client[config.MONGO_DB][config.DAILY_SUMMARIES_TABLE]
+    return sum(doc["seconds"] for doc in summaries.docs.values())
+
+
+def test_local_database_reset_keeps_syncing(setup):
+    config, client, mongo = setup
+    _sync_events(config, mongo, 5)
+    # Database nuovo (reinstallazione): gli id locali ripartono da 1
+    config.DB_PATH = config.DB_PATH.replace("activity.db", "reinstalled.db")
+    _sync_events(config, mongo, 5)
+
+    logs = client[config.MONGO_DB][config.ACTIVITY_LOGS_TABLE]
+    assert len(logs.docs) == 10
+
+
+def test_daily_summaries_ignore_replays_but_not_new_databases(setup):
+    config, client, mongo = setup
+    _sync_events(config, mongo, 5, replay=2)
+    first = _summary_seconds(config, client)
+    assert first > 0
+
+    config.DB_PATH = config.DB_PATH.replace("activity.db", "reinstalled.db")
+    _sync_events(config, mongo, 5)
+    assert _summary_seconds(config, client) > first
+
+
+def test_daily_summaries_partial_write_then_bigger_chunk(setup, monkeypatch):
+    from pymongo.errors import AutoReconnect
+
+    config, client, mongo = setup
+    config.SYNC_MAX_RETRIES = 1
+    summaries = client[config.MONGO_DB][config.DAILY_SUMMARIES_TABLE]
+    db = DatabaseManager(config.DB_PATH, write_behind=False, metrics=MetricsRegistry())
+    try:
+        for i in range(20):
+            db.insert_activity(f"app{i % 3}", f"doc {i}", 1.0, config.DEVICE_ID, "u")
+        rows = next(db.iter_unsynced_chunks(100))
+        sessions = db.get_closed_sessions(rows[0][0], rows[-1][0])
+        expected = sum(end - start for start, end, _, _ in sessions)
+        sink = MongoSink(mongo, db.instance_id)
+
+        # Primo invio: solo il primo documento viene scritto
+        bulk_write = summaries.bulk_write
+
+        def partial(ops, ordered=True):
+            bulk_write(list(ops)[:1], ordered)
+            raise AutoReconnect("connessione persa")
+
+        monkeypatch.setattr(summaries, "bulk_write", partial)
+        with pytest.raises(AutoReconnect):
+            sink.write(rows[:10], db.get_closed_sessions(rows[0][0], rows[9][0]))
+        monkeypatch.setattr(summaries, "bulk_write", bulk_write)
+
+        # Il blocco successivo riparte dallo stesso id ed è più grande
+        sink.write(rows, sessions)
+        sink.write(rows, sessions)
+    finally:
+        db.close()
+
+    assert len(summaries.docs) == 3
+    assert _summary_seconds(config, client) == pytest.approx(expected)
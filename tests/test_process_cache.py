@@ -0,0 +1,26 @@
+"""Test della cache dei nomi di processo"""
+
+import os
+from unittest import mock
+
+import psutil
+
+from core.process_cache import ProcessNameCache
+
+
+def test_repeated_lookups_reuse_the_cached_handle():
+    cache = ProcessNameCache()
+    expected = psutil.Process(os.getpid()).name()
+    with mock.patch("psutil.Process", wraps=psutil.Process) as process:
+        names = {cache.name(os.getpid()) for _ in range(100)}
+    assert names == {expected}
+    assert process.call_count == 1
+
+
+def test_stale_handle_is_revalidated():
+    cache = ProcessNameCache(validate_interval=0.0)
+    pid = os.getpid()
+    cache.name(pid)
+    with mock.patch.object(psutil.Process, "is_running", return_value=False):
+        with mock.patch.object(psutil.Process, "name", return_value="nuovo"):
+            assert cache.name(pid) == "nuovo"
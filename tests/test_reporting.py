@@ -0,0 +1,95 @@
+"""Test dei report locali"""
+
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+
+import pytest
+
+from core.database import DatabaseManager
+from core.metrics import MetricsRegistry
+from core.reporting import ReportEngine
+from core.retention import RetentionManager
+
+HOUR = 3600.0
+
+# Giorno di riferimento: abbastanza vecchio da poter essere archiviato
+DAY = date.today() - timedelta(days=30)
+
+
+def _at(days: int, hour: float) -> datetime:
+    """Ora locale relativa a DAY"""
+    return datetime.combine(DAY + timedelta(days=days), time.min) + timedelta(
+        hours=hour
+    )
+
+
+def _fill(path: str, events):
+    """Scrive gli eventi (datetime, processo, titolo) con l'orario dato"""
+    db = DatabaseManager(path, write_behind=False, metrics=MetricsRegistry())
+    try:
+        for when, process, title in events:
+            with mock.patch("time.time", return_value=when.timestamp()):
+                db.insert_activity(process, title, 1.0, "dev", "u")
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def report(tmp_path):
+    path = str(tmp_path / "activity.db")
+    # Sessioni: code 22:00 (-1) → 10:00, firefox 10:00 → 02:00 (+2),
+    # code 02:00 → 03:00 (+2)
+    _fill(
+        path,
+        [
+            (_at(-1, 22), "code", "main.py"),
+            (_at(0, 10), "firefox", "example.com - Docs"),
+            (_at(2, 2), "code", "main.py"),
+            (_at(2, 3), "shell", "bash"),
+        ],
+    )
+    engine = ReportEngine(path)
+    yield engine
+    engine.close()
+
+
+def test_partial_days_at_both_edges(report):
+    # Bordi parziali dalle sessioni, giorni 0 e +1 dai rollup
+    totals = dict(report.time_per_process(_at(-1, 23), _at(2, 2.5)))
+    assert totals == pytest.approx({"code": 11.5 * HOUR, "firefox": 40 * HOUR})
+
+
+def test_range_inside_one_day(report):
+    totals = dict(report.time_per_process(_at(0, 9), _at(0, 11)))
+    assert totals == pytest.approx({"code": HOUR, "firefox": HOUR})
+
+
+def test_whole_days_only(report):
+    totals = dict(report.time_per_process(_at(0, 0), _at(1, 0), process="firefox"))
+    assert totals == pytest.approx({"firefox": 14 * HOUR})
+
+
+def test_iter_events_merges_archive_rows(tmp_path):
+    path = str(tmp_path / "activity.db")
+    events = [(_at(0, hour), f"app{hour % 3}", f"doc {hour}") for hour in range(8)]
+    _fill(path, events)
+
+    # Solo i record sincronizzati vengono archiviati: archivio e database
+    # restano intercalati nel tempo
+    db = DatabaseManager(path, write_behind=False, metrics=MetricsRegistry())
+    with db._lock:
+        db._conn.execute("UPDATE activity SET synced = 1 WHERE id % 2 = 1")
+        db._conn.commit()
+    db.close()
+    archive = str(tmp_path / "archive")
+    assert RetentionManager(path, archive, 7).run_once() == 4
+
+    engine = ReportEngine(path, archive)
+    try:
+        found = list(engine.iter_events(_at(0, 1), _at(0, 7)))
+    finally:
+        engine.close()
+    assert found == [
+        (round(when.timestamp() * 1000), process, title)
+        for when, process, title in events[1:7]
+    ]
@@ -0,0 +1,68 @@
+"""Test dell'archiviazione dei record scaduti"""
+
+import os
+import sqlite3
+import time
+from unittest import mock
+
+from core.database import DatabaseManager
+from core.metrics import MetricsRegistry
+from core.retention import RetentionManager
+
+
+def test_archiving_shrinks_the_database(tmp_path):
+    path = str(tmp_path / "activity.db")
+    db = DatabaseManager(path, write_behind=False, metrics=MetricsRegistry())
+    old = time.time() - 30 * 86400
+    for i in range(5000):
+        with mock.patch("time.time", return_value=old + i):
+            db.insert_activity("app", f"documento {i} " + "x" * 80, 1.0, "dev", "u")
+    db.mark_as_synced(1, 5000)
+    db.close()
+
+    def pages():
+        conn = sqlite3.connect(path)
+        try:
+            return [
+                conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_count", "freelist_count")
+            ]
+        finally:
+            conn.close()
+
+    before, _ = pages()
+    retention = RetentionManager(
+        path, str(tmp_path / "archive"), 7, vacuum_pages=100000
+    )
+    assert retention.run_once() == 5000
+    after, freelist = pages()
+    assert freelist == 0
+    assert after < before
+
+
+def test_new_database_does_not_touch_previous_archive(tmp_path):
+    path = str(tmp_path / "activity.db")
+    archive = str(tmp_path / "archive")
+    old = time.time() - 30 * 86400
+
+    def fill(count, start):
+        db = DatabaseManager(path, write_behind=False, metrics=MetricsRegistry())
+        for i in range(count):
+            with mock.patch("time.time", return_value=start + i):
+                db.insert_activity("app", f"doc {i}", 1.0, "dev", "u")
+        db.mark_as_synced(1, count)
+        db.close()
+
+    fill(10, old)
+    assert RetentionManager(path, archive, 7).run_once() == 10
+
+    # Database nuovo: stessi id, eventi recenti che non vanno archiviati
+    os.remove(path)
+    fill(10, time.time() - 3600)
+    retention = RetentionManager(path, archive, 7)
+    assert retention.run_once() == 0
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM activity").fetchone()[0] == 10
+    conn.close()
+    assert sum(1 for _ in retention.reader.iter_rows()) == 10
@@ -0,0 +1,42 @@
+"""Test del motore di regole"""
+
+from config.settings import Config
+from core.rules import RuleEngine
+
+
+def test_default_rules_exclude_markers_exactly():
+    rules = RuleEngine.from_config(Config())
+    assert rules.is_excluded("[PAUSE]", "[PAUSE]")
+    assert rules.is_excluded("[RESUME]", "[RESUME]")
+    assert rules.is_excluded("Finder")
+    assert rules.is_excluded("Python")
+    # Le parentesi non sono classi di caratteri
+    for name in ("P", "S", "E", "PAUSE", "Finder Helper"):
+        assert not rules.is_excluded(name)
+
+
+def test_first_rule_wins_per_effect():
+    rules = RuleEngine(
+        [
+            {"process": "Slack", "title": "*huddle*", "category": "meeting"},
+            {"process": "Slack", "category": "chat", "level": 3},
+            {"domain": "github.com", "category": "sviluppo", "level": 8},
+            {"process_regex": "^Py", "exclude": True},
+        ]
+    )
+    assert rules.classify("Slack", "huddle con il team") == (False, "meeting", 3)
+    assert rules.classify("Slack", "generale") == (False, "chat", 3)
+    assert rules.classify("Chrome", "api.github.com") == (False, "sviluppo", 8)
+    assert rules.classify("Chrome", "notgithub.com") == (False, None, None)
+    assert rules.is_excluded("Python3")
+
+
+def test_exclude_false_overrides_later_exclusion():
+    rules = RuleEngine(
+        [
+            {"process": "Code", "title": "*.py*", "exclude": False},
+            {"process": "Code", "exclude": True},
+        ]
+    )
+    assert not rules.is_excluded("Code", "main.py - progetto")
+    assert rules.is_excluded("Code", "Impostazioni")
@@ -0,0 +1,23 @@
+"""Test dello scheduler"""
+
+import threading
+import time
+
+from core.scheduler import Scheduler
+
+
+def test_stop_waits_for_running_blocking_task():
+    started = threading.Event()
+    finished = []
+
+    def slow_sync():
+        started.set()
+        time.sleep(0.3)
+        finished.append(True)
+
+    scheduler = Scheduler()
+    scheduler.add("sync", slow_sync, 60, blocking=True)
+    scheduler.start()
+    assert started.wait(5)
+    scheduler.stop()
+    assert finished == [True]
@@ -0,0 +1,107 @@
+"""Test dei sink di sincronizzazione HTTP e file"""
+
+import glob
+import http.server
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+from core.sinks import ArrowFileSink, HttpSink, SinkRejectedError
+
+
+def _records(first, last):
+    """Record come iter_unsynced_chunks (id, ts ms, processo, titolo, ...)"""
+    return [
+        (i, 1_700_000_000_000 + i, f"app{i % 3}", f"doc {i}", 1.0, 0, "dev", "u")
+        for i in range(first, last + 1)
+    ]
+
+
+@pytest.fixture
+def http_server():
+    """Collector HTTP che risponde con gli stati in coda (poi 200)"""
+    statuses = []
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests.append(self.headers["Idempotency-Key"])
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/ingest", statuses, requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_http_sink_retries_server_errors(http_server, status):
+    url, statuses, requests = http_server
+    statuses.append(status)
+    sink = HttpSink(url, "inst", attempts=3, base_delay=0)
+    assert sink.write(_records(1, 5), []) == 5
+    assert requests == ["dev:inst:1-5"] * 2
+
+
+def test_http_sink_does_not_retry_client_errors(http_server):
+    url, statuses, requests = http_server
+    statuses.append(400)
+    sink = HttpSink(url, "inst", attempts=3, base_delay=0)
+    with pytest.raises(SinkRejectedError):
+        sink.write(_records(1, 5), [])
+    assert len(requests) == 1
+
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_file_sink_appends_batches_and_rotates_by_size(tmp_path, file_format):
+    pa = pytest.importorskip("pyarrow")
+    sink = ArrowFileSink(
+        str(tmp_path), "dev", "inst", file_format=file_format, max_bytes=1 << 20
+    )
+    # Blocchi nel file aperto: nessuna conferma fino alla rotazione
+    assert sink.write(_records(1, 100), []) == 0
+    assert sink.write(_records(51, 200), []) == 0
+    sink.max_bytes = 1
+    assert sink.write(_records(201, 300), []) == 300
+    assert sink.write(_records(301, 310), []) == 310
+
+    paths = sorted(glob.glob(str(tmp_path / f"*.{file_format}")))
+    assert [p.rsplit("inst-", 1)[1] for p in paths] == [
+        f"000000000001-000000000300.{file_format}",
+        f"000000000301-000000000310.{file_format}",
+    ]
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(paths[0])
+    else:
+        table = pa.ipc.open_file(pa.memory_map(paths[0])).read_all()
+    assert table.column("id").to_pylist() == list(range(1, 301))
+    assert table.column("window_title").to_pylist()[-1] == "doc 300"
+    assert table.column("timestamp")[0].as_py() == datetime.fromtimestamp(
+        1_700_000_000.001, timezone.utc
+    )
+
+
+def test_file_sink_discards_partial_file_after_crash(tmp_path):
+    pytest.importorskip("pyarrow")
+    sink = ArrowFileSink(str(tmp_path), "dev", "inst")
+    sink.write(_records(1, 10), [])
+    sink.flush(force=True)
+    sink.write(_records(11, 20), [])
+    # Crash: il .tmp resta aperto e non confermato
+
+    sink = ArrowFileSink(str(tmp_path), "dev", "inst")
+    assert not glob.glob(str(tmp_path / "*.tmp"))
+    assert sink.write(_records(1, 20), []) == 10
+    assert sink.flush(force=True) == 20
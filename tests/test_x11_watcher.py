@@ -0,0 +1,97 @@
+"""Test del watcher X11 su un display Xvfb (saltato se Xvfb non è installato)"""
+
+import os
+import queue
+import shutil
+import subprocess
+
+import psutil
+import pytest
+
+pytest.importorskip("Xlib")
+
+from Xlib import Xatom  # noqa: E402
+from Xlib import display as xdisplay  # noqa: E402
+
+from core.x11_watcher import X11ActiveWindowWatcher  # noqa: E402
+
+
+@pytest.fixture
+def xvfb():
+    """Display Xvfb dedicato; il numero viene scelto da Xvfb (-displayfd)"""
+    if shutil.which("Xvfb") is None:
+        pytest.skip("Xvfb non installato")
+    read_fd, write_fd = os.pipe()
+    proc = subprocess.Popen(
+        ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", "640x480x24"],
+        pass_fds=(write_fd,),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        proc.kill()
+        pytest.skip("Xvfb non avviato")
+    try:
+        yield f":{number}"
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+class _WindowManager:
+    """Il minimo di un window manager: finestre con titolo/PID e focus"""
+
+    def __init__(self, display_name: str):
+        self.display = xdisplay.Display(display_name)
+        self.screen = self.display.screen()
+        self.root = self.screen.root
+        self._active = self.display.intern_atom("_NET_ACTIVE_WINDOW")
+        self._name = self.display.intern_atom("_NET_WM_NAME")
+        self._utf8 = self.display.intern_atom("UTF8_STRING")
+        self._pid = self.display.intern_atom("_NET_WM_PID")
+
+    def create(self, title: str):
+        window = self.root.create_window(0, 0, 10, 10, 0, self.screen.root_depth)
+        window.change_property(self._pid, Xatom.CARDINAL, 32, [os.getpid()])
+        self.set_title(window, title)
+        return window
+
+    def set_title(self, window, title: str):
+        window.change_property(self._name, self._utf8, 8, title.encode("utf-8"))
+        self.display.flush()
+
+    def activate(self, window):
+        self.root.change_property(self._active, Xatom.WINDOW, 32, [window.id])
+        self.display.flush()
+
+    def close(self):
+        self.display.close()
+
+
+def test_watcher_follows_net_active_window(xvfb):
+    wm = _WindowManager(xvfb)
+    watcher = X11ActiveWindowWatcher(xvfb)
+    changes: "queue.Queue" = queue.Queue()
+    watcher.add_listener(lambda process, title: changes.put((process, title)))
+    watcher.start()
+    process = psutil.Process(os.getpid()).name()
+    try:
+        editor = wm.create("Editor — note.txt")
+        browser = wm.create("github.com")
+
+        wm.activate(editor)
+        assert changes.get(timeout=5) == (process, "Editor — note.txt")
+
+        # Cambio titolo della finestra attiva (es. nuova tab)
+        wm.set_title(editor, "Editor — todo.txt")
+        assert changes.get(timeout=5) == (process, "Editor — todo.txt")
+
+        wm.activate(browser)
+        assert changes.get(timeout=5) == (process, "github.com")
+        assert watcher.current() == (process, "github.com")
+    finally:
+        watcher.stop()
+        wm.close()